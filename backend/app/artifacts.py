@@ -0,0 +1,375 @@
+"""
+Content-addressed artifact store for uploads.
+
+Blobs live at ARTIFACT_DIR/ab/cd/<sha256><ext>, so identical radiographs are
+stored once and nothing is ever overwritten by a later upload with the same
+name. Each blob has an `artifacts` row; Prediction rows reference blobs by
+`upload_digest`. Nothing is reference-counted: garbage collection asks the
+database what is still referenced and reclaims, after a grace period,
+
+ - store blobs no prediction references (failed / rejected uploads)
+ - derived images not served for ARTIFACT_DERIVED_RETENTION_DAYS (regenerable;
+   serving bumps their mtime, see derivatives.touch)
+ - only with ARTIFACT_GC_LEGACY=1 (or `gc --legacy`): files in the legacy flat
+   `uploads/` and `outputs/` directories that no prediction (or
+   prediction-cache entry) points at. Predictions made before the store never
+   recorded their upload, so uploads named `{patient_id}_<filename>` are kept
+   while that patient has predictions without one; `adopt` links them first.
+
+Usage (from backend/):
+    python -m app.artifacts usage           # disk usage per area
+    python -m app.artifacts gc [--dry-run] [--legacy]  # reclaim orphans now
+    python -m app.artifacts adopt           # link + move legacy uploads into the store
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import exc, exists, func, select
+
+from . import database, models
+
+# --- ARTIFACT CONFIG ---
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "./artifacts")
+ARTIFACT_GC_GRACE_SECONDS = int(os.getenv("ARTIFACT_GC_GRACE_SECONDS", "3600"))  # protects in-flight uploads
+ARTIFACT_GC_INTERVAL = int(os.getenv("ARTIFACT_GC_INTERVAL", str(6 * 3600)))     # s; 0 disables the GC thread
+ARTIFACT_DERIVED_RETENTION_DAYS = float(os.getenv("ARTIFACT_DERIVED_RETENTION_DAYS", "30"))
+ARTIFACT_GC_LEGACY = os.getenv("ARTIFACT_GC_LEGACY", "0") == "1"  # also sweep legacy uploads/ and outputs/
+LEGACY_UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+LEGACY_OUTPUT_DIR = "outputs"
+TMP_DIR = os.path.join(ARTIFACT_DIR, "tmp")
+
+_gc_thread = None
+_gc_stop = threading.Event()
+
+
+# --- STORE ---
+def blob_path(digest, ext=""):
+    return os.path.join(ARTIFACT_DIR, digest[:2], digest[2:4], f"{digest}{ext}")
+
+
+def temp_path():
+    """Fresh path under the store for a file being written (then `commit`ted)."""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    return os.path.join(TMP_DIR, uuid.uuid4().hex)
+
+
+def commit(tmp, digest, ext="", kind="upload", name=None):
+    """Move a fully written temp file into the store; returns the blob path.
+
+    If the blob already exists the temp file is dropped (deduplicated) and the
+    existing path is returned, whatever extension it was first stored with.
+    """
+    ext = (ext or "").lower()
+    db = database.SessionLocal()
+    try:
+        row = db.get(models.Artifact, digest)
+        if row is not None and os.path.exists(row.path):
+            os.remove(tmp)
+            row.stored_at = datetime.utcnow()  # restart the grace period: a prediction is about to reference it
+            db.commit()
+            return row.path
+        path = row.path if row is not None else blob_path(digest, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)
+        if row is None:
+            db.add(models.Artifact(digest=digest, kind=kind, path=path, size_bytes=size, original_name=name))
+            try:
+                db.commit()
+            except exc.IntegrityError:
+                db.rollback()  # a concurrent upload of the same bytes registered it first
+                path = db.get(models.Artifact, digest).path
+        return path
+    finally:
+        db.close()
+
+
+def put_file(src, kind="upload", name=None, move=False):
+    """Hash an existing file and store it (copy, or move with move=True); returns (path, digest)."""
+    h = hashlib.sha256()
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    tmp = temp_path()
+    (shutil.move if move else shutil.copyfile)(src, tmp)
+    digest = h.hexdigest()
+    return commit(tmp, digest, os.path.splitext(src)[1], kind, name or os.path.basename(src)), digest
+
+
+# --- USAGE ---
+def _dir_usage(root):
+    files = size = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, name))
+                files += 1
+            except FileNotFoundError:
+                pass
+    return {"files": files, "bytes": size}
+
+
+def usage():
+    """Disk usage per area plus how much deduplication saves in the store."""
+    from . import bulk_reports, derivatives, overlays
+
+    A, P = models.Artifact, models.Prediction
+    db = database.SessionLocal()
+    try:
+        blobs, blob_bytes = db.execute(select(func.count(A.digest), func.coalesce(func.sum(A.size_bytes), 0))).one()
+        logical = db.execute(
+            select(func.count(P.id), func.coalesce(func.sum(A.size_bytes), 0)).join(A, A.digest == P.upload_digest)
+        ).one()
+    finally:
+        db.close()
+    return {
+        "store": {
+            "blobs": blobs,
+            "bytes": int(blob_bytes),
+            "referencing_predictions": logical[0],
+            "bytes_without_dedup": int(logical[1]),
+            "dedup_saved_bytes": max(0, int(logical[1]) - int(blob_bytes)),
+        },
+        "legacy_uploads": _dir_usage(LEGACY_UPLOAD_DIR),
+        "outputs": _dir_usage(LEGACY_OUTPUT_DIR),
+        "derived": _dir_usage(derivatives.DERIVATIVE_DIR),
+        "overlays": _dir_usage(overlays.OVERLAY_DIR),
+        "bulk_exports": _dir_usage(bulk_reports.BULK_REPORT_DIR),
+    }
+
+
+# --- GARBAGE COLLECTION ---
+def _remove(path, dry_run):
+    try:
+        size = os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def _referenced_paths(db):
+    """Normalized file paths predictions and cache entries still point at."""
+    P = models.Prediction
+    refs = set()
+    for row in db.execute(select(P.upload_path, P.image_path, P.excel_path)):
+        refs.update(os.path.normpath(p) for p in row if p)
+    for (value,) in db.execute(select(models.PredictionCacheEntry.value)):
+        image = ((value or {}).get("artifacts") or {}).get("image")
+        if image:
+            refs.add(os.path.normpath(image))
+    return refs
+
+
+def _legacy_uploads():
+    """{patient_id: [paths]} of legacy uploads saved as `{patient_id}_<filename>`."""
+    found = {}
+    if not os.path.isdir(LEGACY_UPLOAD_DIR):
+        return found
+    for name in sorted(os.listdir(LEGACY_UPLOAD_DIR)):
+        prefix, sep, _ = name.partition("_")
+        path = os.path.normpath(os.path.join(LEGACY_UPLOAD_DIR, name))
+        if sep and prefix.isdigit() and os.path.isfile(path):
+            found.setdefault(int(prefix), []).append(path)
+    return found
+
+
+def _unlinked_patients(db):
+    """Patients with predictions that never recorded their upload (pre-store rows)."""
+    P = models.Prediction
+    return {pid for (pid,) in db.execute(
+        select(P.patient_id).where(P.upload_path.is_(None), P.upload_digest.is_(None)).distinct()
+    )}
+
+
+def _old(path, cutoff):
+    try:
+        return os.path.getmtime(path) < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def gc(dry_run=False, grace=None, legacy=None):
+    """Reclaim orphaned artifacts; returns counts and bytes per category."""
+    from . import derivatives
+
+    grace = ARTIFACT_GC_GRACE_SECONDS if grace is None else grace
+    legacy = ARTIFACT_GC_LEGACY if legacy is None else legacy
+    cutoff = time.time() - grace
+    report = {k: {"files": 0, "bytes": 0} for k in ("store", "store_strays", "legacy", "derived")}
+
+    def count(key, size):
+        report[key]["files"] += 1
+        report[key]["bytes"] += size
+
+    A, P = models.Artifact, models.Prediction
+    db = database.SessionLocal()
+    try:
+        # 1. store blobs no prediction references
+        stored_before = datetime.utcnow() - timedelta(seconds=grace)
+        orphaned = (A.stored_at < stored_before, ~exists().where(P.upload_digest == A.digest))
+        for digest, path in db.execute(select(A.digest, A.path).where(*orphaned)).all():
+            if not dry_run:
+                # Re-check in the DELETE itself: commit() may have just deduplicated an
+                # upload onto this blob (refreshing stored_at) for a prediction being saved.
+                deleted = db.execute(A.__table__.delete().where(A.digest == digest, *orphaned)).rowcount
+                db.commit()
+                # A file younger than the grace period was re-stored after the delete
+                if deleted != 1 or not _old(path, cutoff):
+                    continue
+            count("store", _remove(path, dry_run))
+
+        # 2. files in the store without a row (crashed writes, leftover temp files)
+        known = {os.path.normpath(p) for (p,) in db.execute(select(A.path))}
+        for dirpath, _, names in os.walk(ARTIFACT_DIR):
+            for name in names:
+                path = os.path.normpath(os.path.join(dirpath, name))
+                if path not in known and _old(path, cutoff):
+                    count("store_strays", _remove(path, dry_run))
+
+        # 3. legacy flat directories (opt-in): files nothing points at any more
+        if legacy:
+            refs = _referenced_paths(db)
+            unlinked = _unlinked_patients(db)
+            for patient_id, paths in _legacy_uploads().items():
+                if patient_id in unlinked:  # may be the only copy of an old radiograph
+                    refs.update(paths)
+    finally:
+        db.close()
+    for root in (LEGACY_UPLOAD_DIR, LEGACY_OUTPUT_DIR) if legacy else ():
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):  # top level only; caches live in subdirectories
+            path = os.path.normpath(os.path.join(root, name))
+            if os.path.isfile(path) and path not in refs and _old(path, cutoff):
+                count("legacy", _remove(path, dry_run))
+
+    # 4. derived images are regenerable: expire the ones not used for a while
+    derived_cutoff = time.time() - ARTIFACT_DERIVED_RETENTION_DAYS * 86400
+    for dirpath, _, names in os.walk(derivatives.DERIVATIVE_DIR):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if _old(path, derived_cutoff):
+                count("derived", _remove(path, dry_run))
+
+    reclaimed = sum(v["bytes"] for v in report.values())
+    print(f"🧹 Artifact GC: {'would reclaim' if dry_run else 'reclaimed'} {reclaimed / 1024 / 1024:.1f} MB")
+    return {"dry_run": dry_run, "include_legacy": bool(legacy), "reclaimed_bytes": reclaimed, **report}
+
+
+def start_gc_thread():
+    """Run gc() every ARTIFACT_GC_INTERVAL seconds in the background."""
+    global _gc_thread
+    if ARTIFACT_GC_INTERVAL <= 0 or _gc_thread is not None:
+        return
+
+    def loop():
+        while not _gc_stop.wait(ARTIFACT_GC_INTERVAL):
+            try:
+                gc()
+            except Exception as e:
+                print(f"❌ Artifact GC failed: {e}")
+
+    _gc_thread = threading.Thread(target=loop, name="artifact-gc", daemon=True)
+    _gc_thread.start()
+
+
+def stop_gc_thread():
+    global _gc_thread
+    _gc_stop.set()
+    _gc_thread = None
+
+
+# --- LEGACY ADOPTION ---
+def link_legacy():
+    """Backfill upload_path of pre-store predictions from `{patient_id}_<filename>` uploads.
+
+    Only unambiguous matches are linked: a patient with exactly one legacy
+    upload. Patients with several are reported and left alone (their files
+    stay protected from gc).
+    """
+    P = models.Prediction
+    linked = ambiguous = 0
+    db = database.SessionLocal()
+    try:
+        uploads = _legacy_uploads()
+        for patient_id in sorted(_unlinked_patients(db)):
+            paths = uploads.get(patient_id, [])
+            if len(paths) != 1:
+                ambiguous += len(paths) > 1
+                continue
+            linked += db.query(P).filter(
+                P.patient_id == patient_id, P.upload_path.is_(None), P.upload_digest.is_(None)
+            ).update({"upload_path": paths[0]})
+        db.commit()
+    finally:
+        db.close()
+    return {"backfilled": linked, "ambiguous_patients": ambiguous}
+
+
+def adopt(batch_size=200, link=True):
+    """Move legacy flat-directory uploads into the store and point predictions at them.
+
+    With link=True, predictions that never recorded their upload are first
+    matched to legacy files by name (see link_legacy).
+    """
+    P = models.Prediction
+    backfill = link_legacy() if link else {}
+    moved = linked = 0
+    last_id = 0
+    while True:
+        db = database.SessionLocal()
+        try:
+            rows = db.execute(
+                select(P.id, P.upload_path)
+                .where(P.id > last_id, P.upload_digest.is_(None), P.upload_path.isnot(None))
+                .order_by(P.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return {"moved": moved, "linked": linked, **backfill}
+            moved_to = {}  # one legacy file can back several predictions
+            for _, path in rows:
+                if path in moved_to or not os.path.exists(path):
+                    continue
+                if os.path.normpath(path).startswith(os.path.normpath(ARTIFACT_DIR)):
+                    continue
+                moved_to[path] = put_file(path, "upload", move=True)
+            for old, (new_path, digest) in moved_to.items():
+                linked += db.query(P).filter(P.upload_path == old).update(
+                    {"upload_path": new_path, "upload_digest": digest}
+                )
+            moved += len(moved_to)
+            db.commit()
+            last_id = rows[-1][0]
+        finally:
+            db.close()
+
+
+def main(argv=None):
+    import json
+
+    args = sys.argv[1:] if argv is None else argv
+    command = args[0] if args else "usage"
+    if command == "usage":
+        print(json.dumps(usage(), indent=2))
+    elif command == "gc":
+        print(json.dumps(gc(dry_run="--dry-run" in args, legacy=True if "--legacy" in args else None), indent=2))
+    elif command == "adopt":
+        print(json.dumps(adopt(), indent=2))
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Multi-image (and zip archive) prediction for a single patient.
+
+Uploads are first streamed to disk (hashing as they are written) so the
+request body is never held in memory as a whole; the images are then processed
+in model-sized chunks on the inference pool. Each chunk is one batched forward
+pass and one DB transaction, and yields one NDJSON line per image.
+"""
+
+import os
+import time
+import zipfile
+
+from . import database, jobs, landmark_codec, metrics, models, ml_inference, overlays, reports, uploads
+from .batching import BATCH_MAX_SIZE
+
+# --- BATCH PREDICT CONFIG ---
+# s a chunk may wait for room on a saturated pool before its images are reported failed
+BATCH_ADMISSION_TIMEOUT = float(os.getenv("BATCH_ADMISSION_TIMEOUT", "60"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+
+def _is_image(name):
+    base = os.path.basename(name)
+    return (
+        base
+        and not base.startswith(".")
+        and "__MACOSX" not in name
+        and base.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def stage_uploads(files):
+    """Store uploaded files (expanding zips) in the artifact store; return [(filename, path, sha256)].
+
+    Storage is content-addressed, so repeated file names cannot collide.
+    Raises uploads.UploadTooLarge if any single image exceeds UPLOAD_MAX_BYTES.
+    """
+    staged = []
+    for upload in files:
+        name = upload.filename or "upload"
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(upload.file) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not _is_image(member.filename):
+                        continue
+                    with archive.open(member) as src:
+                        path, digest = uploads.store_stream(src, member.filename)
+                    staged.append((member.filename, path, digest))
+        else:
+            path, digest = uploads.store_upload(upload)
+            staged.append((name, path, digest))
+    return staged
+
+
+def chunks(items, size=BATCH_MAX_SIZE):
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+def rejected_chunk(start, items, error):
+    """Result rows for a chunk the inference pool never admitted."""
+    metrics.PREDICTIONS.inc("failed", n=len(items))
+    return [
+        {"index": start + offset, "filename": filename, "status": "failed", "error": error}
+        for offset, (filename, _, _) in enumerate(items)
+    ]
+
+
+def process_chunk(start, items, patient_id, model_name="ceph_landmark_model"):
+    """Pool job: predict, render and store one chunk; return per-image result dicts."""
+    started = time.time()
+    # Images are read from their saved files; nothing is kept as bytes.
+    landmarks = ml_inference.predict_many(
+        [path for _, path, _ in items], [digest for _, _, digest in items]
+    )
+
+    results, stored = [], []  # stored: (result row, Prediction) awaiting commit
+    for offset, ((filename, path, digest), lms) in enumerate(zip(items, landmarks)):
+        row = {"index": start + offset, "filename": filename}
+        results.append(row)
+        if isinstance(lms, Exception):
+            row.update(status="failed", error=str(lms))
+            continue
+        image_rel = None  # drawn on demand unless OVERLAY_PRERENDER
+        if overlays.OVERLAY_PRERENDER:
+            try:
+                image_rel = ml_inference.render_overlay(path, lms, patient_id, digest).replace("\\", "/")
+            except Exception as e:
+                row.update(status="failed", error=str(e))
+                continue
+
+        pred = models.Prediction(
+            patient_id=patient_id,
+            model_name=model_name,
+            **landmark_codec.columns(lms),
+            image_path=image_rel,
+            upload_path=path,
+            upload_digest=digest,
+            status="completed",
+        )
+        row.update(status="completed", num_landmarks=len(lms))
+        stored.append((row, pred))
+
+    # One transaction for the whole chunk
+    elapsed = round(time.time() - started, 3)
+    db = database.SessionLocal()
+    try:
+        for _, pred in stored:
+            pred.processing_time = elapsed
+        db.add_all([pred for _, pred in stored])
+        db.flush()  # assigns ids without a refresh per row after commit
+        for row, pred in stored:
+            row["id"] = pred.id
+            row["output_image"] = jobs.output_image(pred.id, pred.image_path, pred.status)
+        with metrics.stage("db_commit"):
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        for row, _ in stored:
+            row.pop("id", None)
+            row.pop("output_image", None)
+            row.update(status="failed", error=f"database error: {e}")
+        stored = []
+    finally:
+        db.close()
+    metrics.PREDICTIONS.inc("completed", n=len(stored))
+    metrics.PREDICTIONS.inc("failed", n=len(results) - len(stored))
+    for row, _ in stored:
+        reports.pregenerate(row["id"])
+    return results
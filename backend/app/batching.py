@@ -0,0 +1,168 @@
+"""
+Dynamic micro-batching for landmark inference.
+
+Requests submit one preprocessed image at a time; a single scheduler thread
+collects whatever is pending for up to BATCH_MAX_WAIT_MS (or until
+BATCH_MAX_SIZE images are waiting), runs one batched forward pass and fans the
+per-image outputs back to the callers through futures.
+
+Callers block on their future, so a batch can only be as large as the number
+of threads submitting concurrently: the inference pool (workers.py) defaults
+INFERENCE_WORKERS to BATCH_MAX_SIZE for that reason.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from . import metrics
+
+# --- BATCHING CONFIG ---
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+
+def batch_buckets(max_batch_size=BATCH_MAX_SIZE):
+    """Batch sizes actually sent to the model: powers of two up to the max.
+
+    Padding every batch up to one of these keeps the number of distinct input
+    shapes (and therefore graph retraces) small.
+    """
+    sizes = []
+    size = 1
+    while size < max_batch_size:
+        sizes.append(size)
+        size *= 2
+    sizes.append(max_batch_size)
+    return sizes
+
+
+class _Pending:
+    __slots__ = ("array", "future", "enqueued")
+
+    def __init__(self, array):
+        self.array = array
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class MicroBatcher:
+    """Collect single-image requests into batched calls of `predict_fn`.
+
+    `predict_fn` receives an array shaped (N, H, W, C) and must return an
+    array whose first dimension is N.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, pad=True,
+                 concurrency=1):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.buckets = batch_buckets(max_batch_size)
+        self.pad = pad  # off when predict_fn is not the model itself (e.g. a model-server client)
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        # One scheduler per batch allowed in flight; >1 only when predict_fn is
+        # thread-safe and remote (model-server connections), never the model itself
+        self._threads = [
+            threading.Thread(target=self._run, name=f"micro-batcher-{i}", daemon=True) for i in range(concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, img_array):
+        """Queue one image shaped (H, W, C) or (1, H, W, C); return a Future."""
+        arr = np.asarray(img_array)
+        if arr.ndim == 4:
+            if arr.shape[0] != 1:
+                raise ValueError("submit() takes a single image; got batch of %d" % arr.shape[0])
+            arr = arr[0]
+
+        item = _Pending(arr)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._pending.append(item)
+            self._cond.notify()
+        return item.future
+
+    def predict(self, img_array, timeout=None):
+        """Blocking helper: submit one image and wait for its output row."""
+        return self.submit(img_array).result(timeout)
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def close(self):
+        """Stop accepting work; the scheduler drains what is already queued."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    # --- scheduler ---
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            # The window is anchored on the oldest request so its latency is
+            # bounded by max_wait no matter how many requests trickle in.
+            deadline = self._pending[0].enqueued + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            n = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(n)]
+
+    def _pad(self, batch):
+        n = len(batch)
+        target = next(size for size in self.buckets if size >= n)
+        if target > n:
+            pad = np.zeros((target - n,) + batch.shape[1:], dtype=batch.dtype)
+            batch = np.concatenate([batch, pad], axis=0)
+        return batch
+
+    def _run(self):
+        while True:
+            items = self._next_batch()
+            if items is None:
+                return
+
+            items = [item for item in items if item.future.set_running_or_notify_cancel()]
+            if not items:
+                continue
+
+            started = time.monotonic()
+            for item in items:
+                metrics.observe_stage("queue_wait", started - item.enqueued)
+            metrics.BATCH_SIZE.observe(len(items))
+            try:
+                batch = np.stack([item.array for item in items])
+                if self.pad:
+                    batch = self._pad(batch)
+                with metrics.stage("model_forward"):
+                    outputs = np.asarray(self.predict_fn(batch))
+            except Exception as e:
+                print(f"❌ Batched inference failed ({len(items)} images): {e}")
+                for item in items:
+                    item.future.set_exception(e)
+                continue
+
+            for i, item in enumerate(items):
+                item.future.set_result(outputs[i])
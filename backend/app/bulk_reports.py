@@ -0,0 +1,518 @@
+"""
+Bulk report exports: every cephalometric report of a practice (or a patient
+subset / date range) as one zip or one multi-page PDF.
+
+A job is a `report_exports` row plus a work directory. Reports are rendered
+on a process pool (reportlab and PIL are CPU-bound and hold the GIL), each to
+its own `{prediction_id}.pdf` written atomically, so the work directory *is*
+the checkpoint: an interrupted job resumes by skipping files that exist.
+Once everything is rendered the parts are streamed into the final archive
+one file at a time; nothing holds more than one report in memory.
+
+Any server worker may start or resume a job, so a runner first claims it
+with a conditional UPDATE (`claimed_by`, `heartbeat_at`) and keeps the claim
+alive with a heartbeat; a claim whose heartbeat is older than
+BULK_REPORT_STALE_SECONDS (a crashed process) can be taken over.
+
+    pending -> running -> assembling -> completed
+                      \\-> failed (resumable)
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select
+
+from . import database, models, reports
+
+# --- BULK EXPORT CONFIG ---
+BULK_REPORT_DIR = os.getenv("BULK_REPORT_DIR", "./bulk_exports")  # not under outputs/: served statically
+BULK_REPORT_PROCESSES = int(os.getenv("BULK_REPORT_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+BULK_REPORT_PAGE_SIZE = int(os.getenv("BULK_REPORT_PAGE_SIZE", "500"))          # ids fetched per query
+BULK_REPORT_PROGRESS_INTERVAL = float(os.getenv("BULK_REPORT_PROGRESS_INTERVAL", "1.0"))  # s between DB updates
+BULK_REPORT_STALE_SECONDS = int(os.getenv("BULK_REPORT_STALE_SECONDS", "120"))  # heartbeat age that frees a claim
+
+PENDING = "pending"
+RUNNING = "running"
+ASSEMBLING = "assembling"
+COMPLETED = "completed"
+FAILED = "failed"
+ACTIVE = (PENDING, RUNNING, ASSEMBLING)
+FORMATS = {"zip": "application/zip", "pdf": "application/pdf"}
+
+RUNNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_executor = None
+_stopping = threading.Event()
+_resume_thread = None
+
+
+def get_executor():
+    """Process pool shared by all export jobs (None: render in the job thread)."""
+    global _executor
+    if _executor is None and BULK_REPORT_PROCESSES > 0:
+        # spawn: never fork a process that has TensorFlow and worker threads loaded
+        _executor = ProcessPoolExecutor(
+            max_workers=BULK_REPORT_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown():
+    """Stop runners at their next checkpoint; jobs stay resumable."""
+    global _executor, _resume_thread
+    _stopping.set()
+    _resume_thread = None
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# --- SELECTION ---
+def _criteria(job):
+    P = models.Prediction
+    criteria = [
+        P.id <= job.max_prediction_id,
+        or_(P.status == "completed", P.status.is_(None)),
+        or_(P.landmarks_packed.isnot(None), P.result.isnot(None)),
+    ]
+    if job.owner_id is not None:
+        criteria.append(P.patient_id.in_(select(models.Patient.id).where(models.Patient.owner_id == job.owner_id)))
+    if job.patient_ids:
+        criteria.append(P.patient_id.in_(job.patient_ids))
+    if job.since is not None:
+        criteria.append(P.created_at >= job.since)
+    if job.until is not None:
+        criteria.append(P.created_at < job.until)
+    return criteria
+
+
+def _iter_predictions(job):
+    """(prediction id, patient id) of the job's selection, in id order, paged."""
+    P = models.Prediction
+    criteria = _criteria(job)
+    last_id = 0
+    while True:
+        db = database.SessionLocal()
+        try:
+            rows = db.execute(
+                select(P.id, P.patient_id).where(P.id > last_id, *criteria).order_by(P.id).limit(BULK_REPORT_PAGE_SIZE)
+            ).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def create(db, principal, fmt="zip", patient_ids=None, since=None, until=None):
+    """Register a job over the current predictions (sync session) and return it."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported bulk export format: {fmt}")
+    job = models.ReportExport(
+        owner_id=None if principal.is_admin else principal.id,
+        requested_by=principal.id,
+        format=fmt,
+        patient_ids=sorted(set(patient_ids)) if patient_ids else None,
+        since=since,
+        until=until,
+        max_prediction_id=db.execute(select(func.max(models.Prediction.id))).scalar() or 0,
+        status=PENDING,
+    )
+    job.total = db.execute(select(func.count(models.Prediction.id)).where(*_criteria(job))).scalar()
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def status_payload(job):
+    done = (job.rendered or 0) + (job.failed or 0)
+    return {
+        "id": job.id,
+        "format": job.format,
+        "status": job.status,
+        "total": job.total or 0,
+        "rendered": job.rendered or 0,
+        "failed": job.failed or 0,
+        "progress": round(done / job.total, 4) if job.total else (1.0 if job.status == COMPLETED else 0.0),
+        "size_bytes": job.size_bytes,
+        "download_url": f"http://localhost:8000/exports/reports/{job.id}/download" if job.status == COMPLETED else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+# --- CLAIMS ---
+def claim(export_id):
+    """Atomically take the job for this process; False if a live runner holds it."""
+    R = models.ReportExport.__table__
+    now = datetime.utcnow()
+    with database.engine.begin() as conn:
+        changed = conn.execute(
+            R.update()
+            .where(
+                R.c.id == export_id,
+                R.c.status != COMPLETED,
+                or_(
+                    R.c.claimed_by.is_(None),
+                    R.c.heartbeat_at.is_(None),
+                    R.c.heartbeat_at < now - timedelta(seconds=BULK_REPORT_STALE_SECONDS),
+                ),
+            )
+            .values(status=RUNNING, error=None, claimed_by=RUNNER_ID, heartbeat_at=now, updated_at=now)
+        ).rowcount
+    return changed == 1
+
+
+def _heartbeat(export_id, release=False):
+    """Refresh (or drop) our claim; False if another runner has taken the job over."""
+    R = models.ReportExport.__table__
+    values = {"claimed_by": None, "heartbeat_at": None} if release else {"heartbeat_at": datetime.utcnow()}
+    with database.engine.begin() as conn:
+        return conn.execute(
+            R.update().where(R.c.id == export_id, R.c.claimed_by == RUNNER_ID).values(**values)
+        ).rowcount == 1
+
+
+def _keep_claim(export_id, done, lost):
+    """Heartbeat thread of one runner; sets `lost` if the claim was taken over."""
+    while not done.wait(BULK_REPORT_STALE_SECONDS / 4):
+        try:
+            if not _heartbeat(export_id):
+                print(f"⚠️ Bulk report export {export_id} was taken over by another runner; stopping")
+                lost.set()
+                return
+        except Exception as e:  # a missed beat is fine; staleness needs several
+            print(f"⚠️ Bulk report export {export_id} heartbeat failed: {e}")
+
+
+def _update(export_id, **fields):
+    db = database.SessionLocal()
+    try:
+        job = db.get(models.ReportExport, export_id)
+        for k, v in fields.items():
+            setattr(job, k, v)
+        job.updated_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+# --- RENDERING (process pool) ---
+def work_dir(export_id):
+    return os.path.join(BULK_REPORT_DIR, f"export_{export_id}.parts")
+
+
+def render_one(pred_id, path):
+    """Pool job: render one prediction's report to `path` atomically; returns its size."""
+    db = database.SessionLocal()
+    try:
+        pred = db.get(models.Prediction, pred_id)
+        if pred is None:
+            raise reports.ReportUnavailable("Prediction not found")
+        content = reports.render(pred, db.get(models.Patient, pred.patient_id))
+    finally:
+        db.close()
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+    return len(content)
+
+
+def _render_all(job, parts, lost):
+    """Render every missing part; returns (rendered, failed) counts for the selection."""
+    executor = get_executor()
+    window = 2 * BULK_REPORT_PROCESSES if executor is not None else 1
+    rendered = failed = 0
+    in_flight = {}  # future -> prediction id
+    last_report = time.monotonic()
+    errors_path = os.path.join(parts, "errors.jsonl")
+    if os.path.exists(errors_path):
+        os.remove(errors_path)  # failures are retried on resume
+
+    def record(pred_id, outcome):
+        nonlocal rendered, failed
+        try:
+            outcome()
+            rendered += 1
+        except Exception as e:
+            failed += 1
+            with open(errors_path, "a") as f:
+                f.write(json.dumps({"prediction_id": pred_id, "error": str(e)}) + "\n")
+
+    def collect(futures):
+        for future in futures:
+            record(in_flight.pop(future), future.result)
+
+    for pred_id, _ in _iter_predictions(job):
+        if _stopping.is_set() or lost.is_set():
+            break
+        path = os.path.join(parts, f"{pred_id}.pdf")
+        if os.path.exists(path):
+            rendered += 1  # checkpointed by an earlier run
+            continue
+        if executor is None:
+            record(pred_id, lambda: render_one(pred_id, path))
+        else:
+            in_flight[executor.submit(render_one, pred_id, path)] = pred_id
+            if len(in_flight) >= window:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        if time.monotonic() - last_report >= BULK_REPORT_PROGRESS_INTERVAL:
+            _update(job.id, rendered=rendered, failed=failed)
+            last_report = time.monotonic()
+
+    if in_flight:
+        done, _ = wait(in_flight)
+        collect(done)
+    return rendered, failed
+
+
+# --- ASSEMBLY (streamed) ---
+def _assemble_zip(job, parts, target):
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for pred_id, patient_id in _iter_predictions(job):
+            path = os.path.join(parts, f"{pred_id}.pdf")
+            if os.path.exists(path):
+                # PDFs are already compressed; store, streamed from disk in chunks
+                zf.write(path, f"patient_{patient_id}/ceph_{patient_id}_{pred_id}_report.pdf")
+        errors_path = os.path.join(parts, "errors.jsonl")
+        if os.path.exists(errors_path):
+            zf.write(errors_path, "errors.jsonl")
+
+
+def _assemble_pdf(job, parts, target):
+    with open(target, "wb") as out:
+        writer = PdfConcatWriter(out, title=f"Cephalometric reports (export {job.id})")
+        for pred_id, _ in _iter_predictions(job):
+            path = os.path.join(parts, f"{pred_id}.pdf")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    writer.append(f.read())
+        writer.close()
+
+
+def run(export_id):
+    """Job thread of a claimed job: render (resuming from the work directory), then assemble."""
+    done, lost = threading.Event(), threading.Event()
+    threading.Thread(
+        target=_keep_claim, args=(export_id, done, lost), name=f"bulk-report-{export_id}-heartbeat", daemon=True
+    ).start()
+    try:
+        db = database.SessionLocal()
+        try:
+            job = db.get(models.ReportExport, export_id)
+            db.expunge(job)
+        finally:
+            db.close()
+
+        parts = work_dir(export_id)
+        os.makedirs(parts, exist_ok=True)
+        print(f"🗂️ Bulk report export {export_id}: rendering {job.total} reports")
+        rendered, failed = _render_all(job, parts, lost)
+        if lost.is_set():
+            return  # the new owner reports progress from here on
+        _update(export_id, rendered=rendered, failed=failed)
+        if _stopping.is_set():
+            return  # left RUNNING and released; the next resume pass picks it up
+
+        _update(export_id, status=ASSEMBLING)
+        target = os.path.join(BULK_REPORT_DIR, f"export_{export_id}.{job.format}")
+        tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            (_assemble_zip if job.format == "zip" else _assemble_pdf)(job, parts, tmp)
+            if lost.is_set():
+                return
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        shutil.rmtree(parts, ignore_errors=True)
+        _update(export_id, status=COMPLETED, output_path=target, size_bytes=os.path.getsize(target))
+        print(f"✅ Bulk report export {export_id} done: {rendered} reports, {failed} failed")
+    except Exception as e:
+        print(f"❌ Bulk report export {export_id} failed: {e}")
+        if not lost.is_set():
+            _update(export_id, status=FAILED, error=str(e))
+    finally:
+        done.set()
+        if not lost.is_set():
+            _heartbeat(export_id, release=True)
+
+
+def start(export_id):
+    """Claim a job and run (or resume) it on a background thread; False if a live runner has it."""
+    if not claim(export_id):
+        return False
+    _stopping.clear()
+    threading.Thread(target=run, args=(export_id,), name=f"bulk-report-{export_id}", daemon=True).start()
+    return True
+
+
+def resume_unfinished():
+    """Restart pending/running/assembling jobs no live runner holds; returns the ids taken.
+
+    Every worker may call this: the claim lets exactly one of them resume each job.
+    """
+    db = database.SessionLocal()
+    try:
+        ids = db.execute(
+            select(models.ReportExport.id).where(models.ReportExport.status.in_(ACTIVE))
+        ).scalars().all()
+    finally:
+        db.close()
+    resumed = [export_id for export_id in ids if start(export_id)]
+    for export_id in resumed:
+        print(f"🔁 Resumed bulk report export {export_id}")
+    return resumed
+
+
+def start_resume_thread():
+    """Resume unfinished jobs now, then every BULK_REPORT_STALE_SECONDS (takes over crashed runners)."""
+    global _resume_thread
+    if _resume_thread is not None:
+        return
+
+    def loop():
+        while True:
+            try:
+                resume_unfinished()
+            except Exception as e:
+                print(f"❌ Resuming bulk report exports failed: {e}")
+            if _stopping.wait(BULK_REPORT_STALE_SECONDS):
+                return
+
+    _resume_thread = threading.Thread(target=loop, name="bulk-report-resume", daemon=True)
+    _resume_thread.start()
+
+
+# --- MULTI-PAGE PDF ---
+_OBJ = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+_REF = re.compile(rb"(\d+)\s+0\s+R\b")
+_STREAM = re.compile(rb">>\s*stream\r?\n")
+_KIDS = re.compile(rb"/Kids\s*\[([^\]]*)\]")
+
+
+class PdfConcatWriter:
+    """Concatenate single-document PDFs into one file, streaming.
+
+    Each appended PDF's objects are renumbered and written out immediately;
+    only byte offsets and page references are kept, so memory stays flat no
+    matter how many reports go in. Meant for our own reportlab output (classic
+    xref tables, direct /Length values), not arbitrary PDFs.
+    """
+
+    CATALOG, PAGES, INFO = 1, 2, 3
+
+    def __init__(self, fileobj, title=None):
+        self.out = fileobj
+        self.offsets = {}
+        self.kids = []
+        self.next_num = 4
+        self.title = title
+        self.pos = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data):
+        self.out.write(data)
+        self.pos += len(data)
+
+    def _emit(self, num, body):
+        self.offsets[num] = self.pos
+        self._write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    @staticmethod
+    def _xref_offsets(data):
+        start = int(data[data.rindex(b"startxref") + 9:].split()[0])
+        lines = data[start:data.index(b"trailer", start)].split(b"\n")[1:]
+        offsets, i = {}, 0
+        while i < len(lines):
+            head = lines[i].split()
+            i += 1
+            if len(head) != 2:
+                continue
+            first, count = int(head[0]), int(head[1])
+            for n in range(count):
+                entry = lines[i + n].split()
+                if entry[2] == b"n":
+                    offsets[first + n] = int(entry[0])
+            i += count
+        return offsets
+
+    def append(self, data):
+        offsets = self._xref_offsets(data)
+        trailer = data[data.rindex(b"trailer"):]
+        skip = {int(m.group(1)) for m in re.finditer(rb"/(?:Root|Info)\s+(\d+)\s+0\s+R", trailer)}
+
+        # object number -> body bytes (between "n 0 obj" and "endobj")
+        ordered = sorted(offsets.items(), key=lambda kv: kv[1])
+        ends = [off for _, off in ordered[1:]] + [data.rindex(b"xref")]
+        bodies = {}
+        for (num, off), end in zip(ordered, ends):
+            chunk = data[off:end]
+            head = _OBJ.match(chunk)
+            body = chunk[head.end():chunk.rindex(b"endobj")].strip(b"\r\n ")
+            bodies[num] = body
+
+        pages_nums = {n for n, b in bodies.items() if b"/Type /Pages" in self._dict_part(b)}
+        page_order = []
+        for n in pages_nums:
+            kids = _KIDS.search(self._dict_part(bodies[n]))
+            page_order += [int(r) for r in _REF.findall(kids.group(1))] if kids else []
+
+        mapping = {}
+        for n in bodies:
+            if n in skip:
+                continue
+            if n in pages_nums:
+                mapping[n] = self.PAGES
+            else:
+                mapping[n] = self.next_num
+                self.next_num += 1
+
+        def renumber(match):
+            return b"%d 0 R" % mapping.get(int(match.group(1)), 0)
+
+        for n, body in bodies.items():
+            if n in skip or n in pages_nums:
+                continue
+            dict_part = self._dict_part(body)
+            self._emit(mapping[n], _REF.sub(renumber, dict_part) + body[len(dict_part):])
+        self.kids += [mapping[n] for n in page_order]
+
+    @staticmethod
+    def _dict_part(body):
+        m = _STREAM.search(body)
+        return body[:m.start() + 2] if m else body
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % k for k in self.kids)
+        self._emit(self.PAGES, b"<< /Type /Pages /Count %d /Kids [ %s ] >>" % (len(self.kids), kids))
+        self._emit(self.CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES)
+        title = (self.title or "").replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        self._emit(self.INFO, b"<< /Producer (CephaAI) /Title (%s) >>" % title.encode("latin-1", "replace"))
+
+        xref_at = self.pos
+        size = self.next_num
+        lines = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for num in range(1, size):
+            lines.append(b"%010d 00000 n \n" % self.offsets[num])
+        self._write(b"".join(lines))
+        self._write(
+            b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (size, self.CATALOG, self.INFO, xref_at)
+        )
@@ -0,0 +1,291 @@
+"""
+ceph_report.py
+Generate a polished PDF cephalometric report from:
+ - original image (numpy array or path)
+ - detected landmarks (dict: idx -> (x_pixel, y_pixel))  -- x = row, y = col as used earlier
+ - angles (dict of angle_name -> degrees)
+ - interpretations (dict of measurement_name -> diagnosis)
+ - optional heatmaps (torch tensor / numpy array) shaped (1, channels, H, W) or (channels, H, W)
+Produces a PDF saved to output_path (a path or file object), or bytes via render_ceph_pdf.
+"""
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+from reportlab.lib import colors
+from reportlab.platypus import Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import io
+from datetime import datetime
+
+# --- Helpers ---------------------------------------------------------------
+
+def ensure_rgb_array(img):
+    """Accept PIL Image, file path, or numpy array; return RGB uint8 numpy array."""
+    if isinstance(img, str):
+        img = Image.open(img).convert("RGB")
+        return np.array(img)
+    if isinstance(img, Image.Image):
+        return np.array(img.convert("RGB"))
+    arr = np.array(img)
+    if arr.ndim == 2:
+        arr = np.stack([arr]*3, axis=-1)
+    if arr.shape[2] == 4:
+        arr = arr[:, :, :3]
+    return arr.astype(np.uint8)
+
+def annotate_image_numpy(img_np, landmarks, circlesize=6, color=(255,0,0), show_index=True, font_path=None):
+    """Return a PIL image with landmarks drawn.
+    landmarks: dict idx -> (x, y) in pixel coords (row, col). We draw at (y,x).
+    """
+    pil = Image.fromarray(img_np).convert("RGB")
+    draw = ImageDraw.Draw(pil)
+    w,h = pil.size
+    # choose colors per landmark for variety
+    cmap = [
+        (255,0,0),(0,255,0),(0,0,255),(255,165,0),(128,0,128),(0,255,255),
+        (255,192,203),(165,42,42),(34,139,34),(75,0,130),(255,215,0)
+    ]
+    try:
+        font = ImageFont.truetype(font_path or "DejaVuSans-Bold.ttf", 14)
+    except Exception:
+        font = ImageFont.load_default()
+
+    for i, (k,(xr, yc)) in enumerate(landmarks.items()):
+        # xr = x row (vertical), yc = y col (horizontal)
+        x = int(yc); y = int(xr)  # PIL coordinate (x,y)
+        col = cmap[i % len(cmap)]
+        # circle
+        r = circlesize
+        draw.ellipse((x-r, y-r, x+r, y+r), fill=col, outline=(0,0,0))
+        if show_index:
+            draw.text((x+r+2, y-r-2), str(k+1), fill=(0,0,0), font=font)
+    return pil
+
+_LUTS = {}
+
+def colormap_lut(name="viridis"):
+    """256x3 uint8 lookup table sampled from a matplotlib colormap (cached)."""
+    lut = _LUTS.get(name)
+    if lut is None:
+        import matplotlib
+        cmap = matplotlib.colormaps[name]
+        lut = (cmap(np.arange(cmap.N))[:, :3] * 255).round().astype(np.uint8)
+        _LUTS[name] = lut
+    return lut
+
+def _resize_stack(maps, size):
+    """Bilinear resize of (C,H,W) float maps to (C,h,w), size=(w,h), pixel-centre aligned."""
+    C, H, W = maps.shape
+    w, h = size
+    ys = np.clip((np.arange(h) + 0.5) * H / h - 0.5, 0, H - 1)
+    xs = np.clip((np.arange(w) + 0.5) * W / w - 0.5, 0, W - 1)
+    y0 = np.floor(ys).astype(np.intp); x0 = np.floor(xs).astype(np.intp)
+    y1 = np.minimum(y0 + 1, H - 1); x1 = np.minimum(x0 + 1, W - 1)
+    wy = (ys - y0)[None, :, None]; wx = (xs - x0)[None, None, :]
+    top = maps[:, y0][:, :, x0] * (1 - wx) + maps[:, y0][:, :, x1] * wx
+    bottom = maps[:, y1][:, :, x0] * (1 - wx) + maps[:, y1][:, :, x1] * wx
+    return top * (1 - wy) + bottom * wy
+
+def heatmap_to_thumbnail_grid(heatmaps, ncols=5, thumb_size=(160,120), cmap="viridis"):
+    """
+    heatmaps: numpy array shaped (C,H,W) or (1,C,H,W) or torch tensor.
+    Returns PIL image grid of thumbnails (colormap applied).
+    All channels are normalized, resized, colour-mapped and tiled as one array.
+    """
+    if hasattr(heatmaps, "cpu"):
+        heatmaps = heatmaps.detach().cpu().numpy()
+    heatmaps = np.asarray(heatmaps, dtype=np.float32)
+    if heatmaps.ndim == 4 and heatmaps.shape[0] == 1:
+        heatmaps = heatmaps[0]
+    C = heatmaps.shape[0]
+    nrows = (C + ncols - 1) // ncols
+    tw, th = thumb_size
+
+    # normalize every channel to [0,1] at once (flat channels -> 0)
+    mmin = heatmaps.min(axis=(1, 2), keepdims=True)
+    mmax = heatmaps.max(axis=(1, 2), keepdims=True)
+    span = mmax - mmin
+    nm = np.where(span > 0, (heatmaps - mmin) / (span + 1e-9), 0.0)
+
+    # resize, then index the LUT the way matplotlib quantizes floats
+    nm = _resize_stack(nm, thumb_size)
+    lut = colormap_lut(cmap)
+    idx = np.clip((nm * len(lut)).astype(np.intp), 0, len(lut) - 1)
+    thumbs = lut[idx]                                       # (C, th, tw, 3)
+
+    # fill remaining slots and tile rows x cols into one array
+    grid = np.full((nrows * ncols, th, tw, 3), 240, dtype=np.uint8)
+    grid[:C] = thumbs
+    grid = grid.reshape(nrows, ncols, th, tw, 3).transpose(0, 2, 1, 3, 4).reshape(nrows * th, ncols * tw, 3)
+    return Image.fromarray(grid)
+
+# --- PDF generation -------------------------------------------------------
+
+def image_reader(pil, format="PNG", quality=90):
+    """Encode a PIL image into memory and wrap it for ReportLab.
+    JPEG bytes are embedded in the PDF as-is (no re-encode); PNG keeps lines crisp.
+    """
+    buf = io.BytesIO()
+    if format.upper() in ("JPEG", "JPG"):
+        pil.convert("RGB").save(buf, format="JPEG", quality=quality)
+    else:
+        pil.save(buf, format=format)
+    buf.seek(0)
+    return ImageReader(buf)
+
+def draw_ceph_page(
+    c,                         # reportlab canvas to draw on
+    image,                     # numpy array or path or PIL
+    landmarks,                 # dict idx -> (x_row, y_col) pixel coords (0-indexed)
+    angles,                    # dict angle_name -> float
+    interpretations,           # dict measurement_name -> string
+    patient_name=None,
+    patient_id=None,
+    heatmaps=None,             # optional: heatmaps tensor or array (C,H,W) or (1,C,H,W)
+    notes=None,
+    image_format="PNG",        # how the annotated image is embedded (PNG or JPEG)
+    generated_at=None,         # timestamp printed in the header; default: now
+):
+    """Draw one report page onto an open canvas and end the page."""
+    # sanitize image
+    img_np = ensure_rgb_array(image)
+    # annotate
+    ann_pil = annotate_image_numpy(img_np, landmarks, circlesize=max(4, int(min(img_np.shape[:2]) * 0.01)))
+    # create thumbnails
+    heatmap_grid = None
+    if heatmaps is not None:
+        try:
+            heatmap_grid = heatmap_to_thumbnail_grid(heatmaps, ncols=5, thumb_size=(160,120))
+        except Exception as e:
+            heatmap_grid = None
+
+    W, H = c._pagesize
+
+    # Header
+    title = "Cephalometric Analysis Report"
+    c.setFont("Helvetica-Bold", 20)
+    c.drawCentredString(W/2, H - 50, title)
+    c.setFont("Helvetica", 10)
+    ts = (generated_at or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    c.drawRightString(W - 40, H - 40, f"Generated: {ts}")
+
+    # Patient info block
+    y = H - 80
+    left_x = 40
+    if patient_name or patient_id:
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(left_x, y, "Patient:")
+        c.setFont("Helvetica", 11)
+        if patient_name:
+            c.drawString(left_x + 70, y, str(patient_name))
+        if patient_id:
+            c.drawString(left_x + 300, y, f"ID: {patient_id}")
+        y -= 20
+
+    # Annotated image placement (left area), encoded in memory
+    img_reader = image_reader(ann_pil, image_format)
+    # compute max box for image
+    img_box_w = W * 0.5 - 80
+    img_box_h = H * 0.75
+    # preserve aspect
+    pil_w, pil_h = ann_pil.size
+    scale = min(img_box_w / pil_w, img_box_h / pil_h)
+    draw_w, draw_h = pil_w * scale, pil_h * scale
+    img_x = left_x
+    img_y = y - draw_h - 10
+    c.drawImage(img_reader, img_x, img_y, width=draw_w, height=draw_h)
+
+    # Right column: angles table + interpretations
+    col_x = left_x + img_box_w + 40
+    col_y = H - 120
+
+    styles = getSampleStyleSheet()
+    # Angles table
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(col_x, col_y, "Angular Measurements")
+    col_y -= 18
+
+    # Compose angles table data
+    angle_items = list(angles.items())
+    if len(angle_items) == 0:
+        angle_table_data = [["(no angles)", ""]]
+    else:
+        angle_table_data = [["Measurement", "Degrees"]]
+        for k,v in angle_items:
+            angle_table_data.append([str(k), f"{float(v):.2f}"])
+
+    table = Table(angle_table_data, colWidths=[140, 60])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#f0f0f0")),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+        ('FONT', (0,0), (-1,-1), 'Helvetica', 10),
+        ('ALIGN', (1,1), (-1,-1), 'RIGHT'),
+    ]))
+    # draw table onto canvas
+    tw, th = table.wrapOn(c, 300, 400)
+    table.drawOn(c, col_x, col_y - th)
+    col_y = col_y - th - 12
+
+    # Interpretations
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(col_x, col_y, "Interpretation / Diagnosis")
+    col_y -= 16
+    c.setFont("Helvetica", 10)
+    for k,v in interpretations.items():
+        # wrap text if long
+        para = Paragraph(f"<b>{k}:</b> {v}", styles['Normal'])
+        w, h_para = para.wrap(260, 200)
+        para.drawOn(c, col_x, col_y - h_para)
+        col_y -= h_para + 6
+
+    # Optional heatmaps below right column (if present)
+    if heatmap_grid is not None:
+        # place heatmap thumbnails centered under interpretations
+        hm_reader = image_reader(heatmap_grid, "PNG")
+        hm_w = 320
+        hm_h = 160
+        hm_x = col_x
+        hm_y = img_y
+        c.drawImage(hm_reader, hm_x, hm_y, width=hm_w, height=hm_h)
+
+    # Footer: small table summary and notes
+    footer_y = 40
+    c.setFont("Helvetica", 9)
+    c.drawString(left_x, footer_y+20, f"Report generated by CephaAI")
+    if notes:
+        c.drawString(left_x + 200, footer_y+20, f"Notes: {notes}")
+    c.drawRightString(W - 40, footer_y+20, f"Total landmarks: {len(landmarks)}")
+
+    c.showPage()
+
+def generate_ceph_pdf(
+    image,                     # numpy array or path or PIL
+    landmarks,                 # dict idx -> (x_row, y_col) pixel coords (0-indexed)
+    angles,                    # dict angle_name -> float
+    interpretations,           # dict measurement_name -> string
+    output_path,               # where to save PDF: file path or writable binary file object
+    patient_name=None,
+    patient_id=None,
+    heatmaps=None,             # optional: heatmaps tensor or array (C,H,W) or (1,C,H,W)
+    notes=None,
+    image_format="PNG",
+    generated_at=None,         # fixed timestamp -> byte-identical output for identical inputs
+):
+    # PDF layout using ReportLab
+    # Use landscape A4 for wide cephalograms; `invariant` drops ReportLab's own
+    # creation date and random document id when the timestamp is pinned
+    c = canvas.Canvas(output_path, pagesize=landscape(A4), invariant=generated_at is not None)
+    draw_ceph_page(c, image, landmarks, angles, interpretations, patient_name=patient_name,
+                   patient_id=patient_id, heatmaps=heatmaps, notes=notes, image_format=image_format,
+                   generated_at=generated_at)
+    c.save()
+    return output_path
+
+def render_ceph_pdf(image, landmarks, angles, interpretations, **kwargs):
+    """Same report as generate_ceph_pdf, built entirely in memory; returns the PDF bytes."""
+    buf = io.BytesIO()
+    generate_ceph_pdf(image, landmarks, angles, interpretations, buf, **kwargs)
+    return buf.getvalue()
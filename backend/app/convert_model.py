@@ -0,0 +1,169 @@
+"""
+Convert the Keras landmark model to CPU-optimized formats and check accuracy.
+
+Usage (from backend/):
+    python -m app.convert_model --to tflite --quantize dynamic
+    python -m app.convert_model --to tflite --quantize int8 --calibration-dir samples/
+    python -m app.convert_model --to onnx --opset 17
+    python -m app.convert_model --check-only --to tflite onnx --calibration-dir samples/
+
+After converting, every backend is compared against the Keras baseline on the
+same inputs and the mean / max landmark deviation is reported, both in
+normalized units and in pixels of a 2400x3000 cephalogram, alongside latency.
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from . import inference_backends, ml_inference
+
+REFERENCE_SIZE = (2400, 3000)  # (w, h) of a typical lateral cephalogram
+INPUT_SHAPE = (256, 256, 1)
+
+
+# --- INPUTS ---
+def load_inputs(calibration_dir=None, limit=32, seed=0):
+    """Preprocessed (N, 256, 256, 1) float32 inputs from a folder, or synthetic."""
+    if calibration_dir:
+        paths = sorted(
+            p for ext in ("*.jpg", "*.jpeg", "*.png", "*.tif", "*.tiff", "*.bmp")
+            for p in glob.glob(os.path.join(calibration_dir, ext))
+        )[:limit]
+        if paths:
+            arrays = []
+            for p in paths:
+                with open(p, "rb") as f:
+                    arrays.append(ml_inference.preprocess_image(f.read()))
+            return np.concatenate(arrays, axis=0)
+        print(f"⚠️ No images found in {calibration_dir}; falling back to synthetic inputs")
+
+    print("⚠️ Using synthetic inputs; quantization ranges and accuracy numbers are only indicative")
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:INPUT_SHAPE[0], 0:INPUT_SHAPE[1]].astype(np.float32)
+    batch = []
+    for _ in range(limit):
+        fx, fy = rng.uniform(8, 40, size=2)
+        img = 0.5 + 0.3 * np.sin(xx / fx) * np.cos(yy / fy) + rng.normal(0, 0.05, INPUT_SHAPE[:2])
+        batch.append(np.clip(img, 0, 1))
+    return np.asarray(batch, dtype=np.float32)[..., None]
+
+
+# --- CONVERSION ---
+def convert_tflite(keras_path, out_path, quantize="none", inputs=None):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(keras_path, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantize == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        if inputs is None:
+            raise ValueError("int8 quantization needs representative inputs")
+
+        def representative():
+            for i in range(len(inputs)):
+                yield [inputs[i:i + 1]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+def convert_onnx(keras_path, out_path, opset=17):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(keras_path, compile=False)
+    spec = (tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name="image"),)
+    fn = tf.function(lambda x: model(x, training=False))
+    tf2onnx.convert.from_function(fn, input_signature=spec, opset=opset, output_path=out_path)
+    return out_path
+
+
+# --- ACCURACY CHECK ---
+def _time_backend(backend, inputs, batch_size):
+    backend.predict_on_batch(inputs[:batch_size])  # warmup
+    outputs, start = [], time.perf_counter()
+    for i in range(0, len(inputs), batch_size):
+        outputs.append(np.asarray(backend.predict_on_batch(inputs[i:i + batch_size]), dtype=np.float32))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(outputs, axis=0).reshape(len(inputs), -1), 1000 * elapsed / len(inputs)
+
+
+def check_accuracy(backend_names, inputs, batch_size=8):
+    """Compare backends against the Keras baseline; return one report row per backend."""
+    baseline = inference_backends.load_backend("keras")
+    ref, ref_ms = _time_backend(baseline, inputs, batch_size)
+    ref_xy = ref.reshape(len(inputs), -1, 2)
+    scale = np.asarray(REFERENCE_SIZE, dtype=np.float32)
+
+    rows = [{"backend": "keras", "mean_dev": 0.0, "max_dev": 0.0, "mean_px": 0.0, "max_px": 0.0,
+             "ms_per_image": ref_ms, "speedup": 1.0}]
+    for name in backend_names:
+        if name == "keras":
+            continue
+        out, ms = _time_backend(inference_backends.load_backend(name), inputs, batch_size)
+        xy = out.reshape(ref_xy.shape)
+        dev = np.linalg.norm(xy - ref_xy, axis=-1)                 # normalized units
+        dev_px = np.linalg.norm((xy - ref_xy) * scale, axis=-1)    # pixels at REFERENCE_SIZE
+        rows.append({
+            "backend": name,
+            "mean_dev": float(dev.mean()),
+            "max_dev": float(dev.max()),
+            "mean_px": float(dev_px.mean()),
+            "max_px": float(dev_px.max()),
+            "ms_per_image": ms,
+            "speedup": ref_ms / ms if ms else float("inf"),
+        })
+    return rows
+
+
+def print_report(rows):
+    print(f"{'backend':<10}{'mean dev':>10}{'max dev':>10}{'mean px':>10}{'max px':>10}{'ms/img':>10}{'speedup':>9}")
+    for r in rows:
+        print(f"{r['backend']:<10}{r['mean_dev']:>10.5f}{r['max_dev']:>10.5f}{r['mean_px']:>10.2f}"
+              f"{r['max_px']:>10.2f}{r['ms_per_image']:>10.2f}{r['speedup']:>8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to", nargs="+", choices=["tflite", "onnx"], default=["tflite"])
+    parser.add_argument("--quantize", choices=["none", "dynamic", "float16", "int8"], default="none",
+                        help="TFLite quantization mode")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset")
+    parser.add_argument("--calibration-dir", help="Folder of sample cephalograms (int8 calibration + accuracy check)")
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--check-only", action="store_true", help="Skip conversion, only compare existing files")
+    args = parser.parse_args(argv)
+
+    inputs = load_inputs(args.calibration_dir, limit=args.samples)
+
+    if not args.check_only:
+        if "tflite" in args.to:
+            out = convert_tflite(inference_backends.MODEL_PATH, inference_backends.TFLITE_MODEL_PATH,
+                                 args.quantize, inputs)
+            print(f"✅ Wrote {out} ({os.path.getsize(out) / 1024:.0f} KiB, quantize={args.quantize})")
+        if "onnx" in args.to:
+            out = convert_onnx(inference_backends.MODEL_PATH, inference_backends.ONNX_MODEL_PATH, args.opset)
+            print(f"✅ Wrote {out} ({os.path.getsize(out) / 1024:.0f} KiB, opset={args.opset})")
+
+    print_report(check_accuracy(args.to, inputs, batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
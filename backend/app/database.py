@@ -0,0 +1,174 @@
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+import asyncio
+import os
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+
+# --- CONNECTION CONFIG ---
+# Pool sizing (file-backed SQLite and Postgres; in-memory SQLite uses one connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; Postgres only
+# SQLite pragmas applied to every new connection. WAL lets readers run while
+# /predict writes; NORMAL sync is durable at checkpoint granularity under WAL.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Async path for the API handlers (aiosqlite / asyncpg); the sync engine stays
+# for worker threads and scripts. DB_ASYNC=0, or a missing driver, falls back
+# to running the sync session in a thread.
+DB_ASYNC = os.getenv("DB_ASYNC", "1") == "1"
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (DATABASE_URL in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in DATABASE_URL)
+
+
+def engine_options(url=DATABASE_URL):
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}}
+        if not IS_SQLITE_MEMORY:
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_conn, connection_record=None):
+    cursor = dbapi_conn.cursor()
+    try:
+        if not IS_SQLITE_MEMORY:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **engine_options())
+if IS_SQLITE:
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base = declarative_base()
+
+
+# --- ASYNC SESSIONS ---
+def async_url(url=DATABASE_URL):
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+")[0]
+    driver = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "postgres": "asyncpg"}.get(dialect)
+    if driver is None:
+        raise ValueError(f"No async driver known for {scheme!r}")
+    return f"{'postgresql' if driver == 'asyncpg' else dialect}+{driver}://{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")  # default: derived from DATABASE_URL
+
+_async_engine = None
+_async_sessionmaker = None
+_async_unavailable = None
+
+
+def get_async_sessionmaker():
+    """Lazily build the async engine; None if async is off or the driver is missing."""
+    global _async_engine, _async_sessionmaker, _async_unavailable
+    if _async_sessionmaker is not None or _async_unavailable is not None:
+        return _async_sessionmaker
+    if not DB_ASYNC:
+        _async_unavailable = "disabled by DB_ASYNC=0"
+        return None
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        url = ASYNC_DATABASE_URL or async_url()
+        options = engine_options(url)
+        options.pop("connect_args", None)
+        _async_engine = create_async_engine(url, **options)
+    except (ImportError, ValueError) as e:
+        _async_unavailable = str(e)
+        print(f"⚠️ Async DB driver unavailable ({e}); API handlers will use threaded sync sessions")
+        return None
+    if IS_SQLITE:
+        event.listen(_async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    print(f"✅ Async DB engine ready ({_async_engine.url.drivername})")
+    return _async_sessionmaker
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+class ThreadedSession:
+    """AsyncSession-shaped wrapper that runs a sync Session in worker threads."""
+
+    def __init__(self):
+        self._session = SessionLocal(expire_on_commit=False)
+
+    def add(self, instance):
+        self._session.add(instance)
+
+    def add_all(self, instances):
+        self._session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await asyncio.to_thread(self._session.execute, statement, *args, **kwargs)
+
+    async def get(self, entity, ident):
+        return await asyncio.to_thread(self._session.get, entity, ident)
+
+    async def delete(self, instance):
+        await asyncio.to_thread(self._session.delete, instance)
+
+    async def commit(self):
+        await asyncio.to_thread(self._session.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self._session.rollback)
+
+    async def refresh(self, instance):
+        await asyncio.to_thread(self._session.refresh, instance)
+
+    async def close(self):
+        await asyncio.to_thread(self._session.close)
+
+
+async def get_async_db():
+    """FastAPI dependency: AsyncSession, or a ThreadedSession fallback."""
+    maker = get_async_sessionmaker()
+    db = maker() if maker is not None else ThreadedSession()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+def ensure_columns(table, columns, bind=engine):
+    """Add columns that create_all() cannot add to an existing table.
+
+    columns: dict column_name -> SQL type/default clause, e.g. {"status": "VARCHAR"}
+    bind: an Engine (own transaction) or a Connection already in one.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return ensure_columns(table, columns, conn)
+    existing = {c["name"] for c in inspect(bind).get_columns(table)}
+    for name, ddl in columns.items():
+        if name not in existing:
+            bind.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
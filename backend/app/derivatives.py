@@ -0,0 +1,208 @@
+"""
+Viewer-sized image derivatives of uploads and overlays.
+
+Instead of shipping the multi-megabyte original to every <img>, the viewer asks
+for a named size (thumb / preview / full) in WebP or JPEG, plus an optional
+Deep Zoom (DZI) tile pyramid for pan-and-zoom. Derivatives are produced on
+first request and written under DERIVATIVE_DIR, named by a key over the source
+file's identity (path, size, mtime) and the variant, so they never go stale and
+can be served with strong ETags and long-lived Cache-Control. Serving goes
+through FileResponse, which handles Range / If-Range. A served derivative's
+mtime is bumped (at most every DERIVATIVE_TOUCH_INTERVAL) so the artifact GC
+expires the ones nobody has fetched for a while, not the oldest ones.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import Image
+
+from . import metrics
+
+# --- DERIVATIVE CONFIG ---
+DERIVATIVE_DIR = os.getenv("DERIVATIVE_DIR", os.path.join("outputs", "derived"))
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "82"))
+DERIVATIVE_MAX_AGE = int(os.getenv("DERIVATIVE_MAX_AGE", str(7 * 24 * 3600)))  # s; keys change with the source
+TILE_SIZE = int(os.getenv("DERIVATIVE_TILE_SIZE", "256"))
+DERIVATIVE_TOUCH_INTERVAL = int(os.getenv("DERIVATIVE_TOUCH_INTERVAL", str(24 * 3600)))  # s; recency granularity
+
+SIZES = {"thumb": 256, "preview": 1024, "full": None}  # longest side in px (None: original)
+FORMATS = {"webp": ("image/webp", "WEBP"), "jpeg": ("image/jpeg", "JPEG")}
+KINDS = ("overlay", "upload")
+
+_locks = {}  # derivative key -> Lock, so concurrent first requests render once
+_locks_guard = threading.Lock()
+
+
+class SourceMissing(Exception):
+    """The prediction has no such image (not rendered yet, or deleted)."""
+
+
+# --- KEYS ---
+def source_path(pred, kind):
+    path = pred.image_path if kind == "overlay" else pred.upload_path
+    if not path or not os.path.exists(path):
+        raise SourceMissing(f"No {kind} image for prediction {pred.id}")
+    return path
+
+
+def _source_id(path):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}\0{st.st_size}\0{st.st_mtime_ns}"
+
+
+def key_for(path, variant):
+    return hashlib.sha256(f"{_source_id(path)}\0{variant}\0{DERIVATIVE_QUALITY}".encode()).hexdigest()
+
+
+def etag(key):
+    return f'"{key[:32]}"'
+
+
+def _target(key, ext):
+    # Two-level sharding keeps directories small
+    return os.path.join(DERIVATIVE_DIR, key[:2], f"{key}.{ext}")
+
+
+def negotiate(fmt, accept):
+    """'auto' picks WebP when the client advertises it, else JPEG."""
+    if fmt == "auto":
+        return "webp" if "image/webp" in (accept or "") else "jpeg"
+    return fmt
+
+
+def image_url(pred_id, kind="overlay", size="thumb", fmt="auto"):
+    return f"http://localhost:8000/predictions/{pred_id}/image?kind={kind}&size={size}&format={fmt}"
+
+
+def headers_for(key, vary=False):
+    headers = {"ETag": etag(key), "Cache-Control": f"private, max-age={DERIVATIVE_MAX_AGE}"}
+    if vary:
+        headers["Vary"] = "Accept"
+    return headers
+
+
+def touch(path):
+    """Record a cache hit in the file's mtime (throttled: one metadata write per interval)."""
+    try:
+        if time.time() - os.path.getmtime(path) >= DERIVATIVE_TOUCH_INTERVAL:
+            os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+# --- GENERATION ---
+@contextmanager
+def _generating(key):
+    """Serialize generation of one key. The lock is dropped afterwards; a late
+    duplicate render is harmless because files are replaced atomically."""
+    with _locks_guard:
+        lock = _locks.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            yield
+    finally:
+        with _locks_guard:
+            if _locks.get(key) is lock:
+                del _locks[key]
+
+
+def save(img, target, fmt):
+    """Encode `img` as `fmt` (webp / jpeg) to `target`, atomically."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{threading.get_ident()}.tmp"
+    pil_format = FORMATS[fmt][1]
+    options = {"quality": DERIVATIVE_QUALITY}
+    if pil_format == "WEBP":
+        options["method"] = 4
+    else:
+        options.update(optimize=True, progressive=img.width * img.height > 512 * 512)
+    img.save(tmp, format=pil_format, **options)
+    os.replace(tmp, target)
+
+
+def open_scaled(path, longest):
+    """Open `path` as RGB no larger than `longest` px (JPEG decodes at reduced scale)."""
+    img = Image.open(path)
+    if longest:
+        img.draft("RGB", (longest, longest))
+    img = img.convert("RGB")
+    if longest and max(img.size) > longest:
+        img.thumbnail((longest, longest), Image.LANCZOS)
+    return img
+
+
+def ensure(path, size="preview", fmt="jpeg"):
+    """Derivative file for `path` (generated on first use); returns (file, key)."""
+    key = key_for(path, f"{size}.{fmt}")
+    target = _target(key, fmt)
+    if os.path.exists(target):
+        touch(target)
+        return target, key
+    with _generating(key):
+        if not os.path.exists(target):
+            with metrics.stage("derivative"):
+                save(open_scaled(path, SIZES[size]), target, fmt)
+    return target, key
+
+
+# --- DEEP ZOOM TILES ---
+def pyramid(width, height):
+    """Deep Zoom level sizes: level L is the image halved (max_level - L) times."""
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    return [
+        (max(1, math.ceil(width / 2 ** (max_level - level))), max(1, math.ceil(height / 2 ** (max_level - level))))
+        for level in range(max_level + 1)
+    ]
+
+
+def dzi(path, fmt="jpeg"):
+    with Image.open(path) as img:  # header only
+        w, h = img.size
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{fmt}" '
+        f'Overlap="0" TileSize="{TILE_SIZE}"><Size Width="{w}" Height="{h}"/></Image>'
+    )
+
+
+def tile(path, level, col, row, fmt="jpeg", source_key=None):
+    """One Deep Zoom tile; the whole level is cut and cached on first request.
+
+    `source_key` identifies the source image when its path/mtime does not
+    (cached overlays are touched on every hit); default: key_for(path).
+    """
+    variant = f"tiles.{level}.{fmt}.{TILE_SIZE}"
+    if source_key is None:
+        level_key = key_for(path, variant)
+    else:
+        level_key = hashlib.sha256(f"{source_key}\0{variant}\0{DERIVATIVE_QUALITY}".encode()).hexdigest()
+    level_dir = os.path.join(DERIVATIVE_DIR, level_key[:2], level_key)
+    target = os.path.join(level_dir, f"{col}_{row}.{fmt}")
+    key = hashlib.sha256(f"{level_key}\0{col}_{row}".encode()).hexdigest()
+    if os.path.exists(target):
+        touch(target)
+        return target, key
+    with Image.open(path) as img:
+        levels = pyramid(*img.size)
+    if not 0 <= level < len(levels):
+        raise ValueError(f"Level {level} out of range")
+    lw, lh = levels[level]
+    if not (0 <= col < math.ceil(lw / TILE_SIZE) and 0 <= row < math.ceil(lh / TILE_SIZE)):
+        raise ValueError(f"Tile {col}_{row} out of range for level {level}")
+
+    with _generating(level_key):
+        if not os.path.exists(target):
+            with metrics.stage("tiles"):
+                img = open_scaled(path, max(lw, lh))
+                if img.size != (lw, lh):
+                    img = img.resize((lw, lh), Image.LANCZOS)
+                for y in range(0, lh, TILE_SIZE):
+                    for x in range(0, lw, TILE_SIZE):
+                        piece = img.crop((x, y, min(x + TILE_SIZE, lw), min(y + TILE_SIZE, lh)))
+                        save(piece, os.path.join(level_dir, f"{x // TILE_SIZE}_{y // TILE_SIZE}.{fmt}"), fmt)
+    return target, key
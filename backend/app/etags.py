@@ -0,0 +1,21 @@
+"""
+Conditional-request helpers shared by the cached binary endpoints
+(reports, image derivatives).
+"""
+
+from fastapi import Response
+
+
+def matches(if_none_match, etag):
+    """If-None-Match check (RFC 9110: `*` or a comma-separated list, weak or strong)."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def not_modified(request, headers):
+    """A 304 for `request` if it already holds headers["ETag"], else None."""
+    if matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,113 @@
+"""
+On-demand landmark exports rendered from the stored Prediction landmarks.
+
+Nothing is written at prediction time; CSV / JSON / XLSX files are produced
+when someone actually downloads them and kept in a small in-memory LRU of
+rendered bytes. pandas/openpyxl are only imported for XLSX.
+"""
+
+import csv
+import io
+import json
+import os
+
+from . import jobs, metrics
+from .lru import LRUCache
+
+# --- EXPORT CONFIG ---
+EXPORT_CACHE_ITEMS = int(os.getenv("EXPORT_CACHE_ITEMS", "128"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "json": ("application/json", "json"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+COLUMNS = ["name", "x", "y"]
+
+_rendered = LRUCache(max_items=EXPORT_CACHE_ITEMS, max_bytes=EXPORT_CACHE_MAX_BYTES)
+
+
+class NotCompleted(Exception):
+    """A prediction whose landmarks are not final (job pending, running or failed)."""
+
+
+def completed(pred):
+    return (pred.status or jobs.COMPLETED) == jobs.COMPLETED
+
+
+def export_url(pred_id, fmt="xlsx"):
+    return f"http://localhost:8000/predictions/{pred_id}/export?format={fmt}"
+
+
+def _rows(pred):
+    return [{col: lm.get(col) for col in COLUMNS} for lm in pred.landmarks]
+
+
+def _render_csv(preds, bundle):
+    buf = io.StringIO()
+    columns = (["prediction_id"] if bundle else []) + COLUMNS
+    writer = csv.DictWriter(buf, fieldnames=columns)
+    writer.writeheader()
+    for pred in preds:
+        for row in _rows(pred):
+            if bundle:
+                row["prediction_id"] = pred.id
+            writer.writerow(row)
+    return buf.getvalue().encode("utf-8")
+
+
+def _render_json(preds, bundle):
+    def one(pred):
+        return {
+            "id": pred.id,
+            "patient_id": pred.patient_id,
+            "model_name": pred.model_name,
+            "created_at": pred.created_at.isoformat() if pred.created_at else None,
+            "landmarks": _rows(pred),
+        }
+
+    payload = [one(p) for p in preds] if bundle else one(preds[0])
+    return json.dumps(payload).encode("utf-8")
+
+
+def _render_xlsx(preds, bundle):
+    import pandas as pd
+
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        for pred in preds:
+            sheet = f"prediction_{pred.id}" if bundle else "landmarks"
+            pd.DataFrame(_rows(pred), columns=COLUMNS).to_excel(writer, sheet_name=sheet, index=False)
+    return buf.getvalue()
+
+
+_RENDERERS = {"csv": _render_csv, "json": _render_json, "xlsx": _render_xlsx}
+
+
+def render(preds, fmt, bundle=False):
+    """Return (content bytes, media type, file extension) for `preds` in `fmt`.
+
+    Only completed predictions are exported (NotCompleted otherwise); they
+    are immutable from then on, so ids + format is a safe key.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not preds:
+        raise ValueError("Nothing to export")
+    pending = [p.id for p in preds if not completed(p)]
+    if pending:
+        raise NotCompleted(f"Prediction(s) {', '.join(map(str, pending))} not completed yet")
+
+    media_type, ext = FORMATS[fmt]
+    key = (fmt, bundle, tuple(p.id for p in preds))
+    content = _rendered.get(key)
+    if content is None:
+        with metrics.stage(f"export_{fmt}"):
+            content = _RENDERERS[fmt](preds, bundle)
+        _rendered.put(key, content)
+    return content, media_type, ext
+
+
+def cache_stats():
+    return _rendered.stats()
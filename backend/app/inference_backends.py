@@ -0,0 +1,125 @@
+"""
+CPU inference backends for the landmark model.
+
+All backends expose `predict_on_batch(batch) -> np.ndarray` over a float32
+(N, 256, 256, 1) batch, so the batcher does not care which one is serving.
+Selected with INFERENCE_BACKEND = keras | tflite | onnx.
+"""
+
+import os
+
+import numpy as np
+
+# --- BACKEND CONFIG ---
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras").lower()
+MODEL_PATH = os.getenv("MODEL_PATH", "ceph_landmark_model.h5")
+TFLITE_MODEL_PATH = os.getenv("TFLITE_MODEL_PATH", os.path.splitext(MODEL_PATH)[0] + ".tflite")
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", os.path.splitext(MODEL_PATH)[0] + ".onnx")
+# 0 lets the runtime pick (usually one thread per physical core)
+INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.getenv("INFERENCE_INTER_OP_THREADS", "0"))
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, path=MODEL_PATH):
+        import tensorflow as tf
+
+        if INTRA_OP_THREADS:
+            tf.config.threading.set_intra_op_parallelism_threads(INTRA_OP_THREADS)
+        if INTER_OP_THREADS:
+            tf.config.threading.set_inter_op_parallelism_threads(INTER_OP_THREADS)
+        self.path = path
+        self.model = tf.keras.models.load_model(path, compile=False)
+
+    def predict_on_batch(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """TFLite interpreter; handles float, dynamic-range and full-int8 models."""
+
+    name = "tflite"
+
+    def __init__(self, path=TFLITE_MODEL_PATH):
+        try:
+            from tflite_runtime.interpreter import Interpreter  # slim runtime if installed
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.path = path
+        self.interpreter = Interpreter(model_path=path, num_threads=INTRA_OP_THREADS or None)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch = int(self._input["shape"][0])
+
+    def _resize(self, n):
+        if n != self._batch:
+            self.interpreter.resize_tensor_input(self._input["index"], [n] + list(self._input["shape"][1:]))
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch = n
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        self._resize(batch.shape[0])
+
+        dtype = self._input["dtype"]
+        if dtype != np.float32:
+            scale, zero_point = self._input["quantization"]
+            batch = np.round(batch / scale + zero_point)
+            info = np.iinfo(dtype)
+            batch = np.clip(batch, info.min, info.max).astype(dtype)
+
+        self.interpreter.set_tensor(self._input["index"], batch)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self._output["index"])
+
+        if self._output["dtype"] != np.float32:
+            scale, zero_point = self._output["quantization"]
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path=ONNX_MODEL_PATH):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if INTRA_OP_THREADS:
+            opts.intra_op_num_threads = INTRA_OP_THREADS
+        if INTER_OP_THREADS:
+            opts.inter_op_num_threads = INTER_OP_THREADS
+            opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def backend_path(name=INFERENCE_BACKEND):
+    return {"keras": MODEL_PATH, "tflite": TFLITE_MODEL_PATH, "onnx": ONNX_MODEL_PATH}[name]
+
+
+def load_backend(name=INFERENCE_BACKEND, path=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND {name!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](path or backend_path(name))
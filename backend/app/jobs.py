@@ -0,0 +1,212 @@
+"""
+Job-based predictions: the upload returns a `pending` Prediction right away and
+the work happens on the inference pool in two stages.
+
+    pending -> running -> inferred -> rendering -> completed
+                                  \\-> failed (at any stage)
+
+Landmarks are written as soon as the model finishes (`inferred`). Overlays are
+drawn on demand, so the job completes there; with OVERLAY_PRERENDER the overlay
+is rendered by a follow-up pool job (`rendering`) as before. Every transition is published to
+in-process subscribers, which is what the SSE endpoint streams; the stream also
+re-reads the row every JOB_EVENTS_POLL_SECONDS, because with several workers
+the job may be running in another process.
+
+A job lives only in the process that accepted it. Rows still unfinished after
+JOB_STALE_SECONDS (the process died or restarted) are marked failed at startup
+and whenever they are read, so pollers and SSE clients are not left waiting.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from . import database, landmark_codec, metrics, models, ml_inference, overlays, reports, workers
+
+PENDING = "pending"
+RUNNING = "running"
+INFERRED = "inferred"
+RENDERING = "rendering"
+COMPLETED = "completed"
+FAILED = "failed"
+TERMINAL = (COMPLETED, FAILED)
+
+# --- JOB CONFIG ---
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "5"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "900"))  # far above any normal queue + run time
+STALE_ERROR = "Job did not finish (the server restarted or the worker died)"
+
+_subscribers = {}  # prediction id -> set of (loop, asyncio.Queue)
+_lock = threading.Lock()
+
+
+# --- EVENTS ---
+def subscribe(pred_id):
+    """Register an asyncio.Queue that receives this prediction's status events."""
+    queue = asyncio.Queue()
+    entry = (asyncio.get_running_loop(), queue)
+    with _lock:
+        _subscribers.setdefault(pred_id, set()).add(entry)
+    return entry
+
+
+def unsubscribe(pred_id, entry):
+    with _lock:
+        subs = _subscribers.get(pred_id)
+        if subs is not None:
+            subs.discard(entry)
+            if not subs:
+                del _subscribers[pred_id]
+
+
+def publish(pred_id, event):
+    """Fan an event out to subscribers; safe to call from worker threads."""
+    with _lock:
+        subs = list(_subscribers.get(pred_id, ()))
+    for loop, queue in subs:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:
+            pass  # subscriber's loop already closed
+
+
+def output_image(pred_id, image_path, status):
+    """Overlay URL: the pre-rendered file if there is one, else the on-demand endpoint."""
+    if image_path:
+        return ml_inference.artifact_url(image_path)
+    return overlays.url(pred_id) if (status or COMPLETED) == COMPLETED else None
+
+
+def status_payload(pred):
+    landmarks = pred.landmarks
+    return {
+        "id": pred.id,
+        "patient_id": pred.patient_id,
+        "status": pred.status or COMPLETED,
+        "num_landmarks": len(landmarks),
+        "processing_time": pred.processing_time,
+        "output_image": output_image(pred.id, pred.image_path, pred.status),
+        "error": pred.error,
+    }
+
+
+def _update(pred_id, **fields):
+    db = database.SessionLocal()
+    try:
+        pred = db.query(models.Prediction).filter(models.Prediction.id == pred_id).first()
+        if pred is None:
+            return None
+        for k, v in fields.items():
+            setattr(pred, k, v)
+        with metrics.stage("db_commit"):
+            db.commit()
+        db.refresh(pred)
+        payload = status_payload(pred)
+    finally:
+        db.close()
+    publish(pred_id, payload)
+    return payload
+
+
+# --- STALE JOBS ---
+def _stale_cutoff(max_age=None):
+    return datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS if max_age is None else max_age)
+
+
+def is_stale(pred):
+    return (
+        (pred.status or COMPLETED) not in TERMINAL
+        and pred.created_at is not None
+        and pred.created_at < _stale_cutoff()
+    )
+
+
+def fail_stale(max_age=None):
+    """Mark unfinished jobs older than `max_age` seconds failed; returns how many."""
+    P = models.Prediction
+    db = database.SessionLocal()
+    try:
+        count = db.query(P).filter(
+            P.status.isnot(None), P.status.notin_(TERMINAL), P.created_at < _stale_cutoff(max_age)
+        ).update({"status": FAILED, "error": STALE_ERROR}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    if count:
+        print(f"⚠️ Marked {count} unfinished prediction job(s) failed")
+    return count
+
+
+def load_payload(pred_id):
+    """Status payload read from the database (None if the row is gone); fails a stale job."""
+    db = database.SessionLocal()
+    try:
+        pred = db.get(models.Prediction, pred_id)
+        if pred is None:
+            return None
+        if not is_stale(pred):
+            return status_payload(pred)
+    finally:
+        db.close()
+    return _update(pred_id, status=FAILED, error=STALE_ERROR)
+
+
+# --- STAGES ---
+def _fail(pred_id, started, e):
+    print(f"❌ Prediction {pred_id} failed: {e}")
+    metrics.PREDICTIONS.inc("failed")
+    _update(pred_id, status=FAILED, error=str(e), processing_time=round(time.time() - started, 3))
+
+
+def run_inference(pred_id, source, digest, user_key, started):
+    """Stage 1 (pool job): landmarks only, then queue the render stage."""
+    try:
+        _update(pred_id, status=RUNNING)
+        landmarks = ml_inference.predict_from_bytes(source, digest)["landmarks"]
+        _update(pred_id, status=INFERRED, **landmark_codec.columns(landmarks))
+    except Exception as e:
+        _fail(pred_id, started, e)
+        return
+
+    if not overlays.OVERLAY_PRERENDER:
+        _update(pred_id, status=COMPLETED, processing_time=round(time.time() - started, 3))
+        metrics.PREDICTIONS.inc("completed")
+        reports.pregenerate(pred_id)
+        return
+    try:
+        workers.get_pool().submit(user_key, run_render, pred_id, source, digest, landmarks, started)
+    except workers.PoolSaturated:
+        # Landmarks are already stored; don't drop the overlay just because the
+        # queue is momentarily full.
+        run_render(pred_id, source, digest, landmarks, started)
+
+
+def run_render(pred_id, source, digest, landmarks, started):
+    """Stage 2 (pool job): render the overlay and mark the prediction completed."""
+    try:
+        pred = _update(pred_id, status=RENDERING)
+        if pred is None:
+            return
+        image_rel = ml_inference.render_overlay(source, landmarks, pred["patient_id"], digest)
+        _update(
+            pred_id,
+            status=COMPLETED,
+            image_path=image_rel.replace("\\", "/"),
+            processing_time=round(time.time() - started, 3),
+        )
+    except Exception as e:
+        _fail(pred_id, started, e)
+        return
+    metrics.PREDICTIONS.inc("completed")
+    reports.pregenerate(pred_id)
+
+
+def submit(pred_id, source, user_key, started=None, digest=None):
+    """Queue a pending prediction for an upload (saved file path or bytes).
+
+    Raises workers.PoolSaturated when the pool is full.
+    """
+    started = started or time.time()
+    return workers.get_pool().submit(user_key, run_inference, pred_id, source, digest, user_key, started)
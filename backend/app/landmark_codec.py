@@ -0,0 +1,219 @@
+"""
+Packed landmark storage.
+
+A prediction's landmarks are stored as one little-endian float32 blob of
+interleaved x,y pairs plus the id of a shared name schema (`landmark_schemas`),
+instead of a JSON list that repeats {"name", "x", "y"} for every point. The
+blob decodes straight into NumPy for bulk work and into the [{name, x, y}]
+list the API returns. Rows written before this, or with
+LANDMARK_STORAGE=json, keep the JSON form; readers handle both.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from sqlalchemy import exc, select
+
+from . import database, models
+
+# --- LANDMARK STORAGE CONFIG ---
+# packed: blob only | json: legacy JSON only | both: write both (rollback safety)
+LANDMARK_STORAGE = os.getenv("LANDMARK_STORAGE", "packed").lower()
+
+DTYPE = np.dtype("<f4")
+POINT_BYTES = 2 * DTYPE.itemsize
+
+_schemas = {}      # id -> tuple(names)
+_schema_ids = {}   # digest -> id
+_lock = threading.Lock()
+
+
+# --- NAME SCHEMAS ---
+def _digest(names):
+    return hashlib.sha256(json.dumps(list(names)).encode()).hexdigest()
+
+
+def _remember(schema_id, digest, names):
+    with _lock:
+        _schemas[schema_id] = tuple(names)
+        _schema_ids[digest] = schema_id
+
+
+def load_schemas(bind=None):
+    """Prime the in-process schema cache (called at startup)."""
+    table = models.LandmarkSchema.__table__
+    with (bind or database.engine).connect() as conn:
+        for row in conn.execute(select(table.c.id, table.c.digest, table.c.names)):
+            _remember(row.id, row.digest, row.names)
+
+
+def schema_id(names, conn=None):
+    """Id of the schema for this ordered name list, registering it if new."""
+    digest = _digest(names)
+    cached = _schema_ids.get(digest)
+    if cached is not None:
+        return cached
+    if conn is None:
+        try:
+            with database.engine.begin() as own:
+                return schema_id(names, own)
+        except exc.IntegrityError:
+            # A concurrent first registration of the same list won the unique
+            # digest; its row is committed now, so the lookup finds it.
+            with database.engine.connect() as own:
+                return schema_id(names, own)
+
+    table = models.LandmarkSchema.__table__
+    found = conn.execute(select(table.c.id).where(table.c.digest == digest)).scalar()
+    if found is None:
+        # Unique digest: with a caller's connection a concurrent registration
+        # fails the caller's transaction (migrations run serialized).
+        found = conn.execute(table.insert().values(digest=digest, names=list(names))).inserted_primary_key[0]
+    _remember(found, digest, names)
+    return found
+
+
+def schema_names(sid, conn=None):
+    names = _schemas.get(sid)
+    if names is None:
+        table = models.LandmarkSchema.__table__
+        stmt = select(table.c.digest, table.c.names).where(table.c.id == sid)
+        if conn is None:
+            with database.engine.connect() as own:
+                row = own.execute(stmt).first()
+        else:
+            row = conn.execute(stmt).first()
+        if row is None:
+            raise KeyError(f"Unknown landmark schema {sid}")
+        _remember(sid, row.digest, row.names)
+        names = _schemas[sid]
+    return names
+
+
+async def load_missing(db, *sids):
+    """Cache the names of schema ids this process has not seen, via an async session.
+
+    Async handlers decode landmarks on the event loop, where schema_names()'s
+    fallback query would block; a schema registered by another worker after
+    startup is fetched here instead.
+    """
+    missing = {sid for sid in sids if sid is not None and sid not in _schemas}
+    if not missing:
+        return
+    table = models.LandmarkSchema.__table__
+    rows = await db.execute(select(table.c.id, table.c.digest, table.c.names).where(table.c.id.in_(missing)))
+    for row in rows.all():
+        _remember(row.id, row.digest, row.names)
+
+
+# --- ENCODE / DECODE ---
+def pack(landmarks):
+    """[{name, x, y}] -> (names, float32 blob)."""
+    names = [lm["name"] for lm in landmarks]
+    coords = np.array([(lm["x"], lm["y"]) for lm in landmarks], dtype=DTYPE).reshape(-1, 2)
+    return names, coords.tobytes()
+
+
+def unpack(blob):
+    """Blob -> (N, 2) float32 array (read-only view over the bytes)."""
+    return np.frombuffer(blob, dtype=DTYPE).reshape(-1, 2)
+
+
+def to_landmarks(sid, blob, conn=None):
+    names = schema_names(sid, conn)
+    coords = unpack(blob).tolist()
+    return [{"name": n, "x": x, "y": y} for n, (x, y) in zip(names, coords)]
+
+
+def decode_row(result, sid, blob):
+    if blob is not None and sid is not None:
+        return to_landmarks(sid, blob)
+    return result or []
+
+
+def fingerprint(pred):
+    """sha256 hex of a prediction's stored landmarks, whichever form they are in."""
+    h = hashlib.sha256()
+    if pred.landmarks_packed is not None:
+        h.update(f"{pred.landmark_schema_id}\0".encode())
+        h.update(pred.landmarks_packed)
+    else:
+        h.update(json.dumps(pred.result).encode())
+    return h.hexdigest()
+
+
+def columns(landmarks, conn=None):
+    """Prediction column values for a landmark list under LANDMARK_STORAGE."""
+    if landmarks is None or LANDMARK_STORAGE == "json":
+        return {"result": landmarks, "landmark_schema_id": None, "landmarks_packed": None}
+    names, blob = pack(landmarks)
+    return {
+        "result": landmarks if LANDMARK_STORAGE == "both" else None,
+        "landmark_schema_id": schema_id(names, conn),
+        "landmarks_packed": blob,
+    }
+
+
+def decode_many(blobs):
+    """Equal-length blobs -> (N, K, 2) float32 array in one pass."""
+    if not blobs:
+        return np.empty((0, 0, 2), dtype=DTYPE)
+    return np.frombuffer(b"".join(blobs), dtype=DTYPE).reshape(len(blobs), -1, 2)
+
+
+# --- BULK QUERIES ---
+def group_arrays(rows):
+    """(id, schema_id, blob, result) rows -> NumPy arrays grouped by name schema.
+
+    Returns {schema_id: (ids int64 (N,), coords float32 (N, K, 2), names)}.
+    JSON-only rows are packed on the fly and grouped the same way.
+    """
+    groups = {}  # schema id -> ([ids], [blobs])
+    for pid, sid, blob, result in rows:
+        if blob is None:
+            if not result:
+                continue
+            names, blob = pack(result)
+            sid = schema_id(names)
+        ids, blobs = groups.setdefault(sid, ([], []))
+        ids.append(pid)
+        blobs.append(blob)
+    return {
+        sid: (np.asarray(ids, dtype=np.int64), decode_many(blobs), schema_names(sid))
+        for sid, (ids, blobs) in groups.items()
+    }
+
+
+def load_arrays(db, *criteria):
+    """Landmarks of matching predictions as NumPy (see group_arrays)."""
+    P = models.Prediction
+    stmt = select(P.id, P.landmark_schema_id, P.landmarks_packed, P.result).where(*criteria).order_by(P.id)
+    return group_arrays(db.execute(stmt))
+
+
+def pack_existing(conn, batch_size=1000, keep_json=None):
+    """Data migration: pack JSON-only rows; drop their JSON unless keep_json."""
+    keep_json = LANDMARK_STORAGE != "packed" if keep_json is None else keep_json
+    table = models.Prediction.__table__
+    last_id, converted = 0, 0
+    while True:
+        rows = conn.execute(
+            select(table.c.id, table.c.result)
+            .where(table.c.id > last_id, table.c.landmarks_packed.is_(None), table.c.result.isnot(None))
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return converted
+        for pid, result in rows:
+            if result:
+                names, blob = pack(result)
+                values = {"landmark_schema_id": schema_id(names, conn), "landmarks_packed": blob}
+                if not keep_json:
+                    values["result"] = None
+                conn.execute(table.update().where(table.c.id == pid).values(**values))
+                converted += 1
+        last_id = rows[-1][0]
@@ -0,0 +1,168 @@
+"""
+Keyset-paginated, column-projected listings for patients and predictions.
+
+Pages are ordered newest first by primary key and continue from an opaque
+cursor (`id < last id`), so fetching page N costs the same as page 1. Only the
+requested columns are selected; the landmark payload (JSON `result` or the
+packed blob) is not loaded unless `landmarks` is asked for, and
+`num_landmarks` is computed in SQL.
+"""
+
+import base64
+import json
+import os
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from . import derivatives, exports, jobs, landmark_codec, models
+
+# --- LISTING CONFIG ---
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "100"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "500"))
+
+P = models.Prediction
+
+# field -> (SQL column or tuple of columns, value formatter)
+PATIENT_FIELDS = {
+    "id": (models.Patient.id, None),
+    "name": (models.Patient.name, None),
+    "dob": (models.Patient.dob, None),
+    "notes": (models.Patient.notes, None),
+    "created_at": (models.Patient.created_at, None),
+}
+
+PREDICTION_FIELDS = {
+    "id": (P.id, None),
+    "patient_id": (P.patient_id, None),
+    "model_name": (P.model_name, None),
+    "created_at": (P.created_at, None),
+    "status": (P.status, lambda v: v or "completed"),
+    "processing_time": (P.processing_time, None),
+    "error": (P.error, None),
+    "num_landmarks": (
+        func.coalesce(
+            func.json_array_length(P.result),
+            func.length(P.landmarks_packed) / landmark_codec.POINT_BYTES,
+            0,
+        ),
+        None,
+    ),
+    "output_image": ((P.id, P.image_path, P.status), jobs.output_image),
+    "thumbnail_url": (
+        (P.id, P.status),
+        lambda pid, status: derivatives.image_url(pid) if (status or jobs.COMPLETED) == jobs.COMPLETED else None,
+    ),
+    "excel_file": (
+        (P.id, P.status),
+        lambda pid, status: exports.export_url(pid) if (status or jobs.COMPLETED) == jobs.COMPLETED else None,
+    ),
+    "landmarks": ((P.result, P.landmark_schema_id, P.landmarks_packed), landmark_codec.decode_row),
+}
+# Everything but the landmark blob
+PREDICTION_SUMMARY = [f for f in PREDICTION_FIELDS if f != "landmarks"]
+
+
+# --- CURSORS ---
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields, available, default):
+    """Comma-separated field list -> ordered field names (id always included)."""
+    if not fields:
+        return list(default)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s) {', '.join(unknown)}; available: {', '.join(available)}",
+        )
+    return ["id"] + [f for f in dict.fromkeys(names) if f != "id"]
+
+
+def _columns(field_map, names):
+    columns = []
+    for name in names:
+        column = field_map[name][0]
+        if isinstance(column, tuple):
+            columns += [c.label(f"{name}__{i}") for i, c in enumerate(column)]
+        else:
+            columns.append(column.label(name))
+    return columns
+
+
+def _query(columns, id_column, cursor, limit, *criteria):
+    limit = max(1, min(limit or LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE))
+    stmt = select(*columns).where(*criteria)
+    after = decode_cursor(cursor)
+    if after is not None:
+        stmt = stmt.where(id_column < after)
+    return stmt.order_by(id_column.desc()).limit(limit + 1), limit
+
+
+def _page(rows, field_map, names, limit):
+    items = []
+    for row in rows[:limit]:
+        values = row._mapping
+        item = {}
+        for name in names:
+            column, fmt = field_map[name]
+            if isinstance(column, tuple):
+                item[name] = fmt(*(values[f"{name}__{i}"] for i in range(len(column))))
+            else:
+                item[name] = fmt(values[name]) if fmt else values[name]
+        items.append(item)
+    next_cursor = encode_cursor(items[-1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
+
+
+# --- LISTINGS ---
+def patients_query(principal, cursor=None, limit=None, fields=None):
+    names = parse_fields(fields, PATIENT_FIELDS, PATIENT_FIELDS)
+    criteria = [] if principal.is_admin else [models.Patient.owner_id == principal.id]
+    columns = _columns(PATIENT_FIELDS, names)
+    stmt, limit = _query(columns, models.Patient.id, cursor, limit, *criteria)
+    return stmt, PATIENT_FIELDS, names, limit
+
+
+def predictions_query(patient_id, cursor=None, limit=None, fields=None):
+    names = parse_fields(fields, PREDICTION_FIELDS, PREDICTION_SUMMARY)
+    columns = _columns(PREDICTION_FIELDS, names)
+    stmt, limit = _query(columns, P.id, cursor, limit, P.patient_id == patient_id)
+    return stmt, PREDICTION_FIELDS, names, limit
+
+
+def patients_page(db, principal, cursor=None, limit=None, fields=None):
+    stmt, field_map, names, limit = patients_query(principal, cursor, limit, fields)
+    return _page(db.execute(stmt).all(), field_map, names, limit)
+
+
+def predictions_page(db, patient_id, cursor=None, limit=None, fields=None):
+    stmt, field_map, names, limit = predictions_query(patient_id, cursor, limit, fields)
+    return _page(db.execute(stmt).all(), field_map, names, limit)
+
+
+# Same pages over an AsyncSession (or database.ThreadedSession)
+async def patients_page_async(db, principal, cursor=None, limit=None, fields=None):
+    stmt, field_map, names, limit = patients_query(principal, cursor, limit, fields)
+    return _page((await db.execute(stmt)).all(), field_map, names, limit)
+
+
+async def predictions_page_async(db, patient_id, cursor=None, limit=None, fields=None):
+    stmt, field_map, names, limit = predictions_query(patient_id, cursor, limit, fields)
+    rows = (await db.execute(stmt)).all()
+    if "landmarks" in names:  # decoding must not fall back to a blocking schema lookup
+        await landmark_codec.load_missing(db, *(row._mapping["landmarks__1"] for row in rows))
+    return _page(rows, field_map, names, limit)
@@ -0,0 +1,177 @@
+"""
+Small thread-safe LRU used by the in-process caches (predictions, exports, ...).
+
+Bounded by item count and, optionally, by total size where `sizeof(value)`
+gives each entry's weight in bytes, and/or by age (`ttl` seconds).
+DiskLRU does the same for a directory of cache files, bounded by total bytes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_items=256, max_bytes=None, sizeof=len, ttl=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[2] is not None and item[2] <= time.monotonic():
+                del self._data[key]
+                self._bytes -= item[1]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # larger than the whole cache; don't flush everything for it
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._data) > self.max_items or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self._bytes -= item[1]
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+
+class DiskLRU:
+    """Size-bounded directory of cache files, evicted least-recently-used.
+
+    Recency is the file mtime: hits `touch` the file, so the order survives
+    restarts without an index. The byte total is scanned once, then tracked;
+    crossing `max_bytes` evicts oldest files down to `low_water` of the limit.
+    """
+
+    def __init__(self, root, max_bytes, low_water=0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = None  # unknown until the first scan
+        self._lock = threading.Lock()
+
+    def path(self, key, ext):
+        # Two-level sharding keeps directories small
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def _files(self):
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(dirpath, name)
+
+    def _total(self):
+        if self._bytes is None:
+            self._bytes = sum(os.path.getsize(p) for p in self._files())
+        return self._bytes
+
+    def get(self, path):
+        """True (and marks it recently used) if `path` is cached."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def added(self, path):
+        """Account for a file just written at `path`; evicts if over budget."""
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._bytes is None:
+                self._total()  # first scan already includes the new file
+            else:
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * self.low_water), keep=path)
+
+    def _evict(self, target, keep=None):
+        entries = []
+        for p in self._files():
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            if p == keep:
+                continue
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._bytes = total
+
+    def stats(self):
+        with self._lock:
+            return {
+                "bytes": self._total(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,861 @@
+from fastapi import FastAPI, Depends, File, UploadFile, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import asyncio
+import json
+import os
+import time
+import zipfile
+from typing import List, Optional
+from . import models, schemas, database, auth, ml_inference, workers, prediction_cache, exports, jobs, batch_predict, uploads, principals, listings, migrations, landmark_codec, measurements, reports, bulk_reports, derivatives, etags, overlays, artifacts, metrics
+
+# --- FASTAPI APP CONFIG ---
+app = FastAPI(title="CephAI Backend (TensorFlow)")
+os.makedirs("outputs", exist_ok=True)
+
+# 🚧 Reject oversized request bodies before multipart parsing spools them.
+# Registered before CORS so CORS wraps it and 413s still carry CORS headers.
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > uploads.UPLOAD_MAX_REQUEST_BYTES:
+        return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+
+# ⏱️ Request latency per route template (not per URL, so ids don't explode the series)
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe_request(
+        request.method, route.path if route is not None else "unmatched",
+        response.status_code, time.perf_counter() - start,
+    )
+    return response
+
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "Retry-After", "ETag", "Content-Disposition"],
+)
+
+app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
+os.makedirs(uploads.UPLOAD_DIR, exist_ok=True)
+app.mount("/uploads", StaticFiles(directory=uploads.UPLOAD_DIR), name="uploads")
+
+# Sync sessions for the handlers that stay on the threadpool (CPU-bound export
+# rendering); request handlers on the event loop use database.get_async_db.
+def get_db():
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+app.include_router(auth.router)
+
+
+# Predictions, their images and exports belong to the patient's owner (and admins);
+# anyone else gets the same 404 as for a missing id.
+async def get_owned_prediction(db, pred_id, user):
+    pred = await db.get(models.Prediction, pred_id)
+    if pred is not None and not user.is_admin:
+        patient = await db.get(models.Patient, pred.patient_id)
+        if patient is None or patient.owner_id != user.id:
+            pred = None
+    if pred is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    return pred
+
+
+def _get_owned_prediction(db, pred_id, user):
+    """Sync-session counterpart of get_owned_prediction."""
+    pred = db.get(models.Prediction, pred_id)
+    if pred is not None and not user.is_admin:
+        patient = db.get(models.Patient, pred.patient_id)
+        if patient is None or patient.owner_id != user.id:
+            pred = None
+    if pred is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    return pred
+
+
+# --- DATABASE INIT ---
+@app.on_event("startup")
+def migrate_database():
+    migrations.upgrade()
+    landmark_codec.load_schemas()
+
+
+@app.on_event("startup")
+def resume_bulk_exports():
+    bulk_reports.start_resume_thread()
+
+
+@app.on_event("startup")
+def fail_stale_jobs():
+    jobs.fail_stale()
+
+
+@app.on_event("startup")
+def start_artifact_gc():
+    artifacts.start_gc_thread()
+
+
+@app.on_event("startup")
+def load_model_on_startup():
+    if ml_inference.MODEL_PRELOAD:
+        ml_inference.start_background_startup()
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    workers.shutdown_pool()
+    reports.shutdown_pool()
+    bulk_reports.shutdown()
+    artifacts.stop_gc_thread()
+
+
+@app.on_event("shutdown")
+async def close_async_db():
+    await database.dispose_async_engine()
+
+
+# 💓 Liveness: the process is up and serving requests
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+
+# 📈 Prometheus metrics: stage / request latency histograms, queue depths,
+# model startup timings, cache hit counters and process memory
+@app.get("/metrics")
+def prometheus_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# 🚦 Readiness: model loaded and warmed up, safe to route traffic here
+@app.get("/readyz")
+def readyz(response: Response):
+    state = ml_inference.readiness()
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
+# 🧍 Create Patient
+@app.post("/patients", response_model=schemas.PatientOut)
+async def create_patient(
+    payload: schemas.PatientCreate,
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    patient = models.Patient(
+        name=payload.name,
+        dob=payload.dob,
+        notes=payload.notes,
+        owner_id=user.id
+    )
+    db.add(patient)
+    await db.commit()
+    await db.refresh(patient)
+    return patient
+
+
+def set_next_page(request: Request, response: Response, next_cursor):
+    """Keep list bodies plain arrays; the continuation goes in headers."""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+
+
+# 📋 List Patients (newest first, keyset-paginated)
+@app.get("/patients", response_model=List[schemas.PatientListItem], response_model_exclude_unset=True)
+async def list_patients(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(listings.LIST_PAGE_SIZE, ge=1, le=listings.LIST_MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields"),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    items, next_cursor = await listings.patients_page_async(db, user, cursor, limit, fields)
+    set_next_page(request, response, next_cursor)
+    return items
+
+# 🆕 📌 Get a Prediction + Image + Landmarks
+@app.get("/cephalogram/{pred_id}")
+async def get_cephalogram(
+    pred_id: int,
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    pred = await db.get(models.Prediction, pred_id)
+    if not pred:
+        raise HTTPException(status_code=404, detail="Cephalogram not found")
+    await landmark_codec.load_missing(db, pred.landmark_schema_id)
+
+    def fix(path):
+        return path.replace("\\", "/") if path else None
+
+    ready = (pred.status or jobs.COMPLETED) == jobs.COMPLETED
+
+    return {
+        "id": pred.id,
+        "patient_id": pred.patient_id,
+        "model_name": pred.model_name,
+        "landmarks": pred.landmarks,
+        "status": pred.status or "completed",
+        "image_url": jobs.output_image(pred.id, fix(pred.image_path), pred.status),
+        "thumbnail_url": derivatives.image_url(pred.id, size="thumb") if ready else None,
+        "preview_url": derivatives.image_url(pred.id, size="preview") if ready else None,
+        "excel_file": (
+            f"http://localhost:8000/{fix(pred.excel_path)}" if pred.excel_path
+            else exports.export_url(pred.id) if ready else None
+        ),
+        "created_at": pred.created_at
+    }
+
+
+# 🧠 Predict Cephalogram
+@app.post("/predict/{patient_id}", response_model=schemas.PredictionOut)
+async def predict(
+    patient_id: int,
+    response: Response,
+    file: UploadFile = File(...),
+    wait: bool = Query(True, description="False: return a pending prediction immediately and poll /status or /events"),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    start_time = time.time()
+
+    patient = await db.get(models.Patient, patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    # 💾 Stream the upload into the content-addressed store, hashing and size-checking as it is written
+    try:
+        with metrics.stage("upload"):
+            file_path, digest = await asyncio.to_thread(uploads.store_upload, file)
+    except uploads.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if not wait:
+        # ⏳ Job mode: hand the work to the pool and answer right away
+        pred = models.Prediction(
+            patient_id=patient.id,
+            model_name="ceph_landmark_model",
+            upload_path=file_path,
+            upload_digest=digest,
+            status=jobs.PENDING,
+        )
+        db.add(pred)
+        await db.commit()
+        await db.refresh(pred)
+        try:
+            jobs.submit(pred.id, file_path, user.id, started=start_time, digest=digest)
+        except workers.PoolSaturated as e:
+            await db.delete(pred)
+            await db.commit()
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=e.detail,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
+        response.status_code = 202
+        return {
+            "id": pred.id,
+            "patient_id": patient.id,
+            "model_name": pred.model_name,
+            "model_version": "v1.0",
+            "created_at": pred.created_at,
+            "status": jobs.PENDING,
+            "num_landmarks": 0,
+            "landmarks": [],
+            "output_image": None,
+            "excel_file": None  # exports answer 409 until the job completes
+        }
+
+    # 🧠 Run ML inference on the worker pool so the event loop stays free
+    try:
+        result = await workers.get_pool().run(
+            user.id, ml_inference.process_and_predict, file_path, patient_id, digest
+        )
+    except workers.PoolSaturated as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    processing_time = round(time.time() - start_time, 3)
+    num_landmarks = len(result["landmarks"])
+
+    # Save prediction in DB (landmark schema lookup may touch the sync engine once)
+    landmark_columns = await asyncio.to_thread(landmark_codec.columns, result["landmarks"])
+    pred = models.Prediction(
+        patient_id=patient.id,
+        model_name="ceph_landmark_model",
+        **landmark_columns,
+        image_path=result["output_image"].replace("http://localhost:8000/", "") if result["output_image"] else None,
+        excel_path=None,  # exports are rendered on demand from `result`
+        upload_path=file_path,
+        upload_digest=digest,
+        status=jobs.COMPLETED,
+        processing_time=processing_time
+    )
+
+    db.add(pred)
+    with metrics.stage("db_commit"):
+        await db.commit()
+        await db.refresh(pred)
+    metrics.PREDICTIONS.inc("completed")
+    reports.pregenerate(pred.id)
+
+    # 🟢 FINAL RESPONSE that matches PredictionOut EXACTLY
+    return {
+        "id": pred.id,
+        "patient_id": patient.id,
+        "model_name": pred.model_name,
+        "model_version": "v1.0",
+        "created_at": pred.created_at,
+        "status": "completed",
+        "processing_time": processing_time,
+        "num_landmarks": num_landmarks,
+        "landmarks": result["landmarks"],
+        "output_image": result["output_image"] or overlays.url(pred.id),
+        "excel_file": exports.export_url(pred.id)
+    }
+
+# 📚 Predict many cephalograms (files and/or zip archives), streamed as NDJSON
+@app.post("/predict/{patient_id}/batch")
+async def predict_batch(
+    patient_id: int,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    patient = await db.get(models.Patient, patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    # Copy to disk now: upload spools are closed once this handler returns.
+    try:
+        with metrics.stage("upload"):
+            staged = await asyncio.to_thread(batch_predict.stage_uploads, files)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive")
+    except uploads.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not staged:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+
+    pool = workers.get_pool()
+    user_id = user.id
+
+    async def stream():
+        done = failed = 0
+        for start, items in batch_predict.chunks(staged):
+            deadline = time.monotonic() + batch_predict.BATCH_ADMISSION_TIMEOUT
+            while True:
+                try:
+                    rows = await pool.run(user_id, batch_predict.process_chunk, start, items, patient_id)
+                    break
+                except workers.PoolSaturated as e:
+                    # Headers are already sent: wait for room a while, then report
+                    # the chunk's images failed and carry on with the next chunk.
+                    if pool.closed or time.monotonic() >= deadline:
+                        rows = batch_predict.rejected_chunk(start, items, e.detail)
+                        break
+                    await asyncio.sleep(min(e.retry_after, 1))
+            for row in rows:
+                done += row["status"] == "completed"
+                failed += row["status"] != "completed"
+                yield json.dumps(row) + "\n"
+        yield json.dumps({"summary": True, "total": len(staged), "completed": done, "failed": failed}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# 🔍 List Predictions Per Patient (summary rows; add `landmarks` to fields for the full result)
+@app.get(
+    "/patients/{patient_id}/predictions",
+    response_model=List[schemas.PredictionListItem],
+    response_model_exclude_unset=True,
+)
+async def list_predictions(
+    patient_id: int,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(listings.LIST_PAGE_SIZE, ge=1, le=listings.LIST_MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields"),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    items, next_cursor = await listings.predictions_page_async(db, patient_id, cursor, limit, fields)
+    set_next_page(request, response, next_cursor)
+    return items
+
+
+# ⏳ Poll a prediction job
+@app.get("/predictions/{pred_id}/status", response_model=schemas.PredictionStatus)
+async def prediction_status(
+    pred_id: int,
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    pred = await db.get(models.Prediction, pred_id)
+    if not pred:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    if jobs.is_stale(pred):
+        return await asyncio.to_thread(jobs.load_payload, pred_id)
+    await landmark_codec.load_missing(db, pred.landmark_schema_id)
+    return jobs.status_payload(pred)
+
+
+# 📡 Stream a prediction job's stage transitions (Server-Sent Events)
+@app.get("/predictions/{pred_id}/events")
+async def prediction_events(
+    pred_id: int,
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    # Subscribe before reading the row so no transition can slip in between.
+    sub = jobs.subscribe(pred_id)
+    pred = await db.get(models.Prediction, pred_id)
+    if not pred:
+        jobs.unsubscribe(pred_id, sub)
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    await landmark_codec.load_missing(db, pred.landmark_schema_id)
+    current = jobs.status_payload(pred) if not jobs.is_stale(pred) else None
+    await db.close()  # don't hold a connection for the life of the stream
+    if current is None:
+        current = await asyncio.to_thread(jobs.load_payload, pred_id)
+    if current is None:
+        jobs.unsubscribe(pred_id, sub)
+        raise HTTPException(status_code=404, detail="Prediction not found")
+
+    async def stream():
+        try:
+            last, event = None, current
+            while True:
+                if event != last:
+                    yield f"event: status\ndata: {json.dumps(event)}\n\n"
+                    last = event
+                if event["status"] in jobs.TERMINAL:
+                    return
+                try:
+                    event = await asyncio.wait_for(sub[1].get(), timeout=jobs.JOB_EVENTS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    # The job may run in another worker process: re-read the row
+                    event = await asyncio.to_thread(jobs.load_payload, pred_id)
+                    if event is None:
+                        return
+                    if event == last:
+                        yield ": keep-alive\n\n"
+        finally:
+            jobs.unsubscribe(pred_id, sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# 📐 Cephalometric measurements (angles, distances, norm interpretation) for one prediction
+@app.get("/predictions/{pred_id}/measurements")
+async def prediction_measurements(
+    pred_id: int,
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    pred = await db.get(models.Prediction, pred_id)
+    if not pred:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    await landmark_codec.load_missing(db, pred.landmark_schema_id)
+    if not pred.landmarks:
+        raise HTTPException(status_code=409, detail=f"Prediction is {pred.status}; no landmarks yet")
+    # Reads the upload's header for its pixel size
+    return await asyncio.to_thread(measurements.for_prediction, pred)
+
+
+# 📈 Longitudinal measurements across all of a patient's predictions
+@app.get("/patients/{patient_id}/measurements")
+async def patient_measurements(
+    patient_id: int,
+    names: Optional[str] = Query(None, description="Comma-separated measurement names; default all"),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    only = [n.strip() for n in names.split(",") if n.strip()] if names else None
+    unknown = [n for n in only or () if n not in measurements.BY_NAME]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown measurement(s): {', '.join(unknown)}")
+
+    rows = (await db.execute(measurements.series_query(patient_id))).all()
+    series = await asyncio.to_thread(measurements.series_from_rows, rows, only)
+    return {
+        "patient_id": patient_id,
+        "measurements": [
+            {"name": m.name, "unit": m.unit, "norm_mean": m.mean, "norm_sd": m.sd, "description": m.description}
+            for m in measurements.MEASUREMENTS if only is None or m.name in only
+        ],
+        "series": series,
+    }
+
+
+# 🧾 PDF report for one prediction: rendered in memory on the report pool,
+# cached by ETag, revalidated with If-None-Match (304 when unchanged)
+@app.get("/predictions/{pred_id}/report")
+async def prediction_report(
+    pred_id: int,
+    request: Request,
+    wait: bool = Query(True, description="False: answer 202 + Retry-After while the report is generated"),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    pred = await db.get(models.Prediction, pred_id)
+    if not pred:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    await landmark_codec.load_missing(db, pred.landmark_schema_id)
+    if not pred.landmarks:
+        raise HTTPException(status_code=409, detail=f"Prediction is {pred.status}; no landmarks yet")
+    patient = await db.get(models.Patient, pred.patient_id)
+
+    etag = reports.etag_for(pred, patient)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    cached = etags.not_modified(request, headers)
+    if cached is not None:
+        return cached
+
+    content = reports.cached(etag)
+    if content is None:
+        try:
+            future = reports.schedule(pred.id, user.id)
+        except workers.PoolSaturated as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=e.detail,
+                headers={"Retry-After": str(reports.REPORT_RETRY_AFTER)},
+            )
+        if not wait and not future.done():
+            return JSONResponse(
+                status_code=202,
+                content={"id": pred.id, "status": "generating"},
+                headers={"Retry-After": str(reports.REPORT_RETRY_AFTER)},
+            )
+        try:
+            etag, content = await asyncio.wrap_future(future)
+        except reports.ReportUnavailable as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        headers["ETag"] = etag
+
+    headers["Content-Disposition"] = f'inline; filename="ceph_{pred.patient_id}_{pred.id}_report.pdf"'
+    return Response(content=content, media_type="application/pdf", headers=headers)
+
+
+# 🖼️ Viewer-sized derivatives of the overlay / upload (thumb, preview, full as
+# WebP or JPEG), generated on first request. Owner only: the viewer fetches
+# them with its token. Range requests are honoured.
+@app.get("/predictions/{pred_id}/image")
+async def prediction_image(
+    pred_id: int,
+    request: Request,
+    kind: str = Query("overlay", description="overlay | upload"),
+    size: str = Query("preview", description="thumb | preview | full"),
+    format: str = Query("auto", description="auto (WebP if accepted) | webp | jpeg"),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    if kind not in derivatives.KINDS or size not in derivatives.SIZES or (
+        format != "auto" and format not in derivatives.FORMATS
+    ):
+        raise HTTPException(status_code=400, detail="Unsupported kind, size or format")
+    pred = await get_owned_prediction(db, pred_id, user)
+    if kind == "overlay":
+        return await serve_overlay(request, pred, overlays.DEFAULT_STYLE, size, format)
+    try:
+        source = derivatives.source_path(pred, kind)
+    except derivatives.SourceMissing as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    fmt = derivatives.negotiate(format, request.headers.get("accept"))
+    headers = derivatives.headers_for(derivatives.key_for(source, f"{size}.{fmt}"), vary=format == "auto")
+    cached = etags.not_modified(request, headers)
+    if cached is not None:
+        return cached
+    path, _ = await asyncio.to_thread(derivatives.ensure, source, size, fmt)
+    return FileResponse(path, media_type=derivatives.FORMATS[fmt][0], headers=headers)
+
+
+async def serve_overlay(request, pred, style, size, format):
+    fmt = derivatives.negotiate(format, request.headers.get("accept"))
+    try:
+        key = await asyncio.to_thread(overlays.key_for, pred, style, size, fmt)
+    except derivatives.SourceMissing as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    headers = derivatives.headers_for(key, vary=format == "auto")
+    cached = etags.not_modified(request, headers)
+    if cached is not None:
+        return cached
+    path, _ = await asyncio.to_thread(overlays.ensure, pred, style, size, fmt)
+    return FileResponse(path, media_type=derivatives.FORMATS[fmt][0], headers=headers)
+
+
+# 🎯 Landmark overlay drawn on demand from the upload + stored landmarks, in the
+# requested style; cached in a size-bounded disk LRU. Owner only, like /image.
+@app.get("/predictions/{pred_id}/overlay")
+async def prediction_overlay(
+    pred_id: int,
+    request: Request,
+    size: str = Query("full", description="thumb | preview | full"),
+    format: str = Query("auto", description="auto (WebP if accepted) | webp | jpeg"),
+    point_size: Optional[int] = Query(None, description="Point radius in source pixels (default 4)"),
+    labels: Optional[bool] = Query(None, description="Draw landmark names (default true)"),
+    names: Optional[str] = Query(None, description="Comma-separated subset: stored names or roles (S,N,Go,...)"),
+    color: Optional[str] = Query(None, description="Point colour (name or #rrggbb)"),
+    label_color: Optional[str] = Query(None),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    if size not in derivatives.SIZES or (format != "auto" and format not in derivatives.FORMATS):
+        raise HTTPException(status_code=400, detail="Unsupported size or format")
+    try:
+        style = overlays.parse_style(point_size, labels, names, color, label_color)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pred = await get_owned_prediction(db, pred_id, user)
+    return await serve_overlay(request, pred, style, size, format)
+
+
+def tile_source(pred, kind):
+    """(full-size image, stable key or None) a tile pyramid is cut from.
+
+    Overlays are rendered on demand and keyed by their overlay cache key: the
+    file's mtime changes on every cache hit, so it cannot identify the tiles.
+    """
+    if kind == "overlay":
+        return overlays.ensure(pred, overlays.DEFAULT_STYLE, "full", "jpeg")
+    return derivatives.source_path(pred, kind), None
+
+
+# 🔎 Deep Zoom descriptor for pan-and-zoom viewers (e.g. OpenSeadragon)
+@app.get("/predictions/{pred_id}/tiles/{kind}.dzi")
+async def prediction_dzi(
+    pred_id: int,
+    kind: str,
+    format: str = Query("jpeg", description="Tile format: webp | jpeg"),
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    if kind not in derivatives.KINDS or format not in derivatives.FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported kind or format")
+    pred = await get_owned_prediction(db, pred_id, user)
+    try:
+        source, _ = await asyncio.to_thread(tile_source, pred, kind)
+    except derivatives.SourceMissing as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=derivatives.dzi(source, format), media_type="application/xml")
+
+
+# 🧩 Deep Zoom tiles ({col}_{row}.{format}); a level is cut on first request
+@app.get("/predictions/{pred_id}/tiles/{kind}_files/{level}/{tile_name}")
+async def prediction_tile(
+    pred_id: int,
+    kind: str,
+    level: int,
+    tile_name: str,
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    try:
+        stem, fmt = tile_name.rsplit(".", 1)
+        col, row = (int(v) for v in stem.split("_"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Tile name must be {col}_{row}.{format}")
+    if kind not in derivatives.KINDS or fmt not in derivatives.FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported kind or format")
+    pred = await get_owned_prediction(db, pred_id, user)
+    try:
+        source, source_key = await asyncio.to_thread(tile_source, pred, kind)
+        path, key = await asyncio.to_thread(derivatives.tile, source, level, col, row, fmt, source_key)
+    except derivatives.SourceMissing as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    headers = derivatives.headers_for(key)
+    cached = etags.not_modified(request, headers)
+    if cached is not None:
+        return cached
+    return FileResponse(path, media_type=derivatives.FORMATS[fmt][0], headers=headers)
+
+
+# 📄 Export one prediction's landmarks (CSV / JSON / XLSX), rendered on demand
+# (owner only; the viewer downloads it with its token)
+@app.get("/predictions/{pred_id}/export")
+def export_prediction(
+    pred_id: int,
+    format: str = Query("xlsx"),
+    db: Session = Depends(get_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    pred = _get_owned_prediction(db, pred_id, user)
+
+    try:
+        content, media_type, ext = exports.render([pred], format)
+    except exports.NotCompleted as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="ceph_{pred.patient_id}_{pred.id}_landmarks.{ext}"'},
+    )
+
+
+# 📦 Export several predictions of a patient as one bundle
+@app.get("/patients/{patient_id}/predictions/export")
+def export_patient_predictions(
+    patient_id: int,
+    format: str = Query("xlsx"),
+    ids: Optional[str] = Query(None, description="Comma-separated prediction ids; default all"),
+    db: Session = Depends(get_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    patient = db.get(models.Patient, patient_id)
+    if not patient or (patient.owner_id != user.id and not user.is_admin):
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    query = db.query(models.Prediction).filter(models.Prediction.patient_id == patient_id)
+    if ids:
+        try:
+            wanted = [int(i) for i in ids.split(",") if i.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+        query = query.filter(models.Prediction.id.in_(wanted))
+    preds = query.order_by(models.Prediction.id).all()
+    if not ids:
+        preds = [pred for pred in preds if exports.completed(pred)]  # skip jobs still in flight
+    if not preds:
+        raise HTTPException(status_code=404, detail="No predictions to export")
+
+    try:
+        content, media_type, ext = exports.render(preds, format, bundle=True)
+    except exports.NotCompleted as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="patient_{patient_id}_landmarks.{ext}"'},
+    )
+
+
+# 🗂️ Bulk report export: every report of your practice (optionally some
+# patients / a date range) as one zip or multi-page PDF, built in the background
+@app.post("/exports/reports", response_model=schemas.ReportExportOut, status_code=202)
+def create_report_export(
+    payload: schemas.ReportExportCreate,
+    db: Session = Depends(get_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    if payload.format not in bulk_reports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {payload.format}")
+    job = bulk_reports.create(db, user, payload.format, payload.patient_ids, payload.since, payload.until)
+    bulk_reports.start(job.id)
+    return bulk_reports.status_payload(job)
+
+
+def _get_report_export(db, export_id, user):
+    job = db.get(models.ReportExport, export_id)
+    if not job or (job.requested_by != user.id and not user.is_admin):
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+
+# 📊 Bulk export progress
+@app.get("/exports/reports/{export_id}", response_model=schemas.ReportExportOut)
+async def report_export_status(
+    export_id: int,
+    db: AsyncSession = Depends(database.get_async_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    job = await db.get(models.ReportExport, export_id)
+    if not job or (job.requested_by != user.id and not user.is_admin):
+        raise HTTPException(status_code=404, detail="Export not found")
+    return bulk_reports.status_payload(job)
+
+
+# 🔁 Resume an interrupted or failed bulk export (already rendered reports are kept)
+@app.post("/exports/reports/{export_id}/resume", response_model=schemas.ReportExportOut, status_code=202)
+def resume_report_export(
+    export_id: int,
+    db: Session = Depends(get_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    job = _get_report_export(db, export_id, user)
+    if job.status == bulk_reports.COMPLETED:
+        raise HTTPException(status_code=409, detail="Export already completed")
+    bulk_reports.start(job.id)
+    return bulk_reports.status_payload(job)
+
+
+# ⬇️ Download a finished bulk export (streamed from disk)
+@app.get("/exports/reports/{export_id}/download")
+def download_report_export(
+    export_id: int,
+    db: Session = Depends(get_db),
+    user: principals.Principal = Depends(principals.get_current_principal)
+):
+    job = _get_report_export(db, export_id, user)
+    if job.status != bulk_reports.COMPLETED or not job.output_path or not os.path.exists(job.output_path):
+        raise HTTPException(status_code=409, detail=f"Export is {job.status}")
+    return FileResponse(
+        job.output_path,
+        media_type=bulk_reports.FORMATS[job.format],
+        filename=f"ceph_reports_{job.id}.{job.format}",
+    )
+
+
+# ♻️ Prediction cache counters
+@app.get("/cache/stats")
+def cache_stats(user: principals.Principal = Depends(principals.get_current_principal)):
+    cache = prediction_cache.get_cache()
+    stats = {"enabled": True, **cache.stats()} if cache is not None else {"enabled": False}
+    stats["principals"] = principals.stats()
+    stats["reports"] = reports.cache_stats()
+    stats["overlays"] = overlays.stats()
+    return stats
+
+
+# 💽 Disk usage of the artifact store and caches (admins)
+@app.get("/admin/artifacts/usage")
+def artifact_usage(user: principals.Principal = Depends(principals.get_current_principal)):
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admins only")
+    return artifacts.usage()
+
+
+# 🧹 Reclaim orphaned uploads / outputs now (dry_run=true only reports; legacy=true also sweeps uploads/, outputs/)
+@app.post("/admin/artifacts/gc")
+def artifact_gc(
+    dry_run: bool = False,
+    legacy: Optional[bool] = None,
+    user: principals.Principal = Depends(principals.get_current_principal),
+):
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admins only")
+    return artifacts.gc(dry_run=dry_run, legacy=legacy)
@@ -0,0 +1,303 @@
+"""
+Cephalometric measurements computed with NumPy over landmark arrays.
+
+Every measurement is evaluated for a whole (N, K, 2) stack of predictions at
+once, so one prediction and a patient's full history cost the same handful of
+array operations per measurement. Landmark coordinates are the normalized
+(x, y) the model returns; they are scaled by each image's pixel size and the
+pixel spacing before any angle or distance is taken.
+
+The landmark model emits the 19-point ISBI layout as P1..P19; those names are
+mapped to anatomical roles below. Measurements whose landmarks a schema does
+not provide (IMPA and U1-SN need incisor apices) come back as NaN / null.
+"""
+
+import os
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import select
+
+from . import landmark_codec, models
+from .lru import LRUCache
+
+# --- MEASUREMENT CONFIG ---
+PIXEL_SPACING_MM = float(os.getenv("CEPH_PIXEL_SPACING_MM", "0.1"))
+# Used when a prediction's upload is gone and its pixel size can't be read
+DEFAULT_IMAGE_SIZE = tuple(int(v) for v in os.getenv("CEPH_DEFAULT_IMAGE_SIZE", "1935x2400").split("x"))
+
+# P1..P19 of the ISBI 2015 cephalometric dataset, in order
+ISBI_ROLES = (
+    "S", "N", "Or", "Po", "A", "B", "Pog", "Me", "Gn", "Go",
+    "L1", "U1", "UL", "LL", "Sn", "PogS", "PNS", "ANS", "Ar",
+)
+ROLE_NAMES = {
+    "S": "Sella", "N": "Nasion", "Or": "Orbitale", "Po": "Porion", "A": "Subspinale (A point)",
+    "B": "Supramentale (B point)", "Pog": "Pogonion", "Me": "Menton", "Gn": "Gnathion",
+    "Go": "Gonion", "L1": "Lower incisal incision", "U1": "Upper incisal incision",
+    "UL": "Upper lip", "LL": "Lower lip", "Sn": "Subnasale", "PogS": "Soft tissue pogonion",
+    "PNS": "Posterior nasal spine", "ANS": "Anterior nasal spine", "Ar": "Articulare",
+}
+
+
+class Measurement(NamedTuple):
+    name: str
+    kind: str                  # angle | lines | distance | ratio | difference | sum
+    points: Tuple[str, ...]    # landmark roles, or measurement names for difference/sum
+    unit: str
+    mean: Optional[float] = None
+    sd: Optional[float] = None
+    low: str = "Below norm"
+    high: str = "Above norm"
+    normal: str = "Within norm"
+    description: str = ""
+
+
+# kinds:
+#   angle      (a, vertex, b)      angle at vertex
+#   lines      (p1, p2, p3, p4)    angle between vectors p1->p2 and p3->p4
+#   distance   (p1, p2)            mm
+#   ratio      (p1, p2, p3, p4)    100 * |p1 p2| / |p3 p4|
+#   difference (m1, m2)            m1 - m2 of earlier measurements
+#   sum        (m1, m2, ...)       sum of earlier measurements
+MEASUREMENTS = (
+    Measurement("SNA", "angle", ("S", "N", "A"), "deg", 82.0, 2.0,
+                "Retrognathic maxilla", "Prognathic maxilla", "Normal maxilla",
+                "Maxillary position relative to the cranial base"),
+    Measurement("SNB", "angle", ("S", "N", "B"), "deg", 80.0, 2.0,
+                "Retrognathic mandible", "Prognathic mandible", "Normal mandible",
+                "Mandibular position relative to the cranial base"),
+    Measurement("ANB", "difference", ("SNA", "SNB"), "deg", 2.0, 2.0,
+                "Skeletal Class III", "Skeletal Class II", "Skeletal Class I",
+                "Sagittal jaw relationship"),
+    Measurement("SN-MP", "lines", ("S", "N", "Go", "Me"), "deg", 32.0, 5.0,
+                "Hypodivergent (low angle)", "Hyperdivergent (high angle)", "Normodivergent",
+                "Mandibular plane to SN"),
+    Measurement("FMA", "lines", ("Po", "Or", "Go", "Me"), "deg", 25.0, 5.0,
+                "Hypodivergent (low angle)", "Hyperdivergent (high angle)", "Normodivergent",
+                "Frankfort-mandibular plane angle"),
+    Measurement("SN-PP", "lines", ("S", "N", "PNS", "ANS"), "deg", 8.0, 3.0,
+                "Palatal plane rotated down anteriorly", "Palatal plane rotated up anteriorly", "Normal",
+                "Palatal plane to SN"),
+    Measurement("Facial angle", "lines", ("N", "Pog", "Or", "Po"), "deg", 87.8, 3.6,
+                "Retrusive chin", "Protrusive chin", "Normal chin position",
+                "Downs: FH to facial plane (N-Pog)"),
+    Measurement("Y-axis", "lines", ("S", "Gn", "Po", "Or"), "deg", 59.4, 3.8,
+                "Horizontal growth pattern", "Vertical growth pattern", "Balanced growth pattern",
+                "Downs: S-Gn to FH"),
+    Measurement("Saddle angle", "angle", ("N", "S", "Ar"), "deg", 123.0, 5.0,
+                description="Björk: N-S-Ar"),
+    Measurement("Articular angle", "angle", ("S", "Ar", "Go"), "deg", 143.0, 6.0,
+                description="Björk: S-Ar-Go"),
+    Measurement("Gonial angle", "angle", ("Ar", "Go", "Me"), "deg", 130.0, 7.0,
+                "Closed gonial angle", "Open gonial angle", "Normal",
+                "Björk: Ar-Go-Me"),
+    Measurement("Björk sum", "sum", ("Saddle angle", "Articular angle", "Gonial angle"), "deg", 396.0, 6.0,
+                "Counter-clockwise (horizontal) growth", "Clockwise (vertical) growth", "Neutral growth",
+                "Saddle + articular + gonial angle"),
+    Measurement("IMPA", "lines", ("L1_apex", "L1", "Me", "Go"), "deg", 90.0, 5.0,
+                "Retroclined lower incisors", "Proclined lower incisors", "Normal inclination",
+                "Lower incisor to mandibular plane"),
+    Measurement("U1-SN", "lines", ("U1", "U1_apex", "S", "N"), "deg", 103.0, 6.0,
+                "Retroclined upper incisors", "Proclined upper incisors", "Normal inclination",
+                "Upper incisor to SN"),
+    Measurement("Jarabak ratio", "ratio", ("S", "Go", "N", "Me"), "%", 63.5, 1.5,
+                "Clockwise growth tendency", "Counter-clockwise growth tendency", "Neutral",
+                "Posterior / anterior face height (S-Go / N-Me)"),
+    Measurement("LAFH ratio", "ratio", ("ANS", "Me", "N", "Me"), "%", 55.0, 2.0,
+                "Short lower face", "Long lower face", "Normal lower face",
+                "Lower / total anterior face height (ANS-Me / N-Me)"),
+    Measurement("S-N", "distance", ("S", "N"), "mm", description="Anterior cranial base length"),
+    Measurement("N-Me", "distance", ("N", "Me"), "mm", description="Total anterior face height"),
+    Measurement("S-Go", "distance", ("S", "Go"), "mm", description="Posterior face height"),
+    Measurement("Go-Me", "distance", ("Go", "Me"), "mm", description="Mandibular body length"),
+)
+BY_NAME = {m.name: m for m in MEASUREMENTS}
+
+
+def roles_for(names):
+    """Role -> landmark index for a schema's ordered name list."""
+    names = list(names)
+    if names == [f"P{i + 1}" for i in range(len(ISBI_ROLES))]:
+        names = list(ISBI_ROLES)
+    return {name: i for i, name in enumerate(names)}
+
+
+# --- GEOMETRY (all over leading batch axis) ---
+def _angle_between(u, v):
+    cos = np.einsum("...i,...i->...", u, v) / (np.linalg.norm(u, axis=-1) * np.linalg.norm(v, axis=-1))
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+def to_mm(coords, image_sizes=None, spacing_mm=PIXEL_SPACING_MM):
+    """Normalized (N, K, 2) coords -> millimetres, per-image (w, h) sizes (N, 2) or one (w, h)."""
+    coords = np.asarray(coords, dtype=np.float64)
+    sizes = np.asarray(image_sizes if image_sizes is not None else DEFAULT_IMAGE_SIZE, dtype=np.float64)
+    if sizes.ndim == 2:
+        sizes = sizes[:, None, :]
+    return coords * sizes * spacing_mm
+
+
+def compute(coords, names, image_sizes=None, spacing_mm=PIXEL_SPACING_MM, only=None):
+    """All (or `only`) measurements for (N, K, 2) normalized landmarks.
+
+    Returns {measurement name: float64 array (N,)}; NaN where the schema lacks
+    a landmark the measurement needs.
+    """
+    pts = to_mm(coords, image_sizes, spacing_mm)
+    n = pts.shape[0]
+    index = roles_for(names)
+    wanted = None
+    if only:
+        wanted = set(only)
+        for name in only:  # pull in what derived measurements depend on
+            m = BY_NAME[name]
+            if m.kind in ("difference", "sum"):
+                wanted.update(m.points)
+
+    out = {}
+    for m in MEASUREMENTS:
+        if wanted is not None and m.name not in wanted:
+            continue
+        if m.kind in ("difference", "sum"):
+            parts = [out[p] for p in m.points]
+            out[m.name] = parts[0] - parts[1] if m.kind == "difference" else np.sum(parts, axis=0)
+            continue
+        if any(p not in index for p in m.points):
+            out[m.name] = np.full(n, np.nan)
+            continue
+        p = [pts[:, index[r]] for r in m.points]
+        if m.kind == "angle":
+            out[m.name] = _angle_between(p[0] - p[1], p[2] - p[1])
+        elif m.kind == "lines":
+            out[m.name] = _angle_between(p[1] - p[0], p[3] - p[2])
+        elif m.kind == "distance":
+            out[m.name] = np.linalg.norm(p[1] - p[0], axis=-1)
+        elif m.kind == "ratio":
+            out[m.name] = 100.0 * np.linalg.norm(p[1] - p[0], axis=-1) / np.linalg.norm(p[3] - p[2], axis=-1)
+    if only:
+        out = {k: out[k] for k in only}
+    return out
+
+
+def interpret(name, values):
+    """Norm-table labels for an array of values (None where no norm or NaN)."""
+    m = BY_NAME[name]
+    values = np.asarray(values, dtype=np.float64)
+    if m.mean is None:
+        return [None] * values.size
+    labels = np.select(
+        [np.isnan(values), values < m.mean - m.sd, values > m.mean + m.sd],
+        [None, m.low, m.high],
+        default=m.normal,
+    )
+    return labels.tolist()
+
+
+# --- IMAGE SIZES ---
+_sizes = LRUCache(max_items=4096)
+
+
+def image_size(path):
+    """(w, h) of an upload from its header, or DEFAULT_IMAGE_SIZE."""
+    if not path:
+        return DEFAULT_IMAGE_SIZE
+    size = _sizes.get(path)
+    if size is None:
+        try:
+            with Image.open(path) as img:  # header only; no pixel decode
+                size = img.size
+        except OSError:
+            return DEFAULT_IMAGE_SIZE
+        _sizes.put(path, size)
+    return size
+
+
+# --- API SHAPES ---
+def _round(v):
+    return None if v is None or np.isnan(v) else round(float(v), 2)
+
+
+def _round_all(values):
+    out = np.round(values, 2).astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def report(coords, names, image_size_wh, spacing_mm=PIXEL_SPACING_MM):
+    """One prediction: measurement rows plus the angles / interpretations dicts
+    cephreport.generate_ceph_pdf takes."""
+    values = compute(np.asarray(coords)[None], names, [image_size_wh], spacing_mm)
+    rows, angles, interpretations = [], {}, {}
+    for m in MEASUREMENTS:
+        v = _round(values[m.name][0])
+        label = interpret(m.name, values[m.name])[0]
+        rows.append({
+            "name": m.name,
+            "value": v,
+            "unit": m.unit,
+            "norm_mean": m.mean,
+            "norm_sd": m.sd,
+            "interpretation": label,
+            "description": m.description,
+        })
+        if v is not None and m.unit == "deg":
+            angles[m.name] = v
+        if label is not None:
+            interpretations[m.name] = label
+    return {"measurements": rows, "angles": angles, "interpretations": interpretations}
+
+
+def series(ids, created, coords, names, image_sizes, only=None, spacing_mm=PIXEL_SPACING_MM):
+    """Longitudinal rows for many predictions of one schema, oldest first."""
+    values = compute(coords, names, image_sizes, spacing_mm, only=only)
+    rounded = {name: _round_all(v) for name, v in values.items()}
+    labels = {name: interpret(name, v) for name, v in values.items()}
+    return [
+        {
+            "prediction_id": int(pid),
+            "created_at": created[i],
+            "values": {name: r[i] for name, r in rounded.items()},
+            "interpretations": {name: labels[name][i] for name in values if labels[name][i] is not None},
+        }
+        for i, pid in enumerate(ids)
+    ]
+
+
+# --- PREDICTIONS ---
+def for_prediction(pred, spacing_mm=PIXEL_SPACING_MM):
+    landmarks = pred.landmarks
+    names = [lm["name"] for lm in landmarks]
+    coords = np.array([(lm["x"], lm["y"]) for lm in landmarks], dtype=np.float64)
+    size = image_size(pred.upload_path)
+    return {
+        "prediction_id": pred.id,
+        "image_size": list(size),
+        "pixel_spacing_mm": spacing_mm,
+        **report(coords, names, size, spacing_mm),
+    }
+
+
+def series_query(patient_id):
+    P = models.Prediction
+    return (
+        select(P.id, P.created_at, P.upload_path, P.landmark_schema_id, P.landmarks_packed, P.result)
+        .where(P.patient_id == patient_id)
+        .order_by(P.id)
+    )
+
+
+def series_from_rows(rows, only=None, spacing_mm=PIXEL_SPACING_MM):
+    """series_query rows -> longitudinal rows, oldest first, across name schemas."""
+    meta = {r.id: (r.created_at, r.upload_path) for r in rows}
+    groups = landmark_codec.group_arrays(
+        (r.id, r.landmark_schema_id, r.landmarks_packed, r.result) for r in rows
+    )
+    out = []
+    for ids, coords, names in groups.values():
+        created = [meta[int(i)][0] for i in ids]
+        sizes = [image_size(meta[int(i)][1]) for i in ids]
+        out += series(ids, created, coords, names, sizes, only, spacing_mm)
+    out.sort(key=lambda row: row["prediction_id"])
+    return out
@@ -0,0 +1,235 @@
+"""
+Per-stage latency histograms and a Prometheus /metrics exposition.
+
+`stage(name)` times one step of the pipeline (upload, cache lookup, decode,
+preprocess, queue wait, model forward pass, overlay, DB commit, report /
+export rendering) into `ceph_stage_seconds{stage=...}`, so a p99 regression can
+be pinned on a step instead of on the one total `processing_time`. Request
+latency per route template goes to `ceph_http_request_seconds`. Queue depths,
+model startup timings, cache hit counters and process memory are read from
+their owners when /metrics is scraped, so nothing is double-booked.
+
+Metrics are per process: with several server workers, scrape each one.
+
+METRICS_TRACING=1 additionally opens an OpenTelemetry span per stage when
+opentelemetry-api is installed; spans are no-ops until an SDK/exporter is
+configured (e.g. by running under `opentelemetry-instrument`).
+"""
+
+import bisect
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+# --- METRICS CONFIG ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TRACING = os.getenv("METRICS_TRACING", "0") == "1"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_tracer = None
+if METRICS_TRACING:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("cephai.backend")
+    except ImportError:
+        print("⚠️ METRICS_TRACING=1 but opentelemetry-api is not installed; spans disabled")
+
+
+# --- METRIC TYPES ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (Prometheus semantics)."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def collect(self):
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _labels(self.labelnames + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, n=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+
+    def collect(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in sorted(snapshot.items())]
+        return lines
+
+
+def _family(name, kind, help, samples, labelnames=()):
+    """Lines for a metric read at scrape time; samples: {label values tuple: value}."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(labelnames, k)} {v}" for k, v in samples.items() if v is not None]
+    return lines
+
+
+STAGE_SECONDS = Histogram("ceph_stage_seconds", "Time spent per pipeline stage", ("stage",))
+REQUEST_SECONDS = Histogram(
+    "ceph_http_request_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+BATCH_SIZE = Histogram("ceph_inference_batch_size", "Images per model forward pass", buckets=BATCH_SIZE_BUCKETS)
+PREDICTIONS = Counter("ceph_predictions_total", "Predictions finished, by outcome", ("status",))
+
+
+# --- TIMERS ---
+@contextmanager
+def stage(name):
+    """Time a block into ceph_stage_seconds{stage=name} (and a span when tracing)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        if _tracer is not None:
+            with _tracer.start_as_current_span(name):
+                yield
+        else:
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+
+def observe_stage(name, seconds):
+    """Record a duration measured elsewhere (e.g. queue wait from an enqueue timestamp)."""
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, name)
+
+
+def observe_request(method, route, status, seconds):
+    if METRICS_ENABLED:
+        REQUEST_SECONDS.observe(seconds, method, route, str(status))
+
+
+# --- SCRAPE-TIME GAUGES ---
+def _memory():
+    samples = {("peak",): resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}  # ru_maxrss is KiB on Linux
+    try:
+        with open("/proc/self/statm") as f:
+            samples[("rss",)] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    return _family("ceph_process_memory_bytes", "gauge", "Resident memory of this server process",
+                   samples, ("kind",))
+
+
+def _queues():
+    from . import ml_inference, model_server, reports, workers
+
+    depth, running = {}, {}
+    for name, pool in (("inference", workers._pool), ("report", reports._pool)):
+        if pool is not None:
+            s = pool.stats()
+            depth[(name,)] = s["queued"]
+            running[(name,)] = s["running"]
+    if ml_inference._batcher is not None:
+        depth[("batcher",)] = ml_inference._batcher.queue_depth()
+    server = {}
+    if model_server._client is not None:
+        # Cached probe with a short timeout: a slow or dead server must not stall the scrape
+        info = model_server._client.health()
+        server[()] = 1 if info.get("ready") else 0
+        if "queue_depth" in info:
+            depth[("model_server",)] = info["queue_depth"]
+    return (
+        _family("ceph_queue_depth", "gauge", "Jobs waiting per queue", depth, ("queue",))
+        + _family("ceph_queue_running", "gauge", "Jobs running per worker pool", running, ("queue",))
+        + (_family("ceph_model_server_up", "gauge", "Model server answered its last health probe", server)
+           if server else [])
+    )
+
+
+def _model():
+    from . import ml_inference
+
+    state = ml_inference.readiness()
+    return (
+        _family("ceph_model_ready", "gauge", "1 when the model is loaded and warmed up",
+                {(state["backend"],): int(state["ready"])}, ("backend",))
+        + _family("ceph_model_startup_seconds", "gauge", "Model startup time per phase",
+                  {(phase,): seconds for phase, seconds in state["timings"].items()}, ("phase",))
+    )
+
+
+def _caches():
+    from . import exports, overlays, prediction_cache, reports
+
+    hits, misses, sizes = {}, {}, {}
+    cache = prediction_cache.get_cache()
+    if cache is not None:
+        s = cache.stats()
+        hits[("prediction_memory",)] = s["memory_hits"]
+        hits[("prediction_disk",)] = s["disk_hits"]
+        misses[("prediction",)] = s["misses"]
+    for name, s in (("report", reports.cache_stats()), ("export", exports.cache_stats()), ("overlay", overlays.stats())):
+        hits[(name,)] = s["hits"]
+        misses[(name,)] = s["misses"]
+        sizes[(name,)] = s["bytes"]
+    return (
+        _family("ceph_cache_hits_total", "counter", "Cache hits per cache (tier)", hits, ("cache",))
+        + _family("ceph_cache_misses_total", "counter", "Cache misses per cache", misses, ("cache",))
+        + _family("ceph_cache_bytes", "gauge", "Bytes held per cache", sizes, ("cache",))
+    )
+
+
+def render():
+    """Prometheus text exposition of every metric of this process."""
+    lines = []
+    for metric in (STAGE_SECONDS, REQUEST_SECONDS, BATCH_SIZE, PREDICTIONS):
+        lines += metric.collect()
+    for gauges in (_queues, _model, _caches, _memory):
+        try:
+            lines += gauges()
+        except Exception as e:  # a broken collector must not take the endpoint down
+            print(f"⚠️ Metrics collector {gauges.__name__} failed: {e}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,197 @@
+"""
+Versioned schema migrations, applied at startup (replaces create_all at import).
+
+Each migration runs once, in order, inside its own transaction, and is recorded
+in the `schema_migrations` table. Migrations must be idempotent: the baseline
+creates missing tables from the current models, so on a fresh database later
+steps find their columns/indexes already present and do nothing.
+
+Usage (from backend/):
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations status     # list applied / pending
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, exc, select, text
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single-worker setups only
+    fcntl = None
+
+from . import database, landmark_codec, models
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+MIGRATIONS = []  # (version, description, fn(conn))
+_PG_LOCK_KEY = 0x63657068  # "ceph": pg_advisory_lock id shared by all workers
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def _index(name, table, *columns):
+    """Index pinned to the columns a migration knows about, not to the live model.
+
+    Historical migrations must keep working on old databases after the model
+    gains columns (and their indexes) in later migrations.
+    """
+    pinned = Table(table, MetaData(), *(Column(c) for c in columns))
+    return Index(name, *(pinned.c[c] for c in columns))
+
+
+def _create_indexes(conn, *indexes):
+    for index in indexes:
+        index.create(conn, checkfirst=True)
+
+
+# --- MIGRATIONS ---
+@migration(1, "baseline schema")
+def _baseline(conn):
+    models.Base.metadata.create_all(bind=conn)
+    # Columns added to predictions before migrations existed
+    database.ensure_columns("predictions", {
+        "upload_path": "VARCHAR",
+        "status": "VARCHAR DEFAULT 'completed'",
+        "processing_time": "FLOAT",
+        "error": "TEXT",
+    }, conn)
+
+
+@migration(2, "listing indexes on patients.owner_id and predictions.patient_id")
+def _listing_indexes(conn):
+    _create_indexes(
+        conn,
+        _index("ix_patients_id", "patients", "id"),
+        _index("ix_patients_owner_id_id", "patients", "owner_id", "id"),
+        _index("ix_predictions_id", "predictions", "id"),
+        _index("ix_predictions_patient_id_id", "predictions", "patient_id", "id"),
+    )
+    if database.IS_SQLITE:
+        conn.exec_driver_sql("ANALYZE")  # refresh planner statistics for the new indexes
+
+
+@migration(3, "packed landmark columns and landmark_schemas table")
+def _packed_landmarks(conn):
+    models.LandmarkSchema.__table__.create(conn, checkfirst=True)
+    blob = "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+    database.ensure_columns("predictions", {
+        "landmark_schema_id": "INTEGER REFERENCES landmark_schemas(id)",
+        "landmarks_packed": blob,
+    }, conn)
+
+
+@migration(4, "pack existing landmark JSON")
+def _pack_existing_landmarks(conn):
+    converted = landmark_codec.pack_existing(conn)
+    if converted:
+        print(f"🗃️ Packed landmarks of {converted} existing predictions")
+
+
+@migration(5, "report_exports table for bulk report jobs")
+def _report_exports(conn):
+    models.ReportExport.__table__.create(conn, checkfirst=True)
+
+
+@migration(6, "artifacts table and predictions.upload_digest")
+def _artifact_store(conn):
+    models.Artifact.__table__.create(conn, checkfirst=True)
+    database.ensure_columns("predictions", {"upload_digest": "VARCHAR(64)"}, conn)
+    _create_indexes(conn, _index("ix_predictions_upload_digest", "predictions", "upload_digest"))
+
+
+@migration(7, "report_exports runner claim columns")
+def _report_export_claims(conn):
+    database.ensure_columns("report_exports", {"claimed_by": "VARCHAR", "heartbeat_at": "TIMESTAMP"}, conn)
+
+
+# --- RUNNER ---
+def applied_versions(bind=None):
+    bind = bind or database.engine
+    _meta.create_all(bind=bind)
+    with bind.connect() as conn:
+        return {row[0] for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def pending(bind=None):
+    done = applied_versions(bind)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+@contextmanager
+def _migration_lock(bind):
+    """Serialize upgrade() across processes (several workers start at once).
+
+    SQLite DDL is not transactional under pysqlite, so a second worker would
+    see half-created tables; file databases take an flock next to the file,
+    PostgreSQL an advisory lock. Other backends rely on the version primary key.
+    """
+    url = bind.url
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:" and fcntl:
+        with open(f"{os.path.abspath(url.database)}.migrate.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    elif url.get_backend_name() == "postgresql":
+        with bind.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _PG_LOCK_KEY})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _PG_LOCK_KEY})
+                conn.commit()
+    else:
+        yield
+
+
+def upgrade(bind=None):
+    """Apply pending migrations; safe to call from several processes at once."""
+    bind = bind or database.engine
+    with _migration_lock(bind):
+        todo = pending(bind)
+        for version, description, fn in todo:
+            try:
+                with bind.begin() as conn:
+                    fn(conn)
+                    conn.execute(schema_migrations.insert().values(
+                        version=version, description=description, applied_at=datetime.utcnow()
+                    ))
+                print(f"🗃️ Applied migration {version}: {description}")
+            except exc.IntegrityError:
+                print(f"🗃️ Migration {version} already applied by another process")
+    return [m[0] for m in todo]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "status":
+        done = applied_versions()
+        for version, description, _ in MIGRATIONS:
+            print(f"{'✅' if version in done else '⏳'} {version:>3}  {description}")
+        return
+    applied = upgrade()
+    if not applied:
+        print("✅ Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import numpy as np
+from PIL import Image
+import hashlib
+import io
+import os
+import threading
+import time
+from .batching import MicroBatcher, batch_buckets
+from . import prediction_cache, inference_backends, overlays, metrics, model_server
+
+# --- MODEL CONFIG ---
+MODEL_PATH = inference_backends.MODEL_PATH
+INFERENCE_BACKEND = inference_backends.INFERENCE_BACKEND
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "1") == "1"
+_model = None
+_batcher = None
+_model_id = None
+_model_lock = threading.Lock()
+_predict_lock = threading.Lock()  # warmup and the batcher never run the model concurrently
+
+# Readiness as reported by /readyz
+_state = {"status": "not_loaded", "error": None, "timings": {}}
+
+
+# --- MODEL LOADING ---
+def load_model():
+    """Load the configured inference backend (keras / tflite / onnx) once.
+
+    With MODEL_SERVER_SOCKET set this is a client of the shared model server
+    instead, and TensorFlow is never imported in this process.
+    """
+    if model_server.client_enabled():
+        return model_server.get_client()
+    path = inference_backends.backend_path(INFERENCE_BACKEND)
+    print(f"✅ Loading {INFERENCE_BACKEND} model from {path}")
+    try:
+        model = inference_backends.load_backend(INFERENCE_BACKEND, path)
+        print("✅ Model loaded successfully!")
+        return model
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        raise
+
+
+def get_model():
+    """Return cached model instance (singleton)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
+    return _model
+
+
+def model_identity():
+    """Stable id of the deployed weights and backend, used to key cached predictions.
+
+    Converted/quantized models produce slightly different landmarks, so the
+    backend and its own model file are part of the identity.
+    """
+    global _model_id
+    if _model_id is None and model_server.client_enabled():
+        _model_id = get_model().info["identity"]  # the server's weights, not whatever is on this disk
+    if _model_id is None:
+        path = inference_backends.backend_path(INFERENCE_BACKEND)
+        try:
+            st = os.stat(path)
+            _model_id = f"{INFERENCE_BACKEND}:{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}"
+        except OSError:
+            _model_id = f"{INFERENCE_BACKEND}:{os.path.basename(path)}"
+    return _model_id
+
+
+def _run_model(batch):
+    """Single forward pass over a (N, 256, 256, 1) batch."""
+    model = get_model()
+    if model_server.client_enabled():
+        return model.predict_on_batch(batch)  # one pooled connection per in-flight batch; no local model to guard
+    with _predict_lock:
+        return np.asarray(model.predict_on_batch(batch))
+
+
+def get_batcher():
+    """Return the shared micro-batching scheduler in front of the model."""
+    global _batcher
+    if _batcher is None:
+        # A model-server client forwards real images only (the server pads its own
+        # batches) and keeps up to MODEL_SERVER_POOL_SIZE batches in flight
+        client = model_server.client_enabled()
+        _batcher = MicroBatcher(
+            _run_model, pad=not client, concurrency=model_server.MODEL_SERVER_POOL_SIZE if client else 1
+        )
+    return _batcher
+
+
+# --- STARTUP / WARMUP ---
+def warmup(batch_sizes=None):
+    """Dummy forward passes at every batch size the batcher can send.
+
+    This triggers graph tracing / kernel selection before real traffic does.
+    A model server warms itself, so its clients skip this.
+    """
+    if model_server.client_enabled():
+        return []
+    sizes = batch_sizes or batch_buckets(get_batcher().max_batch_size)
+    for n in sizes:
+        _run_model(np.zeros((n, INPUT_SIZE[1], INPUT_SIZE[0], 1), dtype=np.float32))
+    return sizes
+
+
+def _timed(phase, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    _state["timings"][phase] = round(time.perf_counter() - start, 3)
+    print(f"⏱️ Startup phase '{phase}' took {_state['timings'][phase]}s")
+    return result
+
+
+def _wait_for_model_server():
+    """Client mode: keep waiting, the server may start long after the workers."""
+    while True:
+        try:
+            return get_model()
+        except model_server.ModelServerError as e:
+            _state.update(status="waiting_for_model_server", error=str(e))
+            print(f"⏳ Still waiting for the model server: {e}")
+
+
+def startup():
+    """Load the model and warm it up; records per-phase timings for /readyz."""
+    _state.update(status="loading", error=None, timings={})
+    try:
+        _timed("model_load", _wait_for_model_server if model_server.client_enabled() else get_model)
+        _state["status"] = "warming_up"
+        _timed("batcher_start", get_batcher)
+        sizes = _timed("warmup", warmup)
+        _state["status"] = "ready"
+        print(f"✅ Model ready (warmed batch sizes {sizes})")
+    except Exception as e:
+        _state.update(status="failed", error=str(e))
+        print(f"❌ Model startup failed: {e}")
+
+
+def start_background_startup():
+    """Run startup() off the main thread so /healthz answers while the model loads."""
+    thread = threading.Thread(target=startup, name="model-startup", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness():
+    """Snapshot of the model lifecycle; lazily loaded models also count as ready."""
+    state = dict(_state, timings=dict(_state["timings"]))
+    if model_server.client_enabled() and _model is not None:
+        # Connected (at startup or lazily since): the server's current state decides,
+        # not whatever this worker's first connect attempt saw
+        server = _model.health()  # cached probe with a short timeout
+        if server.get("ready"):
+            state.update(status="ready", error=None)
+        else:
+            state["status"] = "model_server_unavailable"
+            state["error"] = server.get("error") or f"model server is {server.get('status')}"
+    elif state["status"] == "not_loaded" and _model is not None:
+        state["status"] = "ready"
+    state["ready"] = state["status"] == "ready"
+    state["backend"] = "model-server" if model_server.client_enabled() else INFERENCE_BACKEND
+    return state
+
+
+# --- IMAGE PREPROCESSING ---
+INPUT_SIZE = (256, 256)
+
+
+def _is_encoded(source):
+    """True for an undecoded upload: raw bytes or a path to the saved file."""
+    return isinstance(source, (bytes, bytearray, memoryview, str, os.PathLike))
+
+
+def _open_image(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    # Opening by path lets Pillow read incrementally (and mmap raw formats)
+    return Image.open(source)
+
+
+def decode_image(source):
+    """Decode an upload (bytes or file path) once at full resolution.
+
+    The result is shared by preprocessing and rendering.
+    """
+    img = _open_image(source)
+    img.load()
+    return img
+
+
+def _cache_key(source, digest=None):
+    """Cache key for an upload; `digest` is its sha256 if already computed on write."""
+    if digest is None:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            digest = hashlib.sha256(source).hexdigest()
+        else:
+            h = hashlib.sha256()
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+    return prediction_cache.key_for_digest(digest, model_identity())
+
+
+def preprocess_image(image):
+    """Convert an upload (bytes, file path or decoded PIL image) to a float32 model input.
+
+    Undecoded uploads are opened in JPEG draft mode so the decoder itself
+    downscales towards 256x256 instead of materialising the full radiograph.
+    """
+    try:
+        if _is_encoded(image):
+            image = _open_image(image)
+            image.draft("L", INPUT_SIZE)  # no-op for non-JPEG formats
+
+        # Palette/16-bit modes can't be resampled smoothly; convert those first.
+        # Otherwise resize before the grayscale conversion so no full-size copy is made.
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("L")
+        img = image.resize(INPUT_SIZE, reducing_gap=3.0)
+        if img.mode != "L":
+            img = img.convert("L")  # Grayscale
+
+        img_array = np.asarray(img, dtype=np.float32)
+        img_array *= np.float32(1.0 / 255.0)
+        return img_array.reshape(1, INPUT_SIZE[1], INPUT_SIZE[0], 1)  # (1, 256, 256, 1)
+    except Exception as e:
+        print(f"❌ Error preprocessing image: {e}")
+        raise
+
+
+# --- PREDICTION ---
+def landmarks_from_output(output):
+    """Turn one model output row into the landmark list stored on Prediction."""
+    preds = np.asarray(output).flatten().tolist()
+
+    # Assume the model outputs x,y pairs (2*N values)
+    landmarks = []
+    for i in range(0, len(preds), 2):
+        landmarks.append({
+            "name": f"P{i//2 + 1}",
+            "x": preds[i],
+            "y": preds[i + 1]
+        })
+    return landmarks
+
+
+def _infer(image):
+    """Uncached inference on an upload or decoded image (batched with concurrent requests)."""
+    with metrics.stage("preprocess"):
+        img_array = preprocess_image(image)
+    output = get_batcher().predict(img_array)  # queue_wait / model_forward timed by the batcher
+    return landmarks_from_output(output)
+
+
+def predict_from_bytes(image_bytes, digest=None):
+    """Run inference on an upload given as bytes or as the path of the saved file.
+
+    Results are memoized by content hash, so identical uploads skip the model.
+    """
+    cache = prediction_cache.get_cache()
+    if cache is None:
+        return {"landmarks": _infer(image_bytes)}
+
+    with metrics.stage("cache_lookup"):
+        cache_key = _cache_key(image_bytes, digest)
+        cached = cache.get(cache_key)
+    if cached is not None:
+        return {"landmarks": cached["landmarks"]}
+
+    landmarks = _infer(image_bytes)
+    with metrics.stage("cache_store"):
+        cache.put(cache_key, {"landmarks": landmarks})
+    return {"landmarks": landmarks}
+
+
+def predict_many(images, digests=None):
+    """Landmarks for several uploads (bytes or paths) at once.
+
+    Cache misses are all submitted to the batcher before waiting on any of
+    them, so a chunk of N images becomes one batched forward pass. Returns one
+    entry per input: a landmark list, or the Exception raised for that image.
+    """
+    cache = prediction_cache.get_cache()
+    results = [None] * len(images)
+    pending = []  # (index, cache_key, future)
+    digests = digests or [None] * len(images)
+
+    for i, (source, digest) in enumerate(zip(images, digests)):
+        try:
+            with metrics.stage("cache_lookup"):
+                cache_key = _cache_key(source, digest)
+                cached = cache.get(cache_key) if cache is not None else None
+            if cached is not None:
+                results[i] = cached["landmarks"]
+                continue
+            with metrics.stage("preprocess"):
+                img_array = preprocess_image(source)
+            pending.append((i, cache_key, get_batcher().submit(img_array)))
+        except Exception as e:
+            results[i] = e
+
+    for i, cache_key, future in pending:
+        try:
+            results[i] = landmarks_from_output(future.result())
+            if cache is not None:
+                with metrics.stage("cache_store"):
+                    cache.put(cache_key, {"landmarks": results[i]})
+        except Exception as e:
+            results[i] = e
+    return results
+
+
+# --- SAVE PREDICTED IMAGE ---
+def save_predicted_image(image, landmarks, output_path):
+    """Overlay predicted landmarks on the image (bytes, path or decoded PIL image) and save.
+
+    A decoded RGB image is drawn on in place to avoid another full-size copy.
+    """
+    try:
+        if _is_encoded(image):
+            image = decode_image(image)
+        img = image if image.mode == "RGB" else image.convert("RGB")
+        overlays.draw(img, landmarks)
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        img.save(output_path)
+        print(f"💾 Saved predicted image to {output_path}")
+
+        return output_path
+    except Exception as e:
+        print(f"❌ Error saving predicted image: {e}")
+        raise
+
+
+def _cached_overlay(cached):
+    """Return the overlay path from a cache entry if the file still exists."""
+    image_rel = ((cached or {}).get("artifacts") or {}).get("image")
+    if image_rel and os.path.exists(image_rel):
+        return image_rel
+    return None
+
+
+def _write_overlay(image, landmarks, ceph_id, cache_key):
+    """Save the overlay for a decoded upload and remember it in the cache."""
+    output_dir = "outputs"
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Artifacts are named by content hash so a later upload for the same
+    # patient cannot overwrite files a cache entry points at.
+    image_rel = os.path.join(output_dir, f"ceph_{ceph_id}_{cache_key[:12]}_predicted.jpg")
+    with metrics.stage("overlay"):
+        save_predicted_image(image, landmarks, image_rel)
+
+    # Landmark spreadsheets are no longer written here; see exports.py.
+    cache = prediction_cache.get_cache()
+    if cache is not None:
+        cache.put(cache_key, {
+            "landmarks": landmarks,
+            "artifacts": {"image": image_rel},
+        })
+    return image_rel
+
+
+def render_overlay(source, landmarks, ceph_id, digest=None):
+    """Artifact stage on its own: reuse or render the overlay, return its relative path."""
+    cache = prediction_cache.get_cache()
+    with metrics.stage("cache_lookup"):
+        cache_key = _cache_key(source, digest)
+        image_rel = _cached_overlay(cache.get(cache_key) if cache is not None else None)
+    if image_rel is None:
+        with metrics.stage("decode"):
+            image = decode_image(source)
+        image_rel = _write_overlay(image, landmarks, ceph_id, cache_key)
+    return image_rel
+
+
+def artifact_url(path):
+    """Public URL for a file under outputs/ or uploads/."""
+    return "http://localhost:8000/" + path.replace("\\", "/")
+
+
+def process_and_predict(source, ceph_id, digest=None):
+    """Full synchronous pipeline for one upload (bytes or saved file path).
+
+    Unless OVERLAY_PRERENDER is set, no overlay is written: output_image is
+    None and overlays are drawn on demand (see overlays.py).
+    """
+    if not overlays.OVERLAY_PRERENDER:
+        landmarks = predict_from_bytes(source, digest)["landmarks"]
+        return {"ceph_id": ceph_id, "landmarks": landmarks, "image_path": None, "output_image": None}
+
+    cache = prediction_cache.get_cache()
+    with metrics.stage("cache_lookup"):
+        cache_key = _cache_key(source, digest)
+        cached = cache.get(cache_key) if cache is not None else None
+        image_rel = _cached_overlay(cached)
+
+    if image_rel is not None:
+        # ♻️ Same upload, same model: reuse landmarks and the rendered overlay
+        landmarks = cached["landmarks"]
+    else:
+        # Decode once; the same image feeds the model input and the overlay.
+        with metrics.stage("decode"):
+            image = decode_image(source)
+        landmarks = cached["landmarks"] if cached is not None else _infer(image)
+        image_rel = _write_overlay(image, landmarks, ceph_id, cache_key)
+
+    # 🚀 FIX PATHS FOR FRONTEND
+    image_url = artifact_url(image_rel)
+
+    return {
+        "ceph_id": ceph_id,
+        "landmarks": landmarks,
+        "image_path": image_url,
+        "output_image": image_url,
+    }
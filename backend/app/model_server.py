@@ -0,0 +1,322 @@
+"""
+Shared model-server process for multi-worker deployments.
+
+With several uvicorn/gunicorn workers each one would import TensorFlow and
+hold its own copy of the model. Setting MODEL_SERVER_SOCKET instead makes the
+workers send their preprocessed (N, 256, 256, 1) float32 batches over a Unix
+socket to one model-server process, which owns the model, the inference
+threads and a MicroBatcher that merges requests from all workers into shared
+forward passes. HTTP workers then scale independently of model memory.
+
+Run it next to the API (same environment, before or after the workers):
+    MODEL_SERVER_SOCKET=/run/cephai/model.sock python -m app.model_server
+    MODEL_SERVER_SOCKET=/run/cephai/model.sock gunicorn -k uvicorn.workers.UvicornWorker -w 4 app.main:app
+
+Workers keep a small pool of connections (MODEL_SERVER_POOL_SIZE), each carrying
+one batch at a time, and wait up to MODEL_SERVER_CONNECT_TIMEOUT for the server
+at startup. /readyz probes the server on its own short-lived connection, at
+most every MODEL_SERVER_HEALTH_TTL seconds. Without MODEL_SERVER_SOCKET
+everything runs in-process as before.
+
+Wire format (big-endian), one request / response per round trip:
+    request : op u8, n u32, h u32, w u32, c u32, then n*h*w*c float32
+    response: status u8, rows u32, cols u32, length u32, then `length` bytes
+              (OK: rows x cols float32; INFO: JSON; ERROR: utf-8 message)
+"""
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+# --- MODEL SERVER CONFIG ---
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")  # empty: run the model in-process
+MODEL_SERVER_POOL_SIZE = int(os.getenv("MODEL_SERVER_POOL_SIZE", "2"))
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "60"))  # s per round trip
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.getenv("MODEL_SERVER_CONNECT_TIMEOUT", "30"))  # s at worker startup
+MODEL_SERVER_HEALTH_TTL = float(os.getenv("MODEL_SERVER_HEALTH_TTL", "2"))  # s a health probe result is reused
+MODEL_SERVER_PROBE_TIMEOUT = float(os.getenv("MODEL_SERVER_PROBE_TIMEOUT", "1"))
+
+OP_PREDICT, OP_INFO = 1, 2
+STATUS_OK, STATUS_INFO, STATUS_ERROR = 0, 1, 2
+_REQUEST = struct.Struct("!BIIII")
+_RESPONSE = struct.Struct("!BIII")
+
+_serving = False  # True inside the model-server process itself
+_client = None
+_client_lock = threading.Lock()
+
+
+class ModelServerError(RuntimeError):
+    """The model server is unreachable or failed the request."""
+
+
+def client_enabled():
+    """True in API workers that should delegate inference to the model server."""
+    return bool(MODEL_SERVER_SOCKET) and not _serving
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    while n:
+        got = sock.recv_into(view[len(buf) - n:], n)
+        if not got:
+            raise ConnectionError("Model server connection closed")
+        n -= got
+    return buf
+
+
+# --- CLIENT ---
+class ModelClient:
+    """Pooled connections to the model server; quacks like an inference backend."""
+
+    name = "model-server"
+
+    def __init__(self, path=MODEL_SERVER_SOCKET, pool_size=MODEL_SERVER_POOL_SIZE, timeout=MODEL_SERVER_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self.pool_size = pool_size
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.info = {}
+        self._health = ({}, 0.0)  # (info or {"ready": False, "error"}, monotonic time checked)
+        self._health_lock = threading.Lock()
+
+    def _connect(self, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout if timeout is None else timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _exchange(sock, header, payload):
+        sock.sendall(header)
+        if payload:
+            sock.sendall(payload)
+        status, rows, cols, length = _RESPONSE.unpack(_recv_exact(sock, _RESPONSE.size))
+        return status, rows, cols, _recv_exact(sock, length)
+
+    @staticmethod
+    def _decode(status, rows, cols, body):
+        if status == STATUS_ERROR:
+            raise ModelServerError(bytes(body).decode("utf-8", "replace"))
+        if status == STATUS_INFO:
+            return json.loads(bytes(body))
+        return np.frombuffer(body, dtype=np.float32).reshape(rows, cols)
+
+    def _call(self, op, array=None):
+        """One round trip on a pooled connection.
+
+        Retried once only when nothing can have reached the server: the
+        connect failed, or a reused idle connection turned out closed (server
+        restart). A timeout is never retried; resubmitting a slow batch would
+        double the load on a server that is already behind.
+        """
+        header = _REQUEST.pack(op, *(array.shape if array is not None else (0, 0, 0, 0)))
+        payload = array.tobytes() if array is not None else b""
+        with self._slots:
+            for attempt in (1, 2):
+                try:
+                    sock, reused = self._idle.get_nowait(), True
+                except queue.Empty:
+                    sock, reused = None, False
+                try:
+                    if sock is None:
+                        sock = self._connect()
+                    response = self._exchange(sock, header, payload)
+                except socket.timeout as e:  # the connect itself may have timed out (full backlog)
+                    if sock is not None:
+                        sock.close()
+                    raise ModelServerError(f"Model server at {self.path} timed out after {self.timeout:g}s") from e
+                except OSError as e:  # includes ConnectionError
+                    stale = sock is None or (reused and isinstance(e, ConnectionError))
+                    if sock is not None:
+                        sock.close()
+                    if attempt == 2 or not stale:
+                        raise ModelServerError(f"Model server at {self.path} unreachable: {e}") from e
+                    continue
+                self._idle.put(sock)
+                return self._decode(*response)
+
+    def wait_ready(self, timeout=MODEL_SERVER_CONNECT_TIMEOUT):
+        """Block until the server answers and reports its model ready; returns its info."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.info = self._call(OP_INFO)
+                if self.info.get("ready"):
+                    return self.info
+                error = RuntimeError(f"model server is {self.info.get('status')}")
+            except ModelServerError as e:
+                error = e
+            if time.monotonic() >= deadline:
+                raise ModelServerError(f"Model server not ready after {timeout:.0f}s: {error}")
+            time.sleep(0.25)
+
+    def predict_on_batch(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if batch.ndim != 4:
+            raise ValueError(f"Expected an (N, H, W, C) batch, got shape {batch.shape}")
+        return self._call(OP_PREDICT, batch)
+
+    def stats(self):
+        return self._call(OP_INFO)
+
+    def health(self, max_age=MODEL_SERVER_HEALTH_TTL):
+        """Server info, probed on a fresh connection at most every `max_age` seconds.
+
+        Never waits behind busy pooled connections and never raises: an
+        unreachable server reads as {"ready": False, "error": ...}.
+        """
+        with self._health_lock:
+            info, checked = self._health
+            if time.monotonic() - checked < max_age:
+                return info
+            sock = None
+            try:
+                sock = self._connect(MODEL_SERVER_PROBE_TIMEOUT)
+                info = self._decode(*self._exchange(sock, _REQUEST.pack(OP_INFO, 0, 0, 0, 0), b""))
+                self.info = info
+            except (OSError, ModelServerError, ValueError) as e:
+                info = {"ready": False, "status": "unreachable", "error": str(e)}
+            finally:
+                if sock is not None:
+                    sock.close()
+            self._health = (info, time.monotonic())
+            return info
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def get_client():
+    """Connected client (singleton); waits for the server on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = ModelClient()
+                info = client.wait_ready()
+                print(f"✅ Using model server at {MODEL_SERVER_SOCKET} ({info['identity']})")
+                _client = client
+    return _client
+
+
+# --- SERVER ---
+class _Handler(socketserver.BaseRequestHandler):
+    """One thread per worker connection; images go through the shared batcher."""
+
+    def handle(self):
+        from . import ml_inference
+
+        sock = self.request
+        while True:
+            try:
+                op, n, h, w, c = _REQUEST.unpack(_recv_exact(sock, _REQUEST.size))
+                data = _recv_exact(sock, n * h * w * c * 4) if op == OP_PREDICT else b""
+            except (ConnectionError, OSError):
+                return
+            try:
+                if op == OP_INFO:
+                    self._send(STATUS_INFO, 0, 0, json.dumps(_info()).encode())
+                    continue
+                if op != OP_PREDICT:
+                    raise ValueError(f"Unknown op {op}")
+                batch = np.frombuffer(data, dtype=np.float32).reshape(n, h, w, c)
+                batcher = ml_inference.get_batcher()
+                futures = [batcher.submit(batch[i]) for i in range(n)]
+                out = np.stack([np.asarray(f.result(), dtype=np.float32) for f in futures]).reshape(n, -1)
+                self._send(STATUS_OK, out.shape[0], out.shape[1], out.tobytes())
+            except Exception as e:
+                self._send(STATUS_ERROR, 0, 0, str(e).encode())
+
+    def _send(self, status, rows, cols, body):
+        self.request.sendall(_RESPONSE.pack(status, rows, cols, len(body)) + body)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _info():
+    from . import ml_inference
+
+    state = ml_inference.readiness()
+    batcher = ml_inference._batcher
+    return {
+        "ready": state["ready"],
+        "status": state["status"],
+        "backend": state["backend"],
+        "identity": ml_inference.model_identity(),
+        "timings": state["timings"],
+        "queue_depth": batcher.queue_depth() if batcher is not None else 0,
+        "pid": os.getpid(),
+    }
+
+
+def _claim_socket(path):
+    """Remove a stale socket file; refuse to start if a live server owns it."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise SystemExit(f"❌ A model server is already listening on {path}")
+
+
+def serve(path=MODEL_SERVER_SOCKET):
+    """Load and warm the model, then answer workers on `path` until interrupted."""
+    global _serving
+    from . import ml_inference
+
+    if not path:
+        raise SystemExit("❌ Set MODEL_SERVER_SOCKET (or pass a socket path)")
+    _serving = True
+    _claim_socket(path)
+    ml_inference.startup()
+    if not ml_inference.readiness()["ready"]:
+        raise SystemExit("❌ Model failed to load; not serving")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    server = _Server(path, _Handler)
+    os.chmod(path, 0o660)
+    print(f"🧠 Model server listening on {path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == "__main__":
+    # Serve through the package module (not __main__) so ml_inference sees `_serving`
+    import importlib
+
+    importlib.import_module(f"{__package__}.model_server").serve(
+        sys.argv[1] if len(sys.argv) > 1 else MODEL_SERVER_SOCKET
+    )
@@ -0,0 +1,161 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Text, Float, Index, LargeBinary
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from .database import Base
+
+
+# --------------------------
+# 👤 USER TABLE
+# --------------------------
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True, nullable=False)
+    hashed_password = Column(String, nullable=False)
+    role = Column(String, default="doctor")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    patients = relationship("Patient", back_populates="owner")
+
+
+# --------------------------
+# 🧍 PATIENT TABLE
+# --------------------------
+class Patient(Base):
+    __tablename__ = "patients"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    dob = Column(String, nullable=True)
+    notes = Column(Text, nullable=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    owner = relationship("User", back_populates="patients")
+    predictions = relationship("Prediction", back_populates="patient")
+
+    # Per-owner listings filter on owner_id and page by id (see listings.py)
+    __table_args__ = (Index("ix_patients_owner_id_id", "owner_id", "id"),)
+
+
+# --------------------------
+# 🧠 PREDICTION TABLE
+# --------------------------
+class Prediction(Base):
+    __tablename__ = "predictions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+
+    # Model metadata
+    model_name = Column(String, default="ceph_landmark_model")
+
+    # Prediction results: either the JSON landmark list or the packed form
+    # (float32 x,y pairs + shared name schema); read through `landmarks`.
+    result = Column(JSON(none_as_null=True), nullable=True)  # Landmark list (JSON)
+    landmark_schema_id = Column(Integer, ForeignKey("landmark_schemas.id"), nullable=True)
+    landmarks_packed = Column(LargeBinary, nullable=True)
+    image_path = Column(String, nullable=True)  # Saved cephalometric image
+    excel_path = Column(String, nullable=True)  # Excel file path
+    upload_path = Column(String, nullable=True)  # Original upload
+    upload_digest = Column(String(64), nullable=True, index=True)  # sha256 of the upload (artifacts.digest)
+
+    # Job state: pending -> running -> inferred -> rendering -> completed | failed
+    status = Column(String, default="completed")
+    processing_time = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    patient = relationship("Patient", back_populates="predictions")
+
+    __table_args__ = (Index("ix_predictions_patient_id_id", "patient_id", "id"),)
+
+    @property
+    def landmarks(self):
+        """Landmark list [{name, x, y}] from whichever representation is stored."""
+        from . import landmark_codec
+        return landmark_codec.decode_row(self.result, self.landmark_schema_id, self.landmarks_packed)
+
+    def set_landmarks(self, landmarks):
+        from . import landmark_codec
+        for column, value in landmark_codec.columns(landmarks).items():
+            setattr(self, column, value)
+
+
+# --------------------------
+# 🏷️ LANDMARK NAME SCHEMA TABLE
+# --------------------------
+class LandmarkSchema(Base):
+    __tablename__ = "landmark_schemas"
+
+    id = Column(Integer, primary_key=True)
+    digest = Column(String(64), unique=True, nullable=False)  # sha256 of the name list
+    names = Column(JSON, nullable=False)                      # ["P1", "P2", ...] in packed order
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# --------------------------
+# ♻️ PREDICTION CACHE TABLE
+# --------------------------
+class PredictionCacheEntry(Base):
+    __tablename__ = "prediction_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256(model id + sha256(image bytes))
+    value = Column(JSON, nullable=False)        # Landmarks + rendered artifact paths
+    size_bytes = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# --------------------------
+# 🗂️ BULK REPORT EXPORT TABLE
+# --------------------------
+class ReportExport(Base):
+    __tablename__ = "report_exports"
+
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # None: every owner (admin export)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    format = Column(String, nullable=False)  # zip | pdf
+
+    # Selection, frozen at creation so a resumed job renders the same set
+    patient_ids = Column(JSON, nullable=True)
+    since = Column(DateTime, nullable=True)
+    until = Column(DateTime, nullable=True)
+    max_prediction_id = Column(Integer, nullable=False, default=0)
+
+    # Progress: pending -> running -> assembling -> completed | failed
+    status = Column(String, default="pending")
+    total = Column(Integer, default=0)
+    rendered = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    output_path = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Runner that owns the job (one per cluster); a stale heartbeat frees it
+    claimed_by = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# --------------------------
+# 📦 ARTIFACT STORE TABLE
+# --------------------------
+class Artifact(Base):
+    __tablename__ = "artifacts"
+
+    digest = Column(String(64), primary_key=True)  # sha256 of the content
+    kind = Column(String, nullable=False, default="upload")
+    path = Column(String, nullable=False)           # artifacts/ab/cd/<digest><ext>
+    size_bytes = Column(Integer, nullable=False, default=0)
+    original_name = Column(String, nullable=True)   # client file name of the first upload
+    created_at = Column(DateTime, default=datetime.utcnow)
+    stored_at = Column(DateTime, default=datetime.utcnow)  # last upload of this content; GC grace starts here
@@ -0,0 +1,154 @@
+"""
+Landmark overlays rendered on demand from the original upload.
+
+Predictions no longer burn a full-size overlay JPEG at inference time: the
+landmarks are already stored, so an overlay is drawn only when someone opens
+it, at the size and in the style asked for (point size, labels, a subset of
+landmarks, colours). Rendered overlays live in a size-bounded on-disk LRU
+(OVERLAY_CACHE_MAX_BYTES), named by a key over the upload, the landmarks, the
+style and the output variant, so they never go stale.
+OVERLAY_PRERENDER=1 restores the old render-every-prediction behaviour.
+"""
+
+import hashlib
+import json
+import os
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from . import derivatives, landmark_codec, measurements, metrics
+from .lru import DiskLRU
+
+# --- OVERLAY CONFIG ---
+OVERLAY_DIR = os.getenv("OVERLAY_DIR", os.path.join("outputs", "overlays"))
+OVERLAY_CACHE_MAX_BYTES = int(os.getenv("OVERLAY_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+OVERLAY_PRERENDER = os.getenv("OVERLAY_PRERENDER", "0") == "1"
+OVERLAY_MIN_LABEL_PX = 7  # labels that would render smaller than this are skipped
+
+_cache = DiskLRU(OVERLAY_DIR, OVERLAY_CACHE_MAX_BYTES)
+_fonts = {}
+
+
+class Style(NamedTuple):
+    """How landmarks are drawn; sizes are in source-image pixels."""
+    point_size: int = 4
+    labels: bool = True
+    names: Optional[Tuple[str, ...]] = None  # subset (stored names or ISBI roles); None: all
+    color: str = "red"
+    label_color: str = "yellow"
+
+    def token(self):
+        return json.dumps(self._asdict(), sort_keys=True)
+
+
+DEFAULT_STYLE = Style()
+
+
+def parse_style(point_size=None, labels=None, names=None, color=None, label_color=None):
+    """Query parameters -> Style; raises ValueError on a bad value."""
+    style = DEFAULT_STYLE._replace(
+        **{k: v for k, v in (("point_size", point_size), ("labels", labels),
+                             ("color", color), ("label_color", label_color)) if v is not None}
+    )
+    if not 1 <= style.point_size <= 64:
+        raise ValueError("point_size must be between 1 and 64")
+    for c in (style.color, style.label_color):
+        ImageColor.getrgb(c)  # ValueError for unknown colours
+    if names:
+        style = style._replace(names=tuple(n.strip() for n in names.split(",") if n.strip()))
+    return style
+
+
+def url(pred_id, size="full", fmt="auto"):
+    return f"http://localhost:8000/predictions/{pred_id}/overlay?size={size}&format={fmt}"
+
+
+def select(landmarks, names):
+    """Landmarks whose stored name, or ISBI role (S, N, Go, ...), is in `names`."""
+    if not names:
+        return landmarks
+    roles = measurements.roles_for([lm["name"] for lm in landmarks])
+    wanted = {roles[n] for n in names if n in roles}
+    wanted |= {i for i, lm in enumerate(landmarks) if lm["name"] in names}
+    return [lm for i, lm in enumerate(landmarks) if i in wanted]
+
+
+def _font(size):
+    font = _fonts.get(size)
+    if font is None:
+        try:
+            font = ImageFont.truetype("arial.ttf", size)
+        except OSError:
+            font = ImageFont.load_default()
+        _fonts[size] = font
+    return font
+
+
+# --- DRAWING ---
+def draw(img, landmarks, style=DEFAULT_STYLE, scale=1.0):
+    """Draw landmarks (normalized x, y) on an RGB image in place and return it.
+
+    `scale` is output px per source px, so a thumbnail looks like a shrunken
+    full-size overlay rather than one covered in full-size dots.
+    """
+    w, h = img.size
+    canvas = ImageDraw.Draw(img)
+    r = max(1, round(style.point_size * scale))
+    font_px = round(14 * scale)
+    font = _font(font_px) if style.labels and font_px >= OVERLAY_MIN_LABEL_PX else None
+    for lm in select(landmarks, style.names):
+        x = int(lm["x"] * w)
+        y = int(lm["y"] * h)
+        canvas.ellipse((x - r, y - r, x + r, y + r), fill=style.color, outline="white", width=1)
+        if font is not None:
+            canvas.text((x + r + 2, y - r - 2), lm["name"], fill=style.label_color, font=font)
+    return img
+
+
+# --- ON-DEMAND RENDERING ---
+def _source(pred):
+    """('upload', path) to draw on, or ('legacy', path) of a pre-rendered overlay."""
+    if pred.upload_path and os.path.exists(pred.upload_path) and pred.landmarks:
+        return "upload", pred.upload_path
+    if pred.image_path and os.path.exists(pred.image_path):
+        return "legacy", pred.image_path
+    raise derivatives.SourceMissing(f"No overlay source for prediction {pred.id}")
+
+
+def key_for(pred, style=DEFAULT_STYLE, size="full", fmt="jpeg"):
+    """Cache key / ETag basis; cheap (stat + landmark hash), no rendering."""
+    kind, path = _source(pred)
+    if kind == "legacy":
+        return derivatives.key_for(path, f"{size}.{fmt}")
+    return hashlib.sha256(
+        f"{derivatives.key_for(path, 'overlay')}\0{landmark_codec.fingerprint(pred)}\0"
+        f"{style.token()}\0{size}.{fmt}".encode()
+    ).hexdigest()
+
+
+def ensure(pred, style=DEFAULT_STYLE, size="full", fmt="jpeg"):
+    """Overlay file for `pred` (rendered on a miss); returns (path, key).
+
+    Predictions whose upload is gone but that still have a pre-rendered
+    overlay (older rows) fall back to a derivative of that file.
+    """
+    kind, source = _source(pred)
+    if kind == "legacy":
+        return derivatives.ensure(source, size, fmt)
+    key = key_for(pred, style, size, fmt)
+    target = _cache.path(key, fmt)
+    if _cache.get(target):
+        return target, key
+    with metrics.stage("overlay"):
+        img = derivatives.open_scaled(source, derivatives.SIZES[size])
+        with Image.open(source) as original:  # header only
+            scale = img.width / original.width
+        draw(img, pred.landmarks, style, scale)
+        derivatives.save(img, target, fmt)
+    _cache.added(target)
+    return target, key
+
+
+def stats():
+    return {"prerender": OVERLAY_PRERENDER, **_cache.stats()}
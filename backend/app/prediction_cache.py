@@ -0,0 +1,154 @@
+"""
+Content-addressed prediction cache.
+
+Entries are keyed by the model identity plus the sha256 of the raw upload, so
+re-uploads of the same radiograph skip the model (and, when the rendered
+overlay is still on disk, rendering too). Two tiers:
+ - an in-process LRU of recently used entries
+ - a persistent `prediction_cache` table, evicted least-recently-used once the
+   stored payloads exceed PREDICTION_CACHE_DISK_MAX_BYTES
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import func
+
+from . import database, models
+from .lru import LRUCache
+
+# --- CACHE CONFIG ---
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "1") == "1"
+PREDICTION_CACHE_MEMORY_ITEMS = int(os.getenv("PREDICTION_CACHE_MEMORY_ITEMS", "512"))
+PREDICTION_CACHE_DISK_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_DISK_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_cache = None
+
+
+def key_for_digest(digest, model_id):
+    """Cache key from the sha256 hex digest of an upload plus the model identity."""
+    return hashlib.sha256(f"{model_id}\0{digest}".encode("utf-8")).hexdigest()
+
+
+def content_key(image_bytes, model_id):
+    """Cache key for raw upload bytes (see key_for_digest)."""
+    return key_for_digest(hashlib.sha256(image_bytes).hexdigest(), model_id)
+
+
+class PredictionCache:
+    def __init__(self, memory_items=PREDICTION_CACHE_MEMORY_ITEMS,
+                 disk_max_bytes=PREDICTION_CACHE_DISK_MAX_BYTES, session_factory=None):
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self.session_factory = session_factory or database.SessionLocal
+
+        self._memory = LRUCache(max_items=memory_items)
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def get(self, key):
+        """Return the cached dict for `key`, or None."""
+        value = self._memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        value = None
+        db = self.session_factory()
+        try:
+            entry = db.query(models.PredictionCacheEntry).filter(
+                models.PredictionCacheEntry.key == key
+            ).first()
+            if entry is not None:
+                entry.last_used_at = datetime.utcnow()
+                db.commit()
+                value = entry.value
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Prediction cache lookup failed: {e}")
+        finally:
+            db.close()
+
+        if value is None:
+            self._count("misses")
+            return None
+
+        self._count("disk_hits")
+        self._memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store `value` (JSON-serializable dict) in both tiers."""
+        self._memory.put(key, value)
+        self._count("stores")
+
+        size = len(json.dumps(value))
+        db = self.session_factory()
+        try:
+            entry = db.query(models.PredictionCacheEntry).filter(
+                models.PredictionCacheEntry.key == key
+            ).first()
+            if entry is None:
+                entry = models.PredictionCacheEntry(key=key)
+                db.add(entry)
+            entry.value = value
+            entry.size_bytes = size
+            entry.last_used_at = datetime.utcnow()
+            db.commit()
+            self._evict(db)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Prediction cache store failed: {e}")
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        """Drop least-recently-used rows until the table fits the size budget."""
+        Entry = models.PredictionCacheEntry
+        total = db.query(func.coalesce(func.sum(Entry.size_bytes), 0)).scalar()
+        if total <= self.disk_max_bytes:
+            return
+
+        evicted = 0
+        doomed = []
+        for key, size in db.query(Entry.key, Entry.size_bytes).order_by(Entry.last_used_at.asc()):
+            if total <= self.disk_max_bytes:
+                break
+            doomed.append(key)
+            total -= size or 0
+        for start in range(0, len(doomed), 500):
+            chunk = doomed[start:start + 500]
+            evicted += db.query(Entry).filter(Entry.key.in_(chunk)).delete(synchronize_session=False)
+        db.commit()
+        self._count("evictions", evicted)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def get_cache():
+    """Return the shared prediction cache, or None when disabled."""
+    global _cache
+    if not PREDICTION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = PredictionCache()
+    return _cache
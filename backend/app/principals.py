@@ -0,0 +1,100 @@
+"""
+Resolved principal (user id + role) for authenticated requests.
+
+The JWT only proves who the caller is; the id and the current role still come
+from the users table. Resolutions are kept in a small TTL-bounded LRU keyed by
+the token subject, so protected endpoints don't pay a SQL round trip per call.
+Entries are dropped as soon as a user row is updated or deleted, and the TTL
+bounds staleness for changes made by other processes.
+"""
+
+import os
+from typing import NamedTuple
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import event, inspect
+
+from . import database, models, utils
+from .lru import LRUCache
+
+# --- PRINCIPAL CACHE CONFIG ---
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # seconds; 0 disables
+PRINCIPAL_CACHE_ITEMS = int(os.getenv("PRINCIPAL_CACHE_ITEMS", "1024"))
+
+_cache = LRUCache(max_items=PRINCIPAL_CACHE_ITEMS, ttl=PRINCIPAL_CACHE_TTL)
+
+
+class Principal(NamedTuple):
+    id: int
+    username: str
+    role: str
+
+    @property
+    def is_admin(self):
+        return self.role == "admin"
+
+
+def _load(username):
+    db = database.SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == username).first()
+        return Principal(user.id, user.username, user.role) if user else None
+    finally:
+        db.close()
+
+
+def resolve(claims):
+    """Principal for decoded token claims; raises 401 if the user is gone."""
+    username = claims.get("sub")
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    uid = claims.get("uid")  # absent in tokens issued before it was added
+
+    principal = _cache.get(username) if PRINCIPAL_CACHE_TTL > 0 else None
+    if principal is None or (uid is not None and principal.id != uid):
+        principal = _load(username)
+        if principal is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        if PRINCIPAL_CACHE_TTL > 0:
+            _cache.put(username, principal)
+
+    # A deleted and re-registered username must not inherit the old account's tokens
+    if uid is not None and principal.id != uid:
+        raise HTTPException(status_code=401, detail="User not found")
+    return principal
+
+
+def get_current_principal(token: dict = Depends(utils.get_current_user)) -> Principal:
+    return resolve(token)
+
+
+# --- INVALIDATION ---
+def invalidate(username=None):
+    """Forget one cached principal, or all of them."""
+    if username is None:
+        _cache.clear()
+    else:
+        _cache.pop(username)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    # Role changes, renames and deletions all go through here
+    invalidate(target.username)
+    history = inspect(target).attrs.username.history
+    for old in history.deleted or ():
+        invalidate(old)
+
+
+def stats():
+    s = _cache.stats()
+    lookups = s["hits"] + s["misses"]
+    return {
+        "enabled": PRINCIPAL_CACHE_TTL > 0,
+        "ttl": PRINCIPAL_CACHE_TTL,
+        "items": s["items"],
+        "hits": s["hits"],
+        "misses": s["misses"],
+        "hit_rate": round(s["hits"] / lookups, 4) if lookups else 0.0,
+    }
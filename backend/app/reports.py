@@ -0,0 +1,177 @@
+"""
+PDF cephalometric reports per prediction.
+
+Reports are built entirely in memory (cephreport.render_ceph_pdf) on a small
+dedicated worker pool and kept in an LRU of rendered bytes keyed by an ETag
+derived from the prediction id, REPORT_TEMPLATE_VERSION and everything the
+page shows (landmarks, image, patient name). A changed input or template bump
+yields a new ETag, so cached copies never go stale. The page is stamped with
+the prediction's created_at (not the render time), so every render behind one
+ETag is byte-identical. REPORT_PREGENERATE=1 queues completed predictions for
+pre-generation (off by default: it competes with inference for the CPU).
+"""
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from . import database, landmark_codec, measurements, metrics, models, workers
+from .lru import LRUCache
+
+# --- REPORT CONFIG ---
+REPORT_TEMPLATE_VERSION = "2"  # bump when the page layout changes
+REPORT_CACHE_ITEMS = int(os.getenv("REPORT_CACHE_ITEMS", "256"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "1"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "32"))
+REPORT_PER_USER_LIMIT = int(os.getenv("REPORT_PER_USER_LIMIT", "4"))
+REPORT_RETRY_AFTER = int(os.getenv("REPORT_RETRY_AFTER", "2"))
+REPORT_PREGENERATE = os.getenv("REPORT_PREGENERATE", "0") == "1"
+REPORT_IMAGE_MAX_SIDE = int(os.getenv("REPORT_IMAGE_MAX_SIDE", "1600"))  # px; page shows ~half an A4
+
+PREGENERATE_KEY = "_pregenerate"  # one fair-queue slot shared by all pre-generation
+
+_rendered = LRUCache(max_items=REPORT_CACHE_ITEMS, max_bytes=REPORT_CACHE_MAX_BYTES)
+_pending = {}  # prediction id -> Future of (etag, pdf bytes)
+_lock = threading.Lock()
+_pool = None
+
+
+class ReportUnavailable(Exception):
+    """The prediction cannot have a report (missing, or no landmarks yet)."""
+
+
+def get_pool():
+    """Return the report worker pool (singleton), separate from inference."""
+    global _pool
+    if _pool is None:
+        _pool = workers.FairWorkerPool(
+            max_workers=REPORT_WORKERS,
+            max_queue=REPORT_QUEUE_SIZE,
+            per_user_limit=REPORT_PER_USER_LIMIT,
+            name="report",
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+# --- KEYS ---
+def etag_for(pred, patient):
+    """Strong ETag for the report of `pred`; cheap, no rendering involved."""
+    h = hashlib.sha256()
+    h.update(f"{REPORT_TEMPLATE_VERSION}\0{pred.id}\0{pred.upload_path}\0{pred.image_path}\0".encode())
+    h.update(f"{patient.name if patient else ''}\0".encode())
+    h.update(landmark_codec.fingerprint(pred).encode())
+    return f'"r{REPORT_TEMPLATE_VERSION}-{pred.id}-{h.hexdigest()[:20]}"'
+
+
+def cached(etag):
+    return _rendered.get(etag)
+
+
+# --- RENDERING ---
+def _report_image(pred):
+    """Upload (or overlay) as RGB, scaled down to REPORT_IMAGE_MAX_SIDE."""
+    for path in (pred.upload_path, pred.image_path):
+        if path and os.path.exists(path):
+            img = Image.open(path)
+            img.draft("RGB", (REPORT_IMAGE_MAX_SIDE, REPORT_IMAGE_MAX_SIDE))  # JPEG: decode at reduced scale
+            img = img.convert("RGB")
+            img.thumbnail((REPORT_IMAGE_MAX_SIDE, REPORT_IMAGE_MAX_SIDE))
+            return img
+    w, h = measurements.DEFAULT_IMAGE_SIZE
+    scale = min(1.0, REPORT_IMAGE_MAX_SIDE / max(w, h))
+    return Image.new("RGB", (int(w * scale), int(h * scale)), (40, 40, 40))
+
+
+def render(pred, patient):
+    """PDF bytes for one prediction (runs on a worker thread)."""
+    from . import cephreport  # reportlab is only needed here
+
+    landmarks = pred.landmarks
+    if not landmarks:
+        raise ReportUnavailable(f"Prediction is {pred.status}; no landmarks yet")
+    image = _report_image(pred)
+    w, h = image.size
+    # normalized (x, y) -> cephreport's {idx: (row, col)} in report-image pixels
+    xy = np.array([(lm["x"], lm["y"]) for lm in landmarks], dtype=np.float64)
+    points = {i: (y * h, x * w) for i, (x, y) in enumerate(xy.tolist())}
+    summary = measurements.for_prediction(pred)
+    return cephreport.render_ceph_pdf(
+        image,
+        points,
+        summary["angles"],
+        summary["interpretations"],
+        patient_name=patient.name if patient else None,
+        patient_id=pred.patient_id,
+        notes=f"Prediction {pred.id} ({pred.model_name})",
+        image_format="JPEG",
+        generated_at=pred.created_at,
+    )
+
+
+def build(pred_id):
+    """Pool job: load, render and cache one report; returns (etag, bytes)."""
+    db = database.SessionLocal()
+    try:
+        pred = db.get(models.Prediction, pred_id)
+        if pred is None:
+            raise ReportUnavailable("Prediction not found")
+        patient = db.get(models.Patient, pred.patient_id)
+        etag = etag_for(pred, patient)
+        content = _rendered.get(etag)
+        if content is None:
+            with metrics.stage("report_render"):
+                content = render(pred, patient)
+            _rendered.put(etag, content)
+            print(f"📄 Report for prediction {pred_id} rendered ({len(content) // 1024} KB)")
+        return etag, content
+    finally:
+        db.close()
+
+
+def schedule(pred_id, user_key):
+    """Future of (etag, bytes) for this prediction's report.
+
+    Joins an in-flight build when there is one. Raises workers.PoolSaturated
+    when the report pool cannot take the job.
+    """
+    with _lock:
+        future = _pending.get(pred_id)
+        if future is not None:
+            return future
+        future = get_pool().submit(user_key, build, pred_id)
+        _pending[pred_id] = future
+
+    def _done(f, pred_id=pred_id):
+        with _lock:
+            if _pending.get(pred_id) is f:
+                del _pending[pred_id]
+
+    future.add_done_callback(_done)
+    return future
+
+
+def pregenerate(pred_id):
+    """Best effort: queue a report for a freshly completed prediction."""
+    if not REPORT_PREGENERATE:
+        return None
+    try:
+        return schedule(pred_id, PREGENERATE_KEY)
+    except workers.PoolSaturated:
+        return None  # rendered on first download instead
+
+
+def cache_stats():
+    with _lock:
+        in_flight = len(_pending)
+    return {**_rendered.stats(), "in_flight": in_flight, "template_version": REPORT_TEMPLATE_VERSION}
@@ -0,0 +1,111 @@
+from pydantic import BaseModel
+from typing import Optional, List, Dict
+from datetime import datetime
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+class TokenData(BaseModel):
+    username: Optional[str] = None
+    role: Optional[str] = None
+
+class UserCreate(BaseModel):
+    username: str
+    password: str
+    role: Optional[str] = "doctor"
+
+class UserOut(BaseModel):
+    id: int
+    username: str
+    role: str
+    class Config:
+        orm_mode = True
+
+class PatientCreate(BaseModel):
+    name: str
+    dob: Optional[str] = None
+    notes: Optional[str] = None
+
+class PatientOut(BaseModel):
+    id: int
+    name: str
+    dob: Optional[str]
+    notes: Optional[str]
+    created_at: datetime
+    class Config:
+        orm_mode = True
+class PatientListItem(BaseModel):
+    # Every field but id is optional so `?fields=` can select a subset
+    id: int
+    name: Optional[str] = None
+    dob: Optional[str] = None
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class LandmarkOut(BaseModel):
+    name: str
+    x: float
+    y: float
+
+class PredictionOut(BaseModel):
+    id: int
+    patient_id: int
+    model_name: str
+    model_version: Optional[str] = "v1.0"   # ✅ default so not required
+    created_at: datetime
+    status: str = "completed"               # ✅ default
+    processing_time: Optional[float] = None # ✅ default
+    num_landmarks: int                      # required but can be calculated
+    output_image: Optional[str] = None      # None until the overlay is rendered
+    excel_file: Optional[str] = None        # None until the job completes
+    landmarks: List[LandmarkOut]
+
+    class Config:
+        from_attributes = True
+
+class PredictionStatus(BaseModel):
+    id: int
+    patient_id: int
+    status: str
+    num_landmarks: int = 0
+    processing_time: Optional[float] = None
+    output_image: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PredictionListItem(BaseModel):
+    id: int
+    patient_id: Optional[int] = None
+    model_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    status: Optional[str] = None
+    processing_time: Optional[float] = None
+    error: Optional[str] = None
+    num_landmarks: Optional[int] = None
+    output_image: Optional[str] = None
+    thumbnail_url: Optional[str] = None            # small WebP/JPEG for list views
+    excel_file: Optional[str] = None
+    landmarks: Optional[List[LandmarkOut]] = None  # only when requested via fields
+
+
+class ReportExportCreate(BaseModel):
+    format: str = "zip"                      # zip | pdf (one multi-page document)
+    patient_ids: Optional[List[int]] = None  # default: every patient you own
+    since: Optional[datetime] = None         # prediction created_at bounds
+    until: Optional[datetime] = None
+
+
+class ReportExportOut(BaseModel):
+    id: int
+    format: str
+    status: str
+    total: int
+    rendered: int
+    failed: int
+    progress: float
+    size_bytes: Optional[int] = None
+    download_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,78 @@
+"""
+Streaming upload ingestion.
+
+Uploads are copied to disk in fixed-size chunks while their sha256 is computed
+and their size checked against UPLOAD_MAX_BYTES, so no stage ever needs the
+whole radiograph as one resident `bytes` object. Downstream code opens the
+saved file by path; Pillow memory-maps uncompressed formats (BMP, raw TIFF)
+when given a filename. Files land in the content-addressed artifact store
+(artifacts.py), named by that sha256.
+"""
+
+import hashlib
+import os
+
+# --- UPLOAD CONFIG ---
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(64 * 1024 * 1024)))
+# Whole request bodies (batch uploads carry many files)
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(1024 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit):
+        super().__init__(f"Upload exceeds the {limit / (1024 * 1024):.1f} MB limit")
+        self.limit = limit
+
+
+def safe_name(filename, default="upload"):
+    """Client file name without any directory components."""
+    return os.path.basename((filename or "").replace("\\", "/")) or default
+
+
+def copy_stream(src, path, max_bytes=UPLOAD_MAX_BYTES):
+    """Copy a readable binary stream to `path` in chunks; return (size, sha256 hex).
+
+    The partial file is removed if the stream is larger than `max_bytes`.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as dst:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                dst.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return size, digest.hexdigest()
+
+
+def store_stream(src, name, max_bytes=UPLOAD_MAX_BYTES):
+    """Copy a stream into the artifact store; return (path, sha256 hex).
+
+    Identical content is stored once, so re-uploading a radiograph (or two
+    patients' files sharing a name) never overwrites anything.
+    """
+    from . import artifacts
+
+    name = safe_name(name)
+    tmp = artifacts.temp_path()
+    _, digest = copy_stream(src, tmp, max_bytes)
+    return artifacts.commit(tmp, digest, os.path.splitext(name)[1], "upload", name), digest
+
+
+def store_upload(upload, max_bytes=UPLOAD_MAX_BYTES):
+    """Blocking: stream a FastAPI UploadFile into the artifact store (via asyncio.to_thread)."""
+    upload.file.seek(0)
+    return store_stream(upload.file, upload.filename, max_bytes)
@@ -0,0 +1,163 @@
+"""
+Bounded, per-user fair worker pool for the CPU-bound prediction pipeline.
+
+Work is queued per user and worker threads pick users round-robin, so one
+doctor's bulk upload cannot starve everyone else. Admission is bounded: a
+full pool raises PoolSaturated (HTTP 503) and a user over their in-flight
+limit raises it with HTTP 429, both carrying a Retry-After hint.
+
+Pool threads block on the micro-batcher while their image is in the model,
+so at most INFERENCE_WORKERS images can be waiting for one forward pass: the
+pool size caps the batch size. It defaults to BATCH_MAX_SIZE; setting it
+lower trades batch efficiency for fewer concurrent decodes.
+"""
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from . import batching
+
+# --- POOL CONFIG ---
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(batching.BATCH_MAX_SIZE)))  # caps batch size
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "64"))
+INFERENCE_PER_USER_LIMIT = int(os.getenv("INFERENCE_PER_USER_LIMIT", "8"))
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "5"))
+
+_pool = None
+
+
+class PoolSaturated(Exception):
+    """Raised when a job cannot be admitted; maps directly to an HTTP error."""
+
+    def __init__(self, status_code, detail, retry_after=INFERENCE_RETRY_AFTER):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class FairWorkerPool:
+    def __init__(self, max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_QUEUE_SIZE,
+                 per_user_limit=INFERENCE_PER_USER_LIMIT, name="inference"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+
+        self._queues = OrderedDict()  # user_key -> deque of (future, fn, args, kwargs)
+        self._in_flight = {}          # user_key -> queued + running jobs
+        self._queued = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, user_key, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` on behalf of `user_key`; return a Future."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise PoolSaturated(503, "Inference pool is shutting down")
+            if self._queued >= self.max_queue:
+                raise PoolSaturated(503, "Inference queue is full, please retry shortly")
+            if self._in_flight.get(user_key, 0) >= self.per_user_limit:
+                raise PoolSaturated(429, "Too many predictions in progress for this user")
+
+            self._queues.setdefault(user_key, deque()).append((future, fn, args, kwargs))
+            self._in_flight[user_key] = self._in_flight.get(user_key, 0) + 1
+            self._queued += 1
+            self._cond.notify()
+        return future
+
+    async def run(self, user_key, fn, *args, **kwargs):
+        """Await `fn` on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(user_key, fn, *args, **kwargs))
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queue": self.max_queue,
+                "users": len(self._in_flight),
+            }
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    # --- workers ---
+    def _next_job(self):
+        with self._cond:
+            while not self._queued and not self._closed:
+                self._cond.wait()
+            if not self._queued:
+                return None
+
+            # Round-robin: take the head job of the first user, then move
+            # that user to the back of the line.
+            user_key, jobs = next(iter(self._queues.items()))
+            job = jobs.popleft()
+            if jobs:
+                self._queues.move_to_end(user_key)
+            else:
+                del self._queues[user_key]
+            self._queued -= 1
+            self._running += 1
+            return user_key, job
+
+    def _finish(self, user_key):
+        with self._cond:
+            self._running -= 1
+            self._in_flight[user_key] -= 1
+            if not self._in_flight[user_key]:
+                del self._in_flight[user_key]
+
+    def _work(self):
+        while True:
+            picked = self._next_job()
+            if picked is None:
+                return
+            user_key, (future, fn, args, kwargs) = picked
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                self._finish(user_key)
+
+
+def get_pool():
+    """Return the shared inference worker pool (singleton)."""
+    global _pool
+    if _pool is None:
+        _pool = FairWorkerPool()
+        if INFERENCE_WORKERS < batching.BATCH_MAX_SIZE:
+            print(f"⚠️ INFERENCE_WORKERS={INFERENCE_WORKERS} < BATCH_MAX_SIZE={batching.BATCH_MAX_SIZE}: "
+                  f"micro-batches cannot exceed {INFERENCE_WORKERS} images")
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
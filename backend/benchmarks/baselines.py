@@ -0,0 +1,137 @@
+"""
+Saved benchmark baselines and regression checks.
+
+Each suite writes its results as {case: {metric: value}} to
+benchmarks/baselines/<suite>.json with --save-baseline, together with the
+machine it ran on. --check compares a fresh run against that file and exits
+non-zero when a metric is worse by more than the tolerance: latencies and
+memory (*_ms, *_mb) must not grow, throughput (*_per_s) must not shrink.
+Baselines are only meaningful on the machine (and stand-in model) that made
+them; a different machine prints a warning instead of failing.
+"""
+
+import json
+import os
+import platform
+import time
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+DEFAULT_TOLERANCE = 0.25  # 25%: CPU benchmarks on shared machines are noisy
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a non-empty sample list (q in 0..100)."""
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize_ms(seconds):
+    """Latency summary of per-call timings given in seconds."""
+    return {
+        "min_ms": round(1000 * min(seconds), 3),
+        "p50_ms": round(1000 * percentile(seconds, 50), 3),
+        "p95_ms": round(1000 * percentile(seconds, 95), 3),
+        "p99_ms": round(1000 * percentile(seconds, 99), 3),
+    }
+
+
+def reset_peak_rss():
+    """Reset VmHWM (Linux >= 4.0) so the peak covers only the measured work."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb(pid="self"):
+    """Peak resident set size of a process in MB (VmHWM, else ru_maxrss for ourselves)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _path(suite):
+    return os.path.join(BASELINE_DIR, f"{suite}.json")
+
+
+def save(suite, results, params=None):
+    """Write `results` as the suite's baseline; cases already saved on this machine are kept."""
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    merged = {}
+    try:
+        with open(_path(suite)) as f:
+            previous = json.load(f)
+        if previous.get("machine") == machine():
+            merged = previous["results"]
+    except FileNotFoundError:
+        pass
+    merged.update(results)
+    with open(_path(suite), "w") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "machine": machine(),
+            "params": params or {},
+            "results": merged,
+        }, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"💾 Baseline saved to {_path(suite)}")
+
+
+def _worse(metric, old, new, tolerance):
+    if metric.endswith("_per_s"):
+        return new < old * (1 - tolerance)
+    if metric.endswith(("_ms", "_mb")):
+        return new > old * (1 + tolerance)
+    return False  # counts and labels are informational
+
+
+def check(suite, results, params=None, tolerance=DEFAULT_TOLERANCE):
+    """Print a comparison with the saved baseline; returns the number of regressions."""
+    try:
+        with open(_path(suite)) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"⚠️ No baseline for {suite!r}; run with --save-baseline first")
+        return 0
+    if baseline.get("machine") != machine():
+        print(f"⚠️ Baseline was recorded on {baseline.get('machine')}; comparison is indicative only")
+    if params is not None and baseline.get("params") != params:
+        print(f"⚠️ Baseline parameters differ: {baseline.get('params')} vs {params}")
+
+    regressions = 0
+    for case, metrics in results.items():
+        old_metrics = baseline["results"].get(case)
+        if old_metrics is None:
+            print(f"   {case}: new case, no baseline")
+            continue
+        for metric, new in metrics.items():
+            old = old_metrics.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            change = (new - old) / old
+            worse = _worse(metric, old, new, tolerance)
+            regressions += worse
+            if worse or abs(change) > tolerance:
+                print(f"{'❌' if worse else '✅'} {case}.{metric}: {old} -> {new} ({change:+.0%})")
+    if baseline.get("machine") != machine():
+        return 0
+    print(f"{'❌' if regressions else '✅'} {regressions} regression(s) beyond {tolerance:.0%} against {suite} baseline")
+    return regressions
@@ -0,0 +1,225 @@
+"""
+Listing / insert latency at 100k predictions, before and after the DB tuning.
+
+Usage (from backend/):
+    python -m benchmarks.bench_db [--predictions 100000] [--patients 2000] [--repeat 20]
+
+Variants (each in its own subprocess and its own temporary SQLite file):
+ - legacy : rollback journal, synchronous=FULL, default cache, no listing indexes,
+            full-row listing queries (what the endpoints used to run)
+ - tuned  : migrations applied (listing indexes), WAL + synchronous=NORMAL pragmas,
+            keyset-paginated summary listings from listings.py
+
+One "heavy" patient owns 10% of all predictions, so listing cost at a large
+history is visible. Mixed load runs 4 writer and 4 reader threads concurrently
+and reports reader latency while /predict-style inserts are committing.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+VARIANTS = {
+    "legacy": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "SQLITE_MMAP_SIZE": "0",
+    },
+    "tuned": {},
+}
+N_LANDMARKS = 19
+N_OWNERS = 20
+PAGE = 50
+
+
+def _result(rng):
+    return [{"name": f"P{i + 1}", "x": rng.random(), "y": rng.random()} for i in range(N_LANDMARKS)]
+
+
+def _ms(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+    return round(1000 * statistics.median(samples), 3), round(1000 * p95, 3)
+
+
+def _timed(fn, repeat):
+    fn()  # warm
+    out = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - start)
+    return _ms(out)
+
+
+def seed(n_predictions, n_patients):
+    from app import database, models
+
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    with database.engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"id": i + 1, "username": f"doc{i}", "hashed_password": "x", "role": "doctor", "created_at": now}
+            for i in range(N_OWNERS)
+        ])
+        conn.execute(models.Patient.__table__.insert(), [
+            {"id": i + 1, "name": f"Patient {i}", "owner_id": i % N_OWNERS + 1, "created_at": now}
+            for i in range(n_patients)
+        ])
+    heavy = n_predictions // 10
+    batch = []
+    for i in range(n_predictions):
+        patient_id = 1 if i < heavy else rng.randint(2, n_patients)
+        batch.append({
+            "patient_id": patient_id, "model_name": "ceph_landmark_model", "result": _result(rng),
+            "image_path": f"outputs/ceph_{patient_id}_{i:08x}_predicted.jpg", "status": "completed",
+            "processing_time": 0.1, "created_at": now,
+        })
+        if len(batch) == 5000:
+            with database.engine.begin() as conn:
+                conn.execute(models.Prediction.__table__.insert(), batch)
+            batch = []
+    if batch:
+        with database.engine.begin() as conn:
+            conn.execute(models.Prediction.__table__.insert(), batch)
+
+
+def run_variant(variant, n_predictions, n_patients, repeat):
+    from app import database, listings, migrations, models, principals
+
+    tuned = variant == "tuned"
+    migrations.upgrade()
+    if not tuned:
+        with database.engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_patients_owner_id_id")
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_predictions_patient_id_id")
+
+    start = time.perf_counter()
+    seed(n_predictions, n_patients)
+    seed_s = time.perf_counter() - start
+    if tuned:
+        with database.engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+    owner = principals.Principal(1, "doc0", "doctor")
+    rng = random.Random(1)
+
+    def list_heavy():
+        db = database.SessionLocal()
+        try:
+            if tuned:
+                return listings.predictions_page(db, 1, limit=PAGE)
+            return db.query(models.Prediction).filter(models.Prediction.patient_id == 1).all()
+        finally:
+            db.close()
+
+    def list_typical():
+        db = database.SessionLocal()
+        try:
+            pid = rng.randint(2, n_patients)
+            if tuned:
+                return listings.predictions_page(db, pid, limit=PAGE)
+            return db.query(models.Prediction).filter(models.Prediction.patient_id == pid).all()
+        finally:
+            db.close()
+
+    def list_patients():
+        db = database.SessionLocal()
+        try:
+            if tuned:
+                return listings.patients_page(db, owner, limit=PAGE)
+            return db.query(models.Patient).filter(models.Patient.owner_id == owner.id).all()
+        finally:
+            db.close()
+
+    def insert_one():
+        db = database.SessionLocal()
+        try:
+            db.add(models.Prediction(patient_id=rng.randint(1, n_patients), result=_result(rng), status="completed"))
+            db.commit()
+        finally:
+            db.close()
+
+    report = {
+        "variant": variant,
+        "seed_s": round(seed_s, 1),
+        "list_heavy": _timed(list_heavy, repeat),
+        "list_typical": _timed(list_typical, repeat * 5),
+        "list_patients": _timed(list_patients, repeat * 5),
+        "insert": _timed(insert_one, repeat * 5),
+    }
+
+    # Mixed load: readers measured while writers commit
+    stop = threading.Event()
+    reads, errors = [], []
+
+    def writer():
+        while not stop.is_set():
+            try:
+                insert_one()
+            except Exception as e:  # "database is locked" under contention
+                errors.append(type(e).__name__)
+
+    def reader():
+        while not stop.is_set():
+            t = time.perf_counter()
+            try:
+                list_typical()
+                reads.append(time.perf_counter() - t)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    threads = [threading.Thread(target=writer) for _ in range(4)] + [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(3)
+    stop.set()
+    for t in threads:
+        t.join()
+    report["mixed_read"] = _ms(reads) if reads else (None, None)
+    report["mixed_reads_per_s"] = round(len(reads) / 3, 1)
+    report["mixed_errors"] = len(errors)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--predictions", type=int, default=100_000)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--variant", choices=list(VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.predictions, args.patients, args.repeat)))
+        return
+
+    print(f"{args.predictions} predictions over {args.patients} patients; heavy patient has {args.predictions // 10}")
+    print("latencies are median / p95 in ms")
+    cols = ["list_heavy", "list_typical", "list_patients", "insert", "mixed_read"]
+    print(f"{'variant':<8}{'seed s':>8}" + "".join(f"{c:>20}" for c in cols) + f"{'reads/s':>9}{'errors':>8}")
+    for variant, env in VARIANTS.items():
+        with tempfile.TemporaryDirectory(prefix="bench_db_") as tmp:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_db", "--variant", variant,
+                 "--predictions", str(args.predictions), "--patients", str(args.patients),
+                 "--repeat", str(args.repeat)],
+                capture_output=True, text=True, check=True,
+                env={**os.environ, **env, "DATABASE_URL": f"sqlite:///{tmp}/bench.db"},
+            )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        cells = "".join(f"{f'{r[c][0]} / {r[c][1]}':>20}" for c in cols)
+        print(f"{r['variant']:<8}{r['seed_s']:>8}{cells}{r['mixed_reads_per_s']:>9}{r['mixed_errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
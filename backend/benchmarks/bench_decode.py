@@ -0,0 +1,157 @@
+"""
+Before/after measurement for the decode-once, float32 image pipeline.
+
+Usage (from backend/):
+    python -m benchmarks.bench_decode [--width 3000] [--height 2400] [--repeat 5]
+
+Variants:
+ - legacy      : decode twice (grayscale for the model, RGB for the overlay), float64 input
+ - current     : ml_inference.decode_image once, shared by preprocess_image and save_predicted_image
+ - legacy-input: model input only, full decode + float64
+ - draft-input : model input only, JPEG draft-mode decode + float32
+Each variant runs in its own subprocess so peak RSS figures do not leak into each other.
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+VARIANTS = ["legacy", "current", "legacy-input", "draft-input"]
+N_LANDMARKS = 19
+
+
+def make_cephalogram(width, height, seed=0):
+    """Synthetic grayscale JPEG with radiograph-like low-frequency structure."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 128 + 60 * np.sin(xx / 97.0) * np.cos(yy / 131.0)
+    noise = rng.normal(0, 12, size=(height, width)).astype(np.float32)
+    arr = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr, mode="L").save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _landmarks():
+    rng = np.random.default_rng(1)
+    return [{"name": f"P{i + 1}", "x": float(x), "y": float(y)}
+            for i, (x, y) in enumerate(rng.random((N_LANDMARKS, 2)))]
+
+
+def _legacy_preprocess(image_bytes):
+    img = Image.open(io.BytesIO(image_bytes)).convert("L")
+    img = img.resize((256, 256))
+    return np.expand_dims(np.array(img) / 255.0, axis=(0, -1))
+
+
+def _legacy_render(image_bytes, landmarks, output_path):
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    w, h = img.size
+    draw = ImageDraw.Draw(img)
+    for lm in landmarks:
+        x, y = int(lm["x"] * w), int(lm["y"] * h)
+        draw.ellipse((x - 4, y - 4, x + 4, y + 4), fill="red", outline="white", width=1)
+        draw.text((x + 6, y - 6), lm["name"], fill="yellow")
+    img.save(output_path)
+
+
+def _reset_peak_rss():
+    """Reset VmHWM (Linux >= 4.0) so the peak covers only the measured work."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_variant(variant, image_bytes, repeat):
+    from app import ml_inference
+
+    landmarks = _landmarks()
+    out_dir = tempfile.mkdtemp(prefix="bench_decode_")
+    out_path = os.path.join(out_dir, "overlay.jpg")
+
+    def once(image_bytes=image_bytes):
+        if variant == "legacy":
+            arr = _legacy_preprocess(image_bytes)
+            _legacy_render(image_bytes, landmarks, out_path)
+        elif variant == "current":
+            img = ml_inference.decode_image(image_bytes)
+            arr = ml_inference.preprocess_image(img)
+            ml_inference.save_predicted_image(img, landmarks, out_path)
+        elif variant == "legacy-input":
+            arr = _legacy_preprocess(image_bytes)
+        else:
+            arr = ml_inference.preprocess_image(image_bytes)
+        return arr
+
+    # Warm lazy imports/plugins on a tiny image so the full-size decode is
+    # still the first one counted against peak RSS.
+    once(make_cephalogram(64, 64))
+    _reset_peak_rss()
+    rss_before = _peak_rss_mb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        arr = once()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "variant": variant,
+        "dtype": str(arr.dtype),
+        "input_bytes": int(arr.nbytes),
+        "mean_ms": round(1000 * sum(timings) / len(timings), 2),
+        "min_ms": round(1000 * min(timings), 2),
+        "peak_rss_delta_mb": round(_peak_rss_mb() - rss_before, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2400)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    image_bytes = make_cephalogram(args.width, args.height)
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, image_bytes, args.repeat)))
+        return
+
+    print(f"Synthetic cephalogram: {args.width}x{args.height} JPEG, {len(image_bytes) / 1024:.0f} KiB")
+    print(f"{'variant':<14}{'dtype':<10}{'mean ms':>10}{'min ms':>10}{'peak RSS +MB':>14}")
+    for variant in VARIANTS:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_decode", "--variant", variant,
+             "--width", str(args.width), "--height", str(args.height), "--repeat", str(args.repeat)],
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{r['variant']:<14}{r['dtype']:<10}{r['mean_ms']:>10}{r['min_ms']:>10}{r['peak_rss_delta_mb']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Heatmap thumbnail grid: per-channel matplotlib figures vs one vectorized LUT pass.
+
+Usage (from backend/):
+    python -m benchmarks.bench_heatmaps [--channels 19] [--size 256] [--repeat 5]
+
+Variants:
+ - legacy : one matplotlib figure per channel, PNG round trip, PIL resize (previous code)
+ - current: cephreport.heatmap_to_thumbnail_grid (NumPy normalize + resize + LUT + tile)
+Also reports how far apart the two grids are per pixel, as a visual-equivalence check.
+"""
+
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def make_heatmaps(channels, size, seed=0):
+    """Gaussian blobs, one per landmark, like a heatmap-regression head emits."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32)
+    centres = rng.uniform(0.15 * size, 0.85 * size, size=(channels, 2))
+    sigma = size / 20
+    d2 = (xx[None] - centres[:, 0, None, None]) ** 2 + (yy[None] - centres[:, 1, None, None]) ** 2
+    return np.exp(-d2 / (2 * sigma ** 2)).astype(np.float32) + rng.normal(0, 0.01, (channels, size, size)).astype(np.float32)
+
+
+def legacy_grid(heatmaps, ncols=5, thumb_size=(160, 120)):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    heatmaps = np.array(heatmaps)
+    if heatmaps.ndim == 4 and heatmaps.shape[0] == 1:
+        heatmaps = heatmaps[0]
+    C = heatmaps.shape[0]
+    nrows = (C + ncols - 1) // ncols
+    thumbs = []
+    for i in range(C):
+        hm = heatmaps[i]
+        mmin, mmax = hm.min(), hm.max()
+        nm = (hm - mmin) / (mmax - mmin + 1e-9) if mmax > mmin else np.zeros_like(hm)
+        fig = plt.figure(figsize=(thumb_size[0] / 80, thumb_size[1] / 80), dpi=80)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.imshow(nm, cmap="viridis")
+        ax.axis("off")
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight", pad_inches=0)
+        plt.close(fig)
+        buf.seek(0)
+        thumbs.append(Image.open(buf).convert("RGB").resize(thumb_size))
+    while len(thumbs) < nrows * ncols:
+        thumbs.append(Image.new("RGB", thumb_size, color=(240, 240, 240)))
+    grid = Image.new("RGB", (ncols * thumb_size[0], nrows * thumb_size[1]), (255, 255, 255))
+    for idx, t in enumerate(thumbs):
+        grid.paste(t, ((idx % ncols) * thumb_size[0], (idx // ncols) * thumb_size[1]))
+    return grid
+
+
+def _best_ms(fn, repeat):
+    out = fn()  # warm (imports, LUT)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return 1000 * min(times), 1000 * sorted(times)[len(times) // 2], out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=19)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    from app import cephreport
+
+    heatmaps = make_heatmaps(args.channels, args.size)
+    legacy_min, legacy_med, old = _best_ms(lambda: legacy_grid(heatmaps), args.repeat)
+    cur_min, cur_med, new = _best_ms(lambda: cephreport.heatmap_to_thumbnail_grid(heatmaps), args.repeat)
+
+    a = np.asarray(old, dtype=np.int16)
+    b = np.asarray(new, dtype=np.int16)
+    diff = np.abs(a - b)
+    print(f"{args.channels} heatmaps of {args.size}x{args.size} -> {new.size[0]}x{new.size[1]} grid")
+    print(f"{'variant':<10}{'min ms':>10}{'median ms':>12}")
+    print(f"{'legacy':<10}{legacy_min:>10.1f}{legacy_med:>12.1f}")
+    print(f"{'current':<10}{cur_min:>10.1f}{cur_med:>12.1f}")
+    print(f"speedup {legacy_min / cur_min:.0f}x; sizes equal: {old.size == new.size}; "
+          f"mean |diff| {diff.mean():.2f}/255, 99th pct {np.percentile(diff, 99):.0f}/255")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Size and decode speed of JSON vs packed (float32 blob + schema id) landmarks.
+
+Usage (from backend/):
+    python -m benchmarks.bench_landmarks [--rows 10000] [--landmarks 19] [--repeat 5]
+
+Measured per representation:
+ - bytes per row as stored, and the SQLite file size for all rows
+ - encode (landmark list -> stored value)
+ - decode to the API shape ([{name, x, y}]) per row
+ - bulk decode of every row into an (N, K, 2) array, in memory and from SQLite
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+
+def _landmarks(rng, k):
+    # float32 model outputs, as landmarks_from_output produces them
+    xy = rng.random((k, 2), dtype=np.float32).tolist()
+    return [{"name": f"P{i + 1}", "x": x, "y": y} for i, (x, y) in enumerate(xy)]
+
+
+def _best_ms(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(1000 * min(times), 2), round(1000 * statistics.median(times), 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--landmarks", type=int, default=19)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="bench_landmarks_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/json.db"
+    from sqlalchemy import create_engine, text
+    from app import landmark_codec, migrations
+
+    migrations.upgrade()  # schema registry lives in the main DB
+    rng = np.random.default_rng(0)
+    rows = [_landmarks(rng, args.landmarks) for _ in range(args.rows)]
+    sid = landmark_codec.schema_id([lm["name"] for lm in rows[0]])
+
+    json_values = [json.dumps(r) for r in rows]
+    packed_values = [landmark_codec.pack(r)[1] for r in rows]
+
+    def json_to_array(values):
+        return np.array([[(lm["x"], lm["y"]) for lm in json.loads(v)] for v in values], dtype=np.float32)
+
+    results = {
+        "bytes/row": (
+            round(sum(map(len, json_values)) / args.rows, 1),
+            round(sum(map(len, packed_values)) / args.rows, 1),
+        ),
+        "encode ms": (
+            _best_ms(lambda: [json.dumps(r) for r in rows], args.repeat)[0],
+            _best_ms(lambda: [landmark_codec.pack(r) for r in rows], args.repeat)[0],
+        ),
+        "decode API ms": (
+            _best_ms(lambda: [json.loads(v) for v in json_values], args.repeat)[0],
+            _best_ms(lambda: [landmark_codec.to_landmarks(sid, b) for b in packed_values], args.repeat)[0],
+        ),
+        "bulk array ms": (
+            _best_ms(lambda: json_to_array(json_values), args.repeat)[0],
+            _best_ms(lambda: landmark_codec.decode_many(packed_values), args.repeat)[0],
+        ),
+    }
+
+    # Same rows stored in SQLite, read back as one bulk (N, K, 2) array
+    sizes, db_ms = [], []
+    for name, column, values in (("json", "TEXT", json_values), ("packed", "BLOB", packed_values)):
+        path = f"{tmp}/{name}_only.db"
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE TABLE t (id INTEGER PRIMARY KEY, v {column})"))
+            conn.execute(text("INSERT INTO t (v) VALUES (:v)"), [{"v": v} for v in values])
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        sizes.append(round(os.path.getsize(path) / 1024 / 1024, 2))
+
+        def load(conn_engine=engine, name=name):
+            with conn_engine.connect() as conn:
+                fetched = [r[0] for r in conn.execute(text("SELECT v FROM t ORDER BY id"))]
+            return json_to_array(fetched) if name == "json" else landmark_codec.decode_many(fetched)
+
+        db_ms.append(_best_ms(load, args.repeat)[0])
+        engine.dispose()
+    results["SQLite file MB"] = tuple(sizes)
+    results["SQLite bulk ms"] = tuple(db_ms)
+
+    check = np.abs(json_to_array(json_values) - landmark_codec.decode_many(packed_values)).max()
+    print(f"{args.rows} rows x {args.landmarks} landmarks (max |json - packed| = {check:g})")
+    print(f"{'':<18}{'json':>12}{'packed':>12}{'ratio':>9}")
+    for label, (a, b) in results.items():
+        print(f"{label:<18}{a:>12}{b:>12}{(a / b if b else float('inf')):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
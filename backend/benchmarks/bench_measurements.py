@@ -0,0 +1,128 @@
+"""
+Cephalometric measurement engine over 10k predictions.
+
+Usage (from backend/):
+    python -m benchmarks.bench_measurements [--predictions 10000] [--repeat 5]
+
+Variants:
+ - python loop : per-prediction math-module implementation (the obvious way)
+ - numpy loop  : measurements.compute called once per prediction
+ - numpy batch : measurements.compute over the whole (N, 19, 2) stack
+ - end-to-end  : patient series from SQLite (packed blobs -> arrays -> rows)
+The python loop is also the reference the vectorized values are checked against.
+"""
+
+import argparse
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Typical ISBI-layout positions in a 1935x2400 image (x anterior, y down)
+TEMPLATE = {
+    "S": (780, 1000), "N": (1400, 930), "Or": (1280, 1150), "Po": (620, 1180), "A": (1420, 1480),
+    "B": (1380, 1850), "Pog": (1390, 1990), "Me": (1320, 2060), "Gn": (1370, 2040), "Go": (760, 1800),
+    "L1": (1450, 1640), "U1": (1470, 1650), "UL": (1560, 1560), "LL": (1540, 1760), "Sn": (1540, 1430),
+    "PogS": (1500, 2000), "PNS": (920, 1420), "ANS": (1480, 1400), "Ar": (700, 1330),
+}
+SIZE = (1935, 2400)
+CHECKED = ["SNA", "SNB", "ANB", "FMA", "Gonial angle", "N-Me"]
+
+
+def synthetic(n, seed=0):
+    from app import measurements
+
+    rng = np.random.default_rng(seed)
+    base = np.array([TEMPLATE[r] for r in measurements.ISBI_ROLES], dtype=np.float64)
+    jitter = rng.normal(0, 25, size=(n, len(base), 2))
+    return ((base + jitter) / SIZE).astype(np.float32)
+
+
+def _python_reference(points, spacing):
+    """Plain-Python SNA/SNB/ANB/FMA/gonial/N-Me for one prediction."""
+    p = {r: (x * SIZE[0] * spacing, y * SIZE[1] * spacing) for r, (x, y) in points.items()}
+
+    def angle(u, v):
+        dot = u[0] * v[0] + u[1] * v[1]
+        cos = dot / (math.hypot(*u) * math.hypot(*v))
+        return math.degrees(math.acos(max(-1.0, min(1.0, cos))))
+
+    def vec(a, b):
+        return (p[b][0] - p[a][0], p[b][1] - p[a][1])
+
+    sna = angle(vec("N", "S"), vec("N", "A"))
+    snb = angle(vec("N", "S"), vec("N", "B"))
+    return {
+        "SNA": sna, "SNB": snb, "ANB": sna - snb,
+        "FMA": angle(vec("Po", "Or"), vec("Go", "Me")),
+        "Gonial angle": angle(vec("Go", "Ar"), vec("Go", "Me")),
+        "N-Me": math.hypot(*vec("N", "Me")),
+    }
+
+
+def _best(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return 1000 * min(times), out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--predictions", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="bench_measurements_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    from app import database, landmark_codec, measurements, migrations, models
+
+    coords = synthetic(args.predictions)
+    names = [f"P{i + 1}" for i in range(coords.shape[1])]
+    spacing = measurements.PIXEL_SPACING_MM
+    n = len(coords)
+
+    rows = [dict(zip(measurements.ISBI_ROLES, map(tuple, c.tolist()))) for c in coords]
+    py_ms, ref = _best(lambda: [_python_reference(r, spacing) for r in rows], max(1, args.repeat // 2))
+    loop_ms, _ = _best(lambda: [measurements.compute(coords[i:i + 1], names, SIZE) for i in range(n)],
+                       max(1, args.repeat // 2))
+    batch_ms, values = _best(lambda: measurements.compute(coords, names, SIZE), args.repeat)
+
+    dev = max(
+        float(np.max(np.abs(values[m] - np.array([r[m] for r in ref])))) for m in CHECKED
+    )
+
+    # End to end: one patient with n packed predictions in SQLite
+    migrations.upgrade()
+    with database.engine.begin() as conn:
+        conn.execute(models.Patient.__table__.insert().values(id=1, name="bench"))
+        sid = landmark_codec.schema_id(names, conn)
+        conn.execute(models.Prediction.__table__.insert(), [
+            {"patient_id": 1, "landmark_schema_id": sid, "landmarks_packed": c.tobytes(), "status": "completed"}
+            for c in coords
+        ])
+
+    def end_to_end():
+        with database.engine.connect() as conn:
+            fetched = conn.execute(measurements.series_query(1)).all()
+        return measurements.series_from_rows(fetched)
+
+    e2e_ms, series = _best(end_to_end, args.repeat)
+
+    print(f"{n} predictions x {len(measurements.MEASUREMENTS)} measurements "
+          f"(max |numpy - python| over {', '.join(CHECKED)} = {dev:.2e})")
+    print(f"{'variant':<14}{'total ms':>12}{'us / prediction':>18}")
+    for label, ms in (("python loop", py_ms), ("numpy loop", loop_ms), ("numpy batch", batch_ms),
+                      ("end-to-end", e2e_ms)):
+        print(f"{label:<14}{ms:>12.1f}{1000 * ms / n:>18.2f}")
+    print(f"numpy batch is {py_ms / batch_ms:.0f}x the python loop (which computes only {len(CHECKED)} values); "
+          f"end-to-end returned {len(series)} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Microbenchmarks of the prediction pipeline against the stand-in model.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pipeline [--sizes isbi,large] [--repeat 20]
+                                        [--save-baseline | --check [--tolerance 0.25]]
+
+Cases (per image size where it matters):
+ - preprocess_image      : JPEG bytes -> float32 (1, 256, 256, 1) model input
+ - predict_from_bytes    : preprocess + batched forward pass, prediction cache off
+ - predict_from_bytes_hit: the same upload again with the prediction cache on
+ - save_predicted_image  : decode + draw 19 landmarks + write the overlay JPEG
+ - generate_ceph_pdf     : one-page report (PNG-embedded legacy path and JPEG path)
+Each case reports min / p50 / p95 / p99 latency and how much it raised peak RSS.
+Runs against a throwaway SQLite database and output directory.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from . import baselines, synthetic
+
+SUITE = "pipeline"
+
+
+def _bench(fn, repeat, warmup=2):
+    with contextlib.redirect_stdout(io.StringIO()):  # the pipeline logs every saved file
+        for _ in range(warmup):
+            fn()
+        baselines.reset_peak_rss()
+        before = baselines.peak_rss_mb()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    return {**baselines.summarize_ms(timings), "peak_rss_delta_mb": round(baselines.peak_rss_mb() - before, 1)}
+
+
+def run(sizes, repeat, workdir):
+    import numpy as np
+    from app import cephreport, measurements, migrations, ml_inference, prediction_cache
+
+    migrations.upgrade()
+    ml_inference.startup()
+    landmarks = synthetic.landmarks()
+    names = [lm["name"] for lm in landmarks]
+    coords = np.array([(lm["x"], lm["y"]) for lm in landmarks])
+    results = {}
+
+    for size in sizes:
+        w, h = synthetic.IMAGE_SIZES[size]
+        upload = synthetic.make_cephalogram(w, h)
+        decoded = ml_inference.decode_image(upload)
+        overlay_path = os.path.join(workdir, f"overlay_{size}.jpg")
+
+        results[f"preprocess_image[{size}]"] = _bench(lambda: ml_inference.preprocess_image(upload), repeat)
+
+        prediction_cache.PREDICTION_CACHE_ENABLED = False
+        results[f"predict_from_bytes[{size}]"] = _bench(lambda: ml_inference.predict_from_bytes(upload), repeat)
+        prediction_cache.PREDICTION_CACHE_ENABLED = True
+        results[f"predict_from_bytes_hit[{size}]"] = _bench(lambda: ml_inference.predict_from_bytes(upload), repeat)
+
+        results[f"save_predicted_image[{size}]"] = _bench(
+            lambda: ml_inference.save_predicted_image(upload, landmarks, overlay_path), repeat
+        )
+
+        summary = measurements.report(coords, names, (w, h))
+        points = {i: (lm["y"] * h, lm["x"] * w) for i, lm in enumerate(landmarks)}
+        rgb = decoded.convert("RGB")  # what reports.render hands over
+        for fmt in ("PNG", "JPEG"):
+            results[f"generate_ceph_pdf[{size},{fmt}]"] = _bench(
+                lambda fmt=fmt: cephreport.generate_ceph_pdf(
+                    rgb, points, summary["angles"], summary["interpretations"], io.BytesIO(),
+                    patient_name="Benchmark", patient_id=1, image_format=fmt,
+                ),
+                max(3, repeat // 4),  # seconds per call on large images with PNG
+                warmup=1,
+            )
+        decoded.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="isbi", help=f"comma-separated from {sorted(synthetic.IMAGE_SIZES)}")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=baselines.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ.setdefault("MODEL_PATH", synthetic.ensure_model())
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["MODEL_PRELOAD"] = "0"
+    cwd = os.getcwd()
+    os.chdir(workdir)  # outputs/ and friends land in the scratch directory
+    try:
+        results = run(sizes, args.repeat, workdir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'case':<42}{'min':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'+RSS MB':>9}")
+    for case, r in results.items():
+        print(f"{case:<42}{r['min_ms']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+              f"{r['peak_rss_delta_mb']:>9.1f}")
+
+    params = {"sizes": sizes, "repeat": args.repeat, "model": os.path.basename(os.environ["MODEL_PATH"])}
+    if args.save_baseline:
+        baselines.save(SUITE, results, params)
+    if args.check and baselines.check(SUITE, results, params, args.tolerance):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
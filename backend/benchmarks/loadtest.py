@@ -0,0 +1,269 @@
+"""
+End-to-end load generator for the prediction API.
+
+Usage (from backend/):
+    python -m benchmarks.loadtest [--requests 200] [--concurrency 8] [--mode sync|jobs]
+                                  [--size isbi] [--cache-hits] [--workers 1] [--model-server]
+                                  [--url http://host:8000]
+                                  [--save-baseline | --check [--tolerance 0.25]]
+
+Without --url a server is started for the run (uvicorn with --workers) against
+a scratch database and working directory, serving the stand-in model from
+benchmarks/synthetic.py; --model-server runs the model in one shared
+app.model_server process instead of in every worker. With --url an already
+running server is targeted (--username/--password of an account that may
+create patients; registered if missing).
+
+Every request uploads a distinct file (a synthetic cephalogram plus a few
+trailing bytes after the JPEG end marker: same decode cost, different
+sha256), so the prediction cache does not short-circuit the model unless
+--cache-hits is given.
+ - sync : POST /predict/{patient}            latency = full request
+ - jobs : POST /predict/{patient}?wait=false latency = upload until /status says completed
+Reports throughput, latency min/p50/p95/p99, status codes, server peak RSS
+(summed over all server processes) and the mean time per pipeline stage from
+/metrics (of whichever worker answers the scrape).
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from . import baselines, synthetic
+
+SUITE = "loadtest"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STAGE_RE = re.compile(r'^ceph_stage_seconds_(sum|count)\{stage="([^"]+)"\} ([0-9.e+-]+)$')
+_PEAK_RE = re.compile(r'^ceph_process_memory_bytes\{kind="peak"\} ([0-9.e+-]+)$')
+
+
+# --- SERVER ---
+def start_server(workdir, port, workers=1, model_server=False):
+    """Run the app under uvicorn in `workdir`; returns ([Popen], url) once /readyz is green."""
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        MODEL_PATH=os.environ.get("MODEL_PATH") or synthetic.ensure_model(),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        TF_CPP_MIN_LOG_LEVEL="3",
+    )
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    procs = []
+    if model_server:
+        env["MODEL_SERVER_SOCKET"] = os.path.join(workdir, "model.sock")
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "app.model_server"], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+        ))
+    procs.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    ))
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        for proc in procs:
+            if proc.poll() is not None:
+                stop_server(procs)
+                raise RuntimeError(f"Server exited with {proc.returncode}; see {log.name}")
+        try:
+            if httpx.get(f"{url}/readyz", timeout=2).status_code == 200:
+                return procs, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    stop_server(procs)
+    raise RuntimeError("Server did not become ready within 180 s")
+
+
+def _tree(pid):
+    """pid and all of its descendants (Linux /proc)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                pids += _tree(int(child))
+    except OSError:
+        pass
+    return pids
+
+
+def peak_rss_mb(procs):
+    """Sum of the peak RSS of every server process (uvicorn workers, model server)."""
+    return sum(baselines.peak_rss_mb(pid) for proc in procs for pid in _tree(proc.pid))
+
+
+def stop_server(procs):
+    for proc in reversed(procs):  # API workers first, then the model server
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _free_port():
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def login(client, username, password):
+    client.post("/auth/register", json={"username": username, "password": password})  # 400 if it exists
+    r = client.post("/auth/token", data={"username": username, "password": password})
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def scrape(client):
+    """({stage: (sum, count)}, peak RSS bytes or None) from /metrics."""
+    stages, peak = {}, None
+    r = client.get("/metrics")
+    if r.status_code != 200:
+        return stages, peak
+    for line in r.text.splitlines():
+        m = _STAGE_RE.match(line)
+        if m:
+            total, count = stages.get(m.group(2), (0.0, 0))
+            if m.group(1) == "sum":
+                stages[m.group(2)] = (float(m.group(3)), count)
+            else:
+                stages[m.group(2)] = (total, int(float(m.group(3))))
+            continue
+        m = _PEAK_RE.match(line)
+        if m:
+            peak = float(m.group(1))
+    return stages, peak
+
+
+# --- LOAD ---
+def _one(client, headers, patient_id, body, mode, poll_interval):
+    start = time.perf_counter()
+    files = {"file": ("ceph.jpg", body, "image/jpeg")}
+    if mode == "sync":
+        r = client.post(f"/predict/{patient_id}", files=files, headers=headers)
+        return r.status_code, time.perf_counter() - start
+    r = client.post(f"/predict/{patient_id}?wait=false", files=files, headers=headers)
+    if r.status_code != 202:
+        return r.status_code, time.perf_counter() - start
+    pred_id = r.json()["id"]
+    while True:
+        status = client.get(f"/predictions/{pred_id}/status", headers=headers).json()["status"]
+        if status in ("completed", "failed"):
+            return (200 if status == "completed" else 500), time.perf_counter() - start
+        time.sleep(poll_interval)
+
+
+def run_load(url, headers, patient_id, image, args):
+    latencies, codes = [], Counter()
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        with httpx.Client(base_url=url, timeout=300) as client:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                body = image if args.cache_hits else image + b"\0" + uuid.uuid4().bytes
+                code, seconds = _one(client, headers, patient_id, body, args.mode, args.poll_interval)
+                with lock:
+                    codes[code] += 1
+                    if code == 200:
+                        latencies.append(seconds)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, codes, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=("sync", "jobs"), default="sync")
+    parser.add_argument("--size", choices=sorted(synthetic.IMAGE_SIZES), default="isbi")
+    parser.add_argument("--cache-hits", action="store_true", help="upload identical bytes every time")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started server")
+    parser.add_argument("--model-server", action="store_true", help="share one app.model_server process")
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--username", default="loadtest")
+    parser.add_argument("--password", default="loadtest-password")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=baselines.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    image = synthetic.make_cephalogram(*synthetic.IMAGE_SIZES[args.size])
+    workdir = procs = None
+    url = args.url
+    if url is None:
+        workdir = tempfile.mkdtemp(prefix="loadtest_")
+        procs, url = start_server(workdir, _free_port(), args.workers, args.model_server)
+    try:
+        with httpx.Client(base_url=url, timeout=60) as client:
+            headers = login(client, args.username, args.password)
+            patient = client.post("/patients", json={"name": "Load test"}, headers=headers).json()
+            # One unmeasured request so lazy imports and the first DB writes are out of the way
+            _one(client, headers, patient["id"], image + b"\0warm", args.mode, args.poll_interval)
+            stages_before, _ = scrape(client)
+            latencies, codes, elapsed = run_load(url, headers, patient["id"], image, args)
+            stages_after, peak = scrape(client)
+    finally:
+        if procs is not None:
+            peak_local = peak_rss_mb(procs)
+            stop_server(procs)
+            shutil.rmtree(workdir, ignore_errors=True)
+    if procs is not None:
+        peak = peak_local * 1024 * 1024
+
+    ok = len(latencies)
+    print(f"{args.requests} requests, {args.concurrency} concurrent, mode={args.mode}, "
+          f"image={args.size} ({len(image) // 1024} KB), cache hits {'on' if args.cache_hits else 'off'}")
+    print(f"status codes: {dict(codes)}")
+    result = {"ok": ok, "errors": args.requests - ok, "throughput_per_s": round(ok / elapsed, 2)}
+    if latencies:
+        result.update(baselines.summarize_ms(latencies))
+        print(f"throughput {result['throughput_per_s']} req/s; latency ms min {result['min_ms']:.0f} "
+              f"p50 {result['p50_ms']:.0f} p95 {result['p95_ms']:.0f} p99 {result['p99_ms']:.0f}")
+    if peak:
+        result["peak_rss_mb"] = round(peak / 1024 / 1024, 1)
+        print(f"server peak RSS {result['peak_rss_mb']} MB")
+    if stages_after:
+        print("mean ms per stage during the run:")
+        for stage, (total, count) in sorted(stages_after.items()):
+            t0, c0 = stages_before.get(stage, (0.0, 0))
+            if count > c0:
+                print(f"   {stage:<16}{1000 * (total - t0) / (count - c0):>9.1f}  (n={count - c0})")
+
+    case = f"predict[{args.mode},{args.size},c{args.concurrency}{',hits' if args.cache_hits else ''}"
+    if args.url is None and (args.workers > 1 or args.model_server):
+        case += f",w{args.workers}{',model-server' if args.model_server else ''}"
+    case += "]"
+    params = {"requests": args.requests, "remote": args.url is not None}
+    if args.save_baseline:
+        baselines.save(SUITE, {case: result}, params)
+    if args.check and baselines.check(SUITE, {case: result}, params, args.tolerance):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Stand-in landmark model and synthetic cephalograms for benchmarking.
+
+The production weights (ceph_landmark_model.h5) are not in the repository, so
+the benchmarks build a small Keras model with the same contract instead:
+float32 (N, 256, 256, 1) in, N x (2 * landmarks) sigmoid coordinates out. Its
+convolution stack is sized to cost a few milliseconds per image on a laptop
+CPU, so model time is visible without drowning out the rest of the pipeline;
+absolute numbers are only comparable against baselines made with the same
+stand-in (see baselines.py).
+
+Usage (from backend/):
+    python -m benchmarks.synthetic [--out benchmarks/.synthetic]   # writes model + sample images
+"""
+
+import argparse
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+N_LANDMARKS = 19
+INPUT_SIZE = 256
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".synthetic")
+
+# Typical lateral cephalogram sizes: ISBI 2015 dataset, a common CR plate, a small scan
+IMAGE_SIZES = {
+    "isbi": (1935, 2400),
+    "large": (3000, 2400),
+    "small": (1200, 1000),
+}
+
+
+def build_model(path, landmarks=N_LANDMARKS, seed=0):
+    """Save a deterministic stand-in Keras model to `path` (returns `path`)."""
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    inp = tf.keras.Input((INPUT_SIZE, INPUT_SIZE, 1))
+    x = inp
+    for filters in (16, 32, 64, 128):
+        x = tf.keras.layers.Conv2D(filters, 3, strides=2, padding="same", activation="relu")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    out = tf.keras.layers.Dense(2 * landmarks, activation="sigmoid")(x)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tf.keras.Model(inp, out, name="synthetic_ceph_landmarks").save(path)
+    return path
+
+
+def ensure_model(directory=DEFAULT_DIR):
+    """Path of the stand-in model, building it on first use."""
+    path = os.path.join(directory, "synthetic_ceph_model.h5")
+    if not os.path.exists(path):
+        build_model(path)
+    return path
+
+
+def make_cephalogram(width, height, seed=0, quality=90):
+    """Grayscale JPEG bytes with radiograph-like low-frequency structure and noise.
+
+    Random noise alone compresses badly and exaggerates decode cost; the
+    smooth component keeps file sizes in the range of real radiographs.
+    """
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    phase = rng.uniform(0, 2 * np.pi, size=2)
+    base = 128 + 60 * np.sin(xx / 97.0 + phase[0]) * np.cos(yy / 131.0 + phase[1])
+    noise = rng.normal(0, 12, size=(height, width)).astype(np.float32)
+    arr = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr, mode="L").save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def landmarks(n=N_LANDMARKS, seed=1):
+    """Plausible normalized landmark list [{name, x, y}] as stored on Prediction."""
+    rng = np.random.default_rng(seed)
+    return [{"name": f"P{i + 1}", "x": float(x), "y": float(y)}
+            for i, (x, y) in enumerate(rng.uniform(0.1, 0.9, size=(n, 2)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=DEFAULT_DIR)
+    args = parser.parse_args(argv)
+
+    print(f"model: {build_model(os.path.join(args.out, 'synthetic_ceph_model.h5'))}")
+    for name, (w, h) in IMAGE_SIZES.items():
+        path = os.path.join(args.out, f"ceph_{name}_{w}x{h}.jpg")
+        with open(path, "wb") as f:
+            f.write(make_cephalogram(w, h))
+        print(f"image: {path} ({os.path.getsize(path) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
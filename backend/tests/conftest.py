@@ -0,0 +1,94 @@
+"""
+Shared test setup.
+
+The app reads its configuration from the environment at import time, so the
+scratch database and working directory are set up here, before any `app`
+module is imported. Tests run from a throwaway directory (uploads/, outputs/,
+artifacts/ are relative paths) against a migrated SQLite file.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="ceph_tests_")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ.setdefault("MODEL_PRELOAD", "0")
+os.environ.setdefault("ARTIFACT_GC_INTERVAL", "0")
+os.environ.pop("MODEL_SERVER_SOCKET", None)
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(WORKDIR)
+
+from app import database, exports, landmark_codec, main, migrations, models, principals  # noqa: E402
+
+migrations.upgrade()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    os.chdir(BACKEND_DIR)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Empty tables, caches and working directories between tests."""
+    yield
+    with database.engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    exports._rendered.clear()  # keyed by prediction id, and SQLite reuses ids
+    with landmark_codec._lock:
+        landmark_codec._schemas.clear()
+        landmark_codec._schema_ids.clear()
+    for name in os.listdir(WORKDIR):
+        directory = os.path.join(WORKDIR, name)
+        if os.path.isdir(directory):  # keep the directories the app created at import
+            for entry in os.listdir(directory):
+                path = os.path.join(directory, entry)
+                shutil.rmtree(path, ignore_errors=True) if os.path.isdir(path) else os.remove(path)
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def patient(db):
+    user = models.User(username="doc", hashed_password="x")
+    db.add(user)
+    db.commit()
+    row = models.Patient(name="Test patient", owner_id=user.id)
+    db.add(row)
+    db.commit()
+    return row
+
+
+@pytest.fixture
+def login():
+    """TestClient as a given user (or anonymous); startup hooks (model load) are not run."""
+    def client(user=None):
+        main.app.dependency_overrides.clear()
+        if user is not None:
+            principal = principals.Principal(user.id, user.username, user.role or "doctor")
+            main.app.dependency_overrides[principals.get_current_principal] = lambda: principal
+        return TestClient(main.app)
+
+    yield client
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def landmarks():
+    """19 named landmarks at distinct normalized positions."""
+    return [{"name": f"P{i + 1}", "x": (i + 1) / 20, "y": 1 - (i + 1) / 20} for i in range(19)]
@@ -0,0 +1,54 @@
+import pytest
+
+from app import jobs, models
+
+
+@pytest.fixture
+def prediction(db, patient, landmarks):
+    pred = models.Prediction(patient_id=patient.id, status=jobs.COMPLETED)
+    pred.set_landmarks(landmarks)
+    db.add(pred)
+    db.commit()
+    return pred
+
+
+@pytest.fixture
+def stranger(db):
+    user = models.User(username="other", hashed_password="x", role="doctor")
+    db.add(user)
+    db.commit()
+    return user
+
+
+ROUTES = [
+    "/predictions/{id}/export?format=csv",
+    "/predictions/{id}/image?kind=upload&size=thumb",
+    "/predictions/{id}/image?kind=overlay",
+    "/predictions/{id}/overlay",
+    "/predictions/{id}/tiles/upload.dzi",
+    "/predictions/{id}/tiles/overlay_files/0/0_0.jpeg",
+    "/patients/{patient_id}/predictions/export?format=csv",
+]
+
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_anonymous_requests_are_rejected(prediction, login, route):
+    response = login().get(route.format(id=prediction.id, patient_id=prediction.patient_id))
+
+    assert response.status_code in (401, 403)
+
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_other_users_get_404(prediction, stranger, login, route):
+    response = login(stranger).get(route.format(id=prediction.id, patient_id=prediction.patient_id))
+
+    assert response.status_code == 404
+
+
+def test_owner_and_admin_can_export(db, prediction, stranger, login):
+    owner = prediction.patient.owner
+    assert login(owner).get(f"/predictions/{prediction.id}/export?format=csv").status_code == 200
+
+    stranger.role = "admin"
+    db.commit()
+    assert login(stranger).get(f"/predictions/{prediction.id}/export?format=csv").status_code == 200
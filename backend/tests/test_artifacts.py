@@ -0,0 +1,126 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import artifacts, models
+
+OLD = time.time() - 7200
+
+
+def _write(path, content=b"radiograph"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    os.utime(path, (OLD, OLD))  # past any grace period
+    return path
+
+
+@pytest.fixture
+def legacy_tree(db, patient):
+    """Pre-store rows: predictions that never recorded their upload."""
+    other = models.Patient(name="Two uploads", owner_id=patient.owner_id)
+    db.add(other)
+    db.commit()
+    for pid in (patient.id, patient.id, other.id):
+        db.add(models.Prediction(patient_id=pid, image_path=f"outputs/ceph_{pid}_predicted.jpg"))
+    db.commit()
+    return {
+        "single": _write(os.path.join("uploads", f"{patient.id}_scan.jpg"), b"one"),
+        "first": _write(os.path.join("uploads", f"{other.id}_a.jpg"), b"two-a"),
+        "second": _write(os.path.join("uploads", f"{other.id}_b.jpg"), b"two-b"),
+        "orphan": _write(os.path.join("uploads", "999_orphan.jpg"), b"orphan"),
+        "output": _write(os.path.join("outputs", f"ceph_{patient.id}_predicted.jpg"), b"overlay"),
+        "stale_output": _write(os.path.join("outputs", "ceph_999_predicted.jpg"), b"stale"),
+        "patient": patient.id,
+    }
+
+
+def test_gc_leaves_legacy_files_alone_by_default(legacy_tree):
+    report = artifacts.gc(grace=0)
+
+    assert report["include_legacy"] is False
+    assert report["legacy"] == {"files": 0, "bytes": 0}
+    for key in ("single", "first", "second", "orphan", "output", "stale_output"):
+        assert os.path.exists(legacy_tree[key]), key
+
+
+def test_legacy_gc_keeps_uploads_of_unlinked_patients(legacy_tree):
+    report = artifacts.gc(grace=0, legacy=True)
+
+    assert report["include_legacy"] is True
+    assert report["legacy"]["files"] == 2
+    assert not os.path.exists(legacy_tree["orphan"])
+    assert not os.path.exists(legacy_tree["stale_output"])
+    for key in ("single", "first", "second", "output"):
+        assert os.path.exists(legacy_tree[key]), key
+
+
+def test_legacy_gc_dry_run_deletes_nothing(legacy_tree):
+    report = artifacts.gc(dry_run=True, grace=0, legacy=True)
+
+    assert report["legacy"]["files"] == 2
+    assert os.path.exists(legacy_tree["orphan"])
+
+
+def test_adopt_links_only_unambiguous_uploads(db, legacy_tree):
+    result = artifacts.adopt()
+
+    assert result == {"moved": 1, "linked": 2, "backfilled": 2, "ambiguous_patients": 1}
+    assert not os.path.exists(legacy_tree["single"])
+    rows = db.query(models.Prediction).filter(models.Prediction.patient_id == legacy_tree["patient"]).all()
+    digests = {row.upload_digest for row in rows}
+    assert len(digests) == 1 and None not in digests
+    artifact = db.get(models.Artifact, digests.pop())
+    assert all(row.upload_path == artifact.path for row in rows)
+    with open(artifact.path, "rb") as f:
+        assert f.read() == b"one"
+
+    # The ambiguous patient's uploads stay protected afterwards too
+    artifacts.gc(grace=0, legacy=True)
+    assert os.path.exists(legacy_tree["first"]) and os.path.exists(legacy_tree["second"])
+    assert os.path.exists(artifact.path)
+
+
+def test_gc_removes_unreferenced_store_blobs(db, patient, tmp_path):
+    kept_src = tmp_path / "kept.jpg"
+    kept_src.write_bytes(b"kept")
+    dropped_src = tmp_path / "dropped.jpg"
+    dropped_src.write_bytes(b"dropped")
+    kept, kept_digest = artifacts.put_file(str(kept_src))
+    dropped, _ = artifacts.put_file(str(dropped_src))
+    db.add(models.Prediction(patient_id=patient.id, upload_path=kept, upload_digest=kept_digest))
+    db.commit()
+
+    report = artifacts.gc(grace=0)
+
+    assert report["store"]["files"] == 1
+    assert os.path.exists(kept) and not os.path.exists(dropped)
+    assert db.query(models.Artifact).count() == 1
+
+
+def test_gc_keeps_a_blob_refreshed_after_it_was_selected(db, patient, tmp_path, monkeypatch):
+    src = tmp_path / "scan.jpg"
+    src.write_bytes(b"scan")
+    path, digest = artifacts.put_file(str(src))
+    db.get(models.Artifact, digest).stored_at = datetime.utcnow() - timedelta(hours=2)
+    db.commit()
+    os.utime(path, (OLD, OLD))
+    execute, raced = type(db).execute, []
+
+    def dedupe_during_gc(session, statement, *args, **kwargs):
+        result = execute(session, statement, *args, **kwargs)
+        if not raced and str(statement).startswith("SELECT artifacts.digest"):
+            raced.append(True)  # a duplicate upload lands between gc's select and its delete
+            artifacts.put_file(str(src))
+        return result
+
+    monkeypatch.setattr(type(db), "execute", dedupe_during_gc)
+    report = artifacts.gc(grace=60)
+    monkeypatch.undo()
+
+    assert raced and report["store"]["files"] == 0
+    assert os.path.exists(path)
+    db.expire_all()
+    assert db.get(models.Artifact, digest) is not None
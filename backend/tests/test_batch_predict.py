@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from app import batch_predict, workers
+
+
+@pytest.fixture
+def client(patient, login):
+    return login(patient.owner)
+
+
+def _post(client, patient, count):
+    files = [("files", (f"img{i}.jpg", b"not really a jpeg %d" % i, "image/jpeg")) for i in range(count)]
+    response = client.post(f"/predict/{patient.id}/batch", files=files)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_closed_pool_fails_the_chunks_instead_of_waiting(client, patient, monkeypatch):
+    pool = workers.FairWorkerPool(max_workers=1, name="test")
+    pool.shutdown()
+    monkeypatch.setattr(workers, "get_pool", lambda: pool)
+
+    lines = _post(client, patient, 3)
+
+    assert [row["status"] for row in lines[:-1]] == ["failed"] * 3
+    assert lines[0]["error"] == "Inference pool is shutting down"
+    assert lines[-1] == {"summary": True, "total": 3, "completed": 0, "failed": 3}
+
+
+def test_saturated_pool_gives_up_after_the_admission_timeout(client, patient, monkeypatch):
+    class Busy:
+        closed = False
+
+        async def run(self, *args, **kwargs):
+            raise workers.PoolSaturated(429, "Too many predictions in progress for this user", retry_after=0)
+
+    monkeypatch.setattr(workers, "get_pool", Busy)
+    monkeypatch.setattr(batch_predict, "BATCH_ADMISSION_TIMEOUT", 0.05)
+
+    lines = _post(client, patient, 2)
+
+    assert [row["index"] for row in lines[:-1]] == [0, 1]
+    assert {row["error"] for row in lines[:-1]} == {"Too many predictions in progress for this user"}
+    assert lines[-1]["failed"] == 2
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import bulk_reports, models
+
+
+@pytest.fixture
+def export(db, patient):
+    job = models.ReportExport(requested_by=patient.owner_id, format="zip", status=bulk_reports.RUNNING)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def _reload(db, job):
+    db.expire_all()
+    return db.get(models.ReportExport, job.id)
+
+
+def test_claim_is_exclusive_while_the_heartbeat_is_fresh(db, export, monkeypatch):
+    assert bulk_reports.claim(export.id)
+    assert _reload(db, export).claimed_by == bulk_reports.RUNNER_ID
+
+    monkeypatch.setattr(bulk_reports, "RUNNER_ID", "other-worker")
+    assert not bulk_reports.claim(export.id)
+    assert not bulk_reports._heartbeat(export.id)  # not ours
+
+
+def test_stale_claim_is_taken_over(db, export, monkeypatch):
+    export.claimed_by = "crashed-worker"
+    export.heartbeat_at = datetime.utcnow() - timedelta(seconds=bulk_reports.BULK_REPORT_STALE_SECONDS + 1)
+    db.commit()
+
+    assert bulk_reports.claim(export.id)
+    job = _reload(db, export)
+    assert job.claimed_by == bulk_reports.RUNNER_ID and job.status == bulk_reports.RUNNING
+
+
+def test_released_claim_can_be_resumed(db, export):
+    assert bulk_reports.claim(export.id)
+    assert bulk_reports._heartbeat(export.id, release=True)
+
+    assert _reload(db, export).claimed_by is None
+    assert bulk_reports.claim(export.id)
+
+
+def test_completed_jobs_are_never_claimed(db, export):
+    export.status = bulk_reports.COMPLETED
+    db.commit()
+
+    assert not bulk_reports.claim(export.id)
+
+
+def test_resume_unfinished_skips_live_claims(db, export, monkeypatch):
+    export.claimed_by = "live-worker"
+    export.heartbeat_at = datetime.utcnow()
+    db.commit()
+    started = []
+    monkeypatch.setattr(bulk_reports, "run", started.append)
+    monkeypatch.setattr(bulk_reports.threading, "Thread", _Inline)
+
+    assert bulk_reports.resume_unfinished() == []
+    export.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+    db.commit()
+    assert bulk_reports.resume_unfinished() == [export.id]
+    assert started == [export.id]
+
+
+class _Inline:
+    """Thread stand-in that runs the target on start()."""
+
+    def __init__(self, target, args=(), **kwargs):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
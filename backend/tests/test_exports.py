@@ -0,0 +1,49 @@
+import pytest
+from app import exports, jobs, models
+
+
+@pytest.fixture
+def pending(db, patient):
+    pred = models.Prediction(patient_id=patient.id, status=jobs.PENDING)
+    db.add(pred)
+    db.commit()
+    return pred
+
+
+def test_render_refuses_pending_predictions(pending):
+    with pytest.raises(exports.NotCompleted):
+        exports.render([pending], "csv")
+    assert exports.cache_stats()["items"] == 0
+
+
+def test_render_after_completion(db, pending, landmarks):
+    with pytest.raises(exports.NotCompleted):
+        exports.render([pending], "csv")
+
+    pending.set_landmarks(landmarks)
+    pending.status = jobs.COMPLETED
+    db.commit()
+    content, media_type, ext = exports.render([pending], "csv")
+
+    lines = content.decode().splitlines()
+    assert lines[0] == "name,x,y"
+    assert [line.split(",")[0] for line in lines[1:]] == [lm["name"] for lm in landmarks]
+    assert ext == "csv"
+
+
+def test_bundle_with_one_pending_prediction_is_refused(db, patient, pending, landmarks):
+    done = models.Prediction(patient_id=patient.id, status=jobs.COMPLETED)
+    done.set_landmarks(landmarks)
+    db.add(done)
+    db.commit()
+
+    with pytest.raises(exports.NotCompleted, match=str(pending.id)):
+        exports.render([done, pending], "json", bundle=True)
+
+
+def test_export_endpoint_returns_409_while_pending(pending, login):
+    client = login(pending.patient.owner)
+
+    response = client.get(f"/predictions/{pending.id}/export", params={"format": "csv"})
+
+    assert response.status_code == 409
@@ -0,0 +1,162 @@
+import threading
+
+import numpy as np
+import pytest
+from sqlalchemy.engine import Connection
+
+from app import database, landmark_codec, models
+
+
+def test_pack_round_trip(landmarks):
+    names, blob = landmark_codec.pack(landmarks)
+
+    assert names == [lm["name"] for lm in landmarks]
+    assert len(blob) == len(landmarks) * landmark_codec.POINT_BYTES
+    coords = landmark_codec.unpack(blob)
+    assert coords.dtype == landmark_codec.DTYPE and coords.shape == (len(landmarks), 2)
+    np.testing.assert_allclose(coords, [(lm["x"], lm["y"]) for lm in landmarks], atol=1e-6)
+
+
+def test_columns_decode_back_to_landmarks(landmarks):
+    values = landmark_codec.columns(landmarks)
+
+    assert values["result"] is None  # LANDMARK_STORAGE=packed
+    decoded = landmark_codec.decode_row(values["result"], values["landmark_schema_id"], values["landmarks_packed"])
+    assert [lm["name"] for lm in decoded] == [lm["name"] for lm in landmarks]
+    for got, want in zip(decoded, landmarks):
+        assert got["x"] == pytest.approx(want["x"], abs=1e-6)
+        assert got["y"] == pytest.approx(want["y"], abs=1e-6)
+
+
+def test_decode_row_passes_json_rows_through(landmarks):
+    assert landmark_codec.decode_row(landmarks, None, None) is landmarks
+    assert landmark_codec.decode_row(None, None, None) == []
+
+
+def test_schema_names_survive_a_cold_cache(landmarks):
+    sid = landmark_codec.schema_id([lm["name"] for lm in landmarks])
+    with landmark_codec._lock:
+        landmark_codec._schemas.clear()
+        landmark_codec._schema_ids.clear()
+
+    assert landmark_codec.schema_names(sid) == tuple(lm["name"] for lm in landmarks)
+    assert landmark_codec.schema_id([lm["name"] for lm in landmarks]) == sid
+    with pytest.raises(KeyError):
+        landmark_codec.schema_names(sid + 1)
+
+
+def test_group_arrays_mixes_packed_and_json_rows(landmarks):
+    values = landmark_codec.columns(landmarks)
+    rows = [
+        (1, values["landmark_schema_id"], values["landmarks_packed"], None),
+        (2, None, None, landmarks),
+        (3, None, None, None),
+    ]
+
+    groups = landmark_codec.group_arrays(rows)
+
+    assert list(groups) == [values["landmark_schema_id"]]
+    ids, coords, names = groups[values["landmark_schema_id"]]
+    assert ids.tolist() == [1, 2]
+    assert coords.shape == (2, len(landmarks), 2)
+    np.testing.assert_array_equal(coords[0], coords[1])
+
+
+def test_fingerprint_tracks_the_stored_landmarks(landmarks):
+    pred = models.Prediction(patient_id=1)
+    pred.set_landmarks(landmarks)
+    before = landmark_codec.fingerprint(pred)
+
+    moved = [dict(lm) for lm in landmarks]
+    moved[0]["x"] += 0.01
+    pred.set_landmarks(moved)
+
+    assert landmark_codec.fingerprint(pred) != before
+    pred.set_landmarks(landmarks)
+    assert landmark_codec.fingerprint(pred) == before
+
+
+def test_concurrent_first_registration(monkeypatch, landmarks):
+    """Every thread misses the cache and the lookup before any of them inserts."""
+    names = [lm["name"] for lm in landmarks]
+    threads = 4
+    barrier = threading.Barrier(threads)
+    waited = threading.local()
+    execute = Connection.execute
+
+    def racing_execute(self, statement, *args, **kwargs):
+        result = execute(self, statement, *args, **kwargs)
+        if not getattr(waited, "done", False) and str(statement).startswith("SELECT landmark_schemas.id"):
+            waited.done = True
+            result = result.all()  # buffer before letting the others through
+            barrier.wait(timeout=10)
+            return _Rows(result)
+        return result
+
+    monkeypatch.setattr(Connection, "execute", racing_execute)
+    ids, errors = [], []
+
+    def register():
+        try:
+            ids.append(landmark_codec.schema_id(names))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    workers = [threading.Thread(target=register) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    monkeypatch.undo()
+
+    assert errors == []
+    assert len(ids) == threads and len(set(ids)) == 1
+    with database.engine.connect() as conn:
+        rows = conn.execute(models.LandmarkSchema.__table__.select()).all()
+    assert [row.id for row in rows] == ids[:1]
+
+
+class _Rows:
+    """Stand-in for a consumed Result: schema_id only calls .scalar()."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+
+@pytest.fixture
+def cold_prediction(db, patient, landmarks, monkeypatch):
+    """A packed prediction whose schema this process has not cached, with sync lookups forbidden."""
+    pred = models.Prediction(patient_id=patient.id, status="completed")
+    pred.set_landmarks(landmarks)
+    db.add(pred)
+    db.commit()
+    with landmark_codec._lock:
+        landmark_codec._schemas.clear()
+        landmark_codec._schema_ids.clear()
+
+    class NoSyncQueries:
+        def connect(self):
+            raise AssertionError("blocking schema lookup on the event loop")
+
+    monkeypatch.setattr(landmark_codec.database, "engine", NoSyncQueries())
+    return pred
+
+
+@pytest.mark.parametrize("route", [
+    "/cephalogram/{id}",
+    "/predictions/{id}/status",
+    "/patients/{patient_id}/predictions?fields=landmarks",
+])
+def test_async_handlers_load_missing_schemas_without_blocking(cold_prediction, login, landmarks, route):
+    client = login(cold_prediction.patient.owner)
+
+    response = client.get(route.format(id=cold_prediction.id, patient_id=cold_prediction.patient_id))
+
+    assert response.status_code == 200
+    body = response.json()
+    item = body[0] if isinstance(body, list) else body
+    if "landmarks" in item:
+        assert [lm["name"] for lm in item["landmarks"]] == [lm["name"] for lm in landmarks]
@@ -0,0 +1,108 @@
+import json
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+from app import database, landmark_codec, migrations
+
+# Schema of a database created before migrations existed (Base.metadata.create_all
+# at import, as backend/app.db was made); pinned here, not derived from the models.
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER NOT NULL, username VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL,
+        role VARCHAR, created_at DATETIME, PRIMARY KEY (id))""",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    """CREATE TABLE patients (
+        id INTEGER NOT NULL, name VARCHAR NOT NULL, dob VARCHAR, notes TEXT, owner_id INTEGER,
+        created_at DATETIME, PRIMARY KEY (id), FOREIGN KEY(owner_id) REFERENCES users (id))""",
+    "CREATE INDEX ix_patients_id ON patients (id)",
+    """CREATE TABLE predictions (
+        id INTEGER NOT NULL, patient_id INTEGER NOT NULL, model_name VARCHAR, result JSON,
+        image_path VARCHAR, excel_path VARCHAR, created_at DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(patient_id) REFERENCES patients (id))""",
+    "CREATE INDEX ix_predictions_id ON predictions (id)",
+]
+
+
+@pytest.fixture
+def legacy_engine(tmp_path, landmarks):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", **database.engine_options())
+    event.listen(engine, "connect", database.apply_sqlite_pragmas)
+    with engine.begin() as conn:
+        for ddl in LEGACY_SCHEMA:
+            conn.exec_driver_sql(ddl)
+        conn.exec_driver_sql("INSERT INTO users (id, username, hashed_password) VALUES (1, 'doc', 'x')")
+        conn.exec_driver_sql("INSERT INTO patients (id, name, owner_id) VALUES (1, 'A', 1)")
+        for pid in (1, 2):
+            conn.execute(
+                text("INSERT INTO predictions (id, patient_id, result, image_path, created_at) "
+                     "VALUES (:id, 1, :result, 'outputs/ceph_1_predicted.jpg', '2024-01-01 00:00:00')"),
+                {"id": pid, "result": json.dumps(landmarks)},
+            )
+    yield engine
+    engine.dispose()
+
+
+def test_all_migrations_apply_to_a_legacy_database(legacy_engine):
+    applied = migrations.upgrade(legacy_engine)
+
+    assert applied == [m[0] for m in migrations.MIGRATIONS]
+    assert migrations.pending(legacy_engine) == []
+    inspector = inspect(legacy_engine)
+    columns = {c["name"] for c in inspector.get_columns("predictions")}
+    assert {"upload_path", "status", "landmarks_packed", "landmark_schema_id", "upload_digest"} <= columns
+    indexes = {i["name"] for i in inspector.get_indexes("predictions")}
+    assert {"ix_predictions_patient_id_id", "ix_predictions_upload_digest"} <= indexes
+    assert "ix_patients_owner_id_id" in {i["name"] for i in inspector.get_indexes("patients")}
+    assert {"artifacts", "landmark_schemas", "report_exports"} <= set(inspector.get_table_names())
+
+
+def test_legacy_landmarks_are_packed(legacy_engine, landmarks):
+    migrations.upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(text("SELECT result, landmark_schema_id, landmarks_packed FROM predictions")).all()
+        assert len(rows) == 2
+        for result, sid, blob in rows:
+            assert blob is not None and sid is not None
+            decoded = landmark_codec.to_landmarks(sid, blob, conn)
+            assert [lm["name"] for lm in decoded] == [lm["name"] for lm in landmarks]
+            for got, want in zip(decoded, landmarks):
+                assert got["x"] == pytest.approx(want["x"], abs=1e-6)
+                assert got["y"] == pytest.approx(want["y"], abs=1e-6)
+
+
+def test_upgrade_is_idempotent(legacy_engine):
+    migrations.upgrade(legacy_engine)
+    assert migrations.upgrade(legacy_engine) == []
+
+
+def test_concurrent_upgrades_of_a_fresh_database(tmp_path):
+    """Several workers start at once against a database nobody has migrated yet."""
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    engines = [create_engine(url, **database.engine_options()) for _ in range(3)]
+    for engine in engines:
+        event.listen(engine, "connect", database.apply_sqlite_pragmas)
+    errors, applied = [], []
+    barrier = threading.Barrier(len(engines))
+
+    def run(engine):
+        barrier.wait()
+        try:
+            applied.append(migrations.upgrade(engine))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(engine,)) for engine in engines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sorted(v for versions in applied for v in versions) == [m[0] for m in migrations.MIGRATIONS]
+    assert migrations.pending(engines[0]) == []
+    for engine in engines:
+        engine.dispose()
@@ -1,12 +1,14 @@
 import React, { useEffect, useState, useContext } from "react";
 import { useParams } from "react-router-dom";
 import { AuthContext } from "../../context/AuthContext";
+import { downloadFile, fetchObjectUrl } from "../../utils/api";
 
 export default function AutoLandmark() {
   const { id } = useParams();              // predictionId from URL
   const { getAuthHeaders } = useContext(AuthContext);
 
   const [ceph, setCeph] = useState(null);
+  const [imageSrc, setImageSrc] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -33,6 +35,23 @@ export default function AutoLandmark() {
     fetchCeph();
   }, [id, getAuthHeaders]);
 
+  // The image endpoints need the auth header, so load it as an object URL
+  useEffect(() => {
+    if (!ceph?.image_url) return;
+    let objectUrl = null;
+    let cancelled = false;
+    fetchObjectUrl(ceph.image_url, getAuthHeaders())
+      .then(url => {
+        if (cancelled) URL.revokeObjectURL(url);
+        else setImageSrc((objectUrl = url));
+      })
+      .catch(err => setError(err.message));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [ceph, getAuthHeaders]);
+
   if (loading) return <p>Loading...</p>;
   if (error) return <p className="text-red-500">{error}</p>;
   if (!ceph) return <p>Cephalogram not found</p>;
@@ -42,7 +61,7 @@ export default function AutoLandmark() {
       <h2 className="text-xl font-bold">Landmark Prediction</h2>
 
       <img 
-        src={ceph.image_url} 
+        src={imageSrc || undefined} 
         alt="Predicted Cephalogram"
         className="max-w-xl border rounded mt-3"
       />
@@ -62,13 +81,16 @@ export default function AutoLandmark() {
       </table>
 
       {ceph.excel_file && (
-        <a 
-          href={ceph.excel_file} 
+        <button
+          type="button"
+          onClick={() =>
+            downloadFile(ceph.excel_file, getAuthHeaders(), `ceph_${ceph.id}_landmarks.xlsx`)
+              .catch(err => setError(err.message))
+          }
           className="mt-4 inline-block text-blue-500 underline"
-          download
         >
           Download Excel
-        </a>
+        </button>
       )}
     </div>
   );
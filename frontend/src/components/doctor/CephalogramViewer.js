@@ -1,12 +1,14 @@
 import React, { useEffect, useState, useContext } from "react";
 import { useParams } from "react-router-dom";
 import { AuthContext } from "../../context/AuthContext";
+import { downloadFile, fetchObjectUrl } from "../../utils/api";
 
 export default function CephalogramViewer() {
   const { id } = useParams();           // <-- predictionId
   const { getAuthHeaders } = useContext(AuthContext);
 
   const [data, setData] = useState(null);
+  const [imageSrc, setImageSrc] = useState(null);
   const [error, setError] = useState(null);
 
   const API_URL = "http://localhost:8000";
@@ -28,6 +30,23 @@ export default function CephalogramViewer() {
       .catch(err => setError(err.message));
   }, [id, getAuthHeaders]);
 
+  // The image endpoints need the auth header, so load it as an object URL
+  useEffect(() => {
+    if (!data?.image_url) return;
+    let objectUrl = null;
+    let cancelled = false;
+    fetchObjectUrl(data.image_url, getAuthHeaders())
+      .then(url => {
+        if (cancelled) URL.revokeObjectURL(url);
+        else setImageSrc((objectUrl = url));
+      })
+      .catch(err => setError(err.message));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [data, getAuthHeaders]);
+
   if (error) return <p className="text-red-500">{error}</p>;
   if (!data) return <p className="text-gray-300">Loading...</p>;
   if (!data.image_url) return <p>No prediction image found.</p>;
@@ -37,7 +56,7 @@ export default function CephalogramViewer() {
       <h2 className="text-xl font-bold mb-4">Prediction Result</h2>
 
       <img
-        src={data.image_url}
+        src={imageSrc || undefined}
         alt="Predicted"
         className="w-full max-w-3xl rounded shadow"
       />
@@ -59,13 +78,16 @@ export default function CephalogramViewer() {
 
       {/* Excel Download */}
       {data.excel_file && (
-        <a
-          href={data.excel_file}
+        <button
+          type="button"
+          onClick={() =>
+            downloadFile(data.excel_file, getAuthHeaders(), `ceph_${data.id}_landmarks.xlsx`)
+              .catch(err => setError(err.message))
+          }
           className="text-green-400 underline mt-4 inline-block"
-          download
         >
           Download Excel
-        </a>
+        </button>
       )}
     </div>
   );
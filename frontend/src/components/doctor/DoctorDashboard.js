@@ -1,6 +1,7 @@
 // filepath: src/components/doctor/DoctorDashboard.js
 import React, { useContext, useEffect, useState } from "react";
 import { AuthContext } from "../../context/AuthContext";
+import { fetchAllPages } from "../../utils/api";
 import { Link } from "react-router-dom";
 
 export default function DoctorDashboard() {
@@ -15,16 +16,9 @@ export default function DoctorDashboard() {
     const fetchPatients = async () => {
       setLoading(true);
       try {
-        const res = await fetch(`${API_URL}/patients`, {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
+        const data = await fetchAllPages(`${API_URL}/patients`, {
+          Authorization: `Bearer ${token}`,
         });
-        if (!res.ok) {
-          const errData = await res.json();
-          throw new Error(errData.detail || "Failed to fetch patients");
-        }
-        const data = await res.json();
         setPatients(data);
       } catch (err) {
         console.error("Error fetching patients:", err);
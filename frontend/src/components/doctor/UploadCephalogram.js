@@ -1,5 +1,6 @@
 import React, { useState, useContext, useEffect } from "react";
 import { AuthContext } from "../../context/AuthContext";
+import { fetchAllPages } from "../../utils/api";
 import { useNavigate } from "react-router-dom";
 import CephalogramViewer from "./CephalogramViewer";
 
@@ -16,8 +17,7 @@ export default function UploadCephalogram() {
   const nav = useNavigate();
 
   useEffect(() => {
-    fetch(`${API_URL}/patients`, { headers: getAuthHeaders() })
-      .then((res) => res.json())
+    fetchAllPages(`${API_URL}/patients`, getAuthHeaders())
       .then(setPatients)
       .catch(console.error);
   }, []);
@@ -21,3 +21,53 @@ export async function postToken(username, password) {
   }
   return res.json(); // { access_token, token_type }
 }
+
+// List endpoints (/patients, /patients/{id}/predictions) are keyset-paginated:
+// the body is one page and X-Next-Cursor points at the next. Follow it to the end.
+export async function fetchAllPages(url, headers) {
+  const items = [];
+  let cursor = null;
+  do {
+    const pageUrl = cursor
+      ? `${url}${url.includes("?") ? "&" : "?"}cursor=${encodeURIComponent(cursor)}`
+      : url;
+    const res = await fetchOk(pageUrl, headers);
+    items.push(...(await res.json()));
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return items;
+}
+
+async function fetchOk(url, headers) {
+  const res = await fetch(url, { headers });
+  if (!res.ok) {
+    let detail = `HTTP ${res.status}`;
+    try {
+      detail = (await res.json()).detail || detail;
+    } catch (_) {}
+    throw new Error(detail);
+  }
+  return res;
+}
+
+// Prediction images and exports are owner-only, and <img src> / <a href> cannot
+// send the Authorization header: fetch them and hand the browser an object URL.
+// Revoke it with URL.revokeObjectURL when the image is no longer shown.
+export async function fetchObjectUrl(url, headers) {
+  const res = await fetchOk(url, headers);
+  return URL.createObjectURL(await res.blob());
+}
+
+export async function downloadFile(url, headers, fallbackName) {
+  const res = await fetchOk(url, headers);
+  const disposition = res.headers.get("Content-Disposition") || "";
+  const match = disposition.match(/filename="?([^";]+)"?/);
+  const objectUrl = URL.createObjectURL(await res.blob());
+  const link = document.createElement("a");
+  link.href = objectUrl;
+  link.download = match ? match[1] : fallbackName;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  URL.revokeObjectURL(objectUrl);
+}